@@ -0,0 +1,89 @@
+"""
+Measures the end of a parse, concatenating each section's output and deleting the book's pages and temporary files,
+against a fake Cloud Storage bucket with simulated request latency. The sequential implementation the parser used
+to have is compared with the batched, listing-free one in minute-book-parser's cleanup.py.
+
+Usage: python benchmarks/bench_cleanup.py [pages] [latency_ms] [repetitions]
+"""
+
+import statistics
+import sys
+import time
+
+from common import load_module
+from fakes import FakeStorageClient, Latency
+
+
+SECTIONS = ["entity_details", "quorum_rules", "share_classes", "directors", "officers", "restrictions_provisions"]
+
+
+def populate(bucket, book, pages):
+    for page in range(1, pages + 1):
+        bucket._write(f"output/txt/{book}_page_{page}.txt", b"text of page %d" % page, None, "text/plain")
+    for section in SECTIONS:
+        bucket._write(f"temp/{book}_{section}.json", b'{"%s": []}' % section.encode(), None, "text/json")
+    # page-processor's record that the book was handed off for parsing, which is all it keeps once it has
+    bucket._write(f"state/{book}/shards.json", b"{}", None, "application/json")
+
+
+def sequential(bucket, book):
+    """
+    The parser's original cleanup: one listing per prefix, a get_blob() and download per temporary file, string
+    concatenation, and one delete request per object.
+    """
+
+    def batch_delete_files(prefix):
+        for blob in bucket.list_blobs(prefix=prefix):
+            blob.delete()
+
+    prefix = f"temp/{book}"
+    output = ""
+    for blob in bucket.list_blobs(prefix=prefix):
+        output += bucket.get_blob(blob.name).download_as_string().decode("utf-8") + "\n"
+    bucket.blob(f"output/final/{book}.json").upload_from_string(output, content_type="text/json")
+    batch_delete_files(prefix)
+    batch_delete_files(f"output/txt/{book}")
+    batch_delete_files(f"state/{book}/")
+
+
+def batched(cleanup, bucket, book, pages):
+    names = sorted(f"temp/{book}_{section}.json" for section in SECTIONS)
+    cleanup.concatenate(bucket, names, f"output/final/{book}.json")
+    cleanup.delete_files(bucket, names)
+    cleanup.delete_files(bucket, [f"output/txt/{book}_page_{page}.txt" for page in range(1, pages + 1)]
+                         + [f"state/{book}/shards.json"])
+
+
+def main(pages, latency_ms, repetitions):
+    cleanup = load_module("minute-book-parser", "cleanup")
+
+    print(f"{pages} pages, {latency_ms} ms per request, {repetitions} repetitions")
+    print(f"{'implementation':<16}{'p50 (s)':>10}{'p95 (s)':>10}{'max (s)':>10}{'requests':>10}")
+    outputs = {}
+    for name, run in [("sequential", lambda bucket: sequential(bucket, "book")),
+                      ("batched", lambda bucket: batched(cleanup, bucket, "book", pages))]:
+        durations = []
+        for _ in range(repetitions):
+            client = FakeStorageClient(Latency(latency_ms / 1000, jitter=latency_ms / 4000))
+            bucket = client.bucket("bench")
+            populate(bucket, "book", pages)
+
+            start = time.perf_counter()
+            run(bucket)
+            durations.append(time.perf_counter() - start)
+
+            assert set(bucket.objects) == {"output/final/book.json"}, sorted(bucket.objects)[:5]
+            outputs[name] = bucket.objects["output/final/book.json"]["data"]
+
+        durations.sort()
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        print(f"{name:<16}{statistics.median(durations):>10.3f}{p95:>10.3f}{durations[-1]:>10.3f}"
+              f"{sum(client.calls.values()):>10}")
+
+    assert outputs["sequential"] == outputs["batched"]
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 20,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 5)
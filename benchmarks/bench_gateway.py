@@ -0,0 +1,56 @@
+"""
+Drives the minute-book-parser LLM gateway against the local fake model server and reports throughput, throttling,
+retries and hedges.
+
+Usage: python benchmarks/bench_gateway.py [requests] [--qps 5] [--latency 0.3] [--straggler-rate 0.05]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import time
+
+from common import load_module
+from fake_model_server import FakeModel, serve
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("requests", type=int, nargs="?", default=100)
+    parser.add_argument("--qps", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--straggler-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--callers", type=int, default=12)
+    args = parser.parse_args()
+
+    model = FakeModel(qps=args.qps, latency=args.latency, straggler_rate=args.straggler_rate,
+                      straggler_latency=args.latency * 20, error_rate=args.error_rate)
+    server = serve(model)
+
+    # gateway.py imports the function's resources module by name
+    import sys
+    sys.modules["resources"] = load_module("minute-book-parser", "resources")
+    gateway = load_module("minute-book-parser", "gateway")
+
+    llm = gateway.Gateway(gateway.HTTPTransport(f"http://127.0.0.1:{server.server_port}/predict", max_workers=8),
+                          rate=args.qps * 2, max_rate=args.qps * 4, backoff_base=0.2, hedge_min_delay=args.latency * 2)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.callers) as executor:
+        outputs = list(executor.map(lambda i: llm.predict(f"prompt {i}"), range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    print(json.dumps({
+        "requests": len(outputs),
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(len(outputs) / elapsed, 2),
+        "final_rate": round(llm.bucket.rate, 2),
+        "gateway": dict(llm.stats),
+        "server": model.stats,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
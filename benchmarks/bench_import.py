@@ -0,0 +1,63 @@
+"""
+Measures the cold-start cost of each Cloud Function: the time to import its main module in a fresh Python process,
+the number of modules that loads, and which of the heavy libraries it pulls in. The storage client, bucket and
+publisher are registered as placeholders first, since creating real ones needs credentials and the network.
+
+Pass --src to measure another checkout of terraform/modules/cloud_functions/src, e.g. one made with `git worktree`
+at an earlier revision, for comparison.
+
+Usage: python benchmarks/bench_import.py [--repetitions 5] [--src DIR]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from common import SRC
+
+
+FUNCTIONS = ["input-listener", "page-processor", "minute-book-parser"]
+HEAVY = ["langchain", "tiktoken", "google.cloud.documentai_v1", "google.cloud.documentai_toolbox", "pandas",
+         "google.cloud.pubsub_v1", "PyPDF2", "grpc"]
+
+# Runs in the child process, with the function's directory as the first entry of sys.path
+CHILD = """
+import json, sys, time
+import resources
+for key in ["storage_client", "storage_bucket", "publisher"]:
+    resources.register(key, object())
+before = len(sys.modules)
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": len(sys.modules) - before,
+                  "heavy": [name for name in %r if name in sys.modules]}))
+"""
+
+
+def measure(path):
+    environment = dict(os.environ, BUCKET_NAME="bench", PROJECT_NUMBER="0", LLM_CACHE="off", PYTHONPATH=path)
+    result = subprocess.run([sys.executable, "-c", CHILD % (HEAVY,)], cwd=path, env=environment,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--src", default=SRC, help="the directory holding the functions' source")
+    args = parser.parse_args()
+
+    print(f"{'function':<22}{'p50 (ms)':>10}{'max (ms)':>10}{'modules':>9}  heavy modules loaded at import")
+    for function in FUNCTIONS:
+        runs = [measure(os.path.join(args.src, function)) for _ in range(args.repetitions)]
+        durations = sorted(run["seconds"] * 1000 for run in runs)
+        print(f"{function:<22}{statistics.median(durations):>10.0f}{durations[-1]:>10.0f}{runs[-1]['modules']:>9}"
+              f"  {', '.join(runs[-1]['heavy']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Measures the per-invocation cost of creating Document AI clients, Vertex AI model handles and the tokenizer on every
+call, as the functions used to, against fetching them from the warm-instance resource registry.
+
+Usage: python benchmarks/bench_resources.py [iterations]
+"""
+
+import sys
+
+from common import load_module, timeit
+
+
+def main(iterations):
+    page_processor = load_module("page-processor", "resources")
+    parser = load_module("minute-book-parser", "resources")
+
+    def create_documentai_client():
+        from google.api_core.client_options import ClientOptions
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud import documentai_v1 as documentai
+        return documentai.DocumentProcessorServiceClient(
+            credentials=AnonymousCredentials(),
+            client_options=ClientOptions(api_endpoint="us-documentai.googleapis.com"))
+
+    def create_llm():
+        from langchain.llms import VertexAI
+        return VertexAI(model_name="text-bison", temperature=0.2, max_output_tokens=1024)
+
+    def create_tokenizer():
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+
+    benchmarks = [
+        ("documentai client", create_documentai_client,
+         lambda: page_processor.get(("documentai", "us-documentai.googleapis.com"), create_documentai_client)),
+        ("vertex ai llm", create_llm,
+         lambda: parser.get(("llm", "text-bison", 0.2, 1024), create_llm)),
+        ("tokenizer", create_tokenizer,
+         lambda: parser.get(("tokenizer", "cl100k_base"), create_tokenizer)),
+    ]
+
+    print(f"{'resource':<20}{'per call (ms)':>16}{'pooled (ms)':>16}")
+    for name, create, pooled in benchmarks:
+        try:
+            create()
+        except Exception as e:
+            print(f"{name:<20}  skipped: {type(e).__name__}: {e}")
+            continue
+
+        print(f"{name:<20}{timeit(create, iterations):>16.3f}{timeit(pooled, iterations):>16.4f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,95 @@
+"""
+Compares page-processor's native table-to-CSV conversion (tables.py) with the documentai_toolbox path it replaces,
+which wrapped the whole Form Parser document and went through a pandas DataFrame for every table. The documents are
+synthetic: each page has several tables of header and body rows whose cells point into the document text through
+text anchors, as the Form Parser's do.
+
+The cold-start cost of each path, i.e. importing it in a fresh process, is measured as well.
+
+Usage: python benchmarks/bench_tables.py [pages] [tables_per_page] [rows] [iterations]
+"""
+
+import os
+import subprocess
+import sys
+
+from common import SRC, timeit
+
+sys.path.insert(0, os.path.join(SRC, "page-processor"))
+
+
+def synthetic_document(pages, tables_per_page, rows, columns=5):
+    from google.cloud import documentai_v1 as documentai
+
+    Document = documentai.Document
+    text = ""
+
+    def cell(value):
+        nonlocal text
+        start = len(text)
+        text += value + "\n"
+        segment = Document.TextAnchor.TextSegment(start_index=start, end_index=len(text))
+        return Document.Page.Table.TableCell(
+            layout=Document.Page.Layout(text_anchor=Document.TextAnchor(text_segments=[segment])))
+
+    document_pages = []
+    for page in range(pages):
+        page_tables = []
+        for table in range(tables_per_page):
+            header = Document.Page.Table.TableRow(cells=[cell(f"Column {column}") for column in range(columns)])
+            body = [Document.Page.Table.TableRow(cells=[cell(f"p{page} t{table}, row {row} \"{column}\"")
+                                                        for column in range(columns)])
+                    for row in range(rows)]
+            page_tables.append(Document.Page.Table(header_rows=[header], body_rows=body))
+        document_pages.append(Document.Page(page_number=page + 1, tables=page_tables))
+    return Document(text=text, pages=document_pages)
+
+
+def toolbox_to_csv(doc, page_index=None):
+    """
+    The previous tables_to_csv(), with its overwrite of all but the last table fixed so that the outputs compare,
+    and Table.to_csv() spelled out as it was in documentai_toolbox 0.4.1a0.
+    """
+    from google.cloud.documentai_toolbox import document
+    wrapped_document = document.Document.from_documentai_document(doc)
+
+    output = ""
+    for page_number, page in enumerate(wrapped_document.pages):
+        if page_index is not None and page_number != page_index:
+            continue
+        for table in page.tables:
+            output += "Comma-Separated Values Table\n===\n"
+            output += table.to_dataframe().to_csv(index=False)
+
+    return output
+
+
+def import_time(statement):
+    code = f"import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env=dict(os.environ, PYTHONPATH=os.path.join(SRC, "page-processor")))
+    return float(result.stdout.strip()) * 1000
+
+
+def main(pages, tables_per_page, rows, iterations):
+    import tables
+
+    doc = synthetic_document(pages, tables_per_page, rows)
+    assert tables.to_csv(doc) == toolbox_to_csv(doc)
+    assert tables.to_csv(doc, page_index=1) == toolbox_to_csv(doc, page_index=1)
+
+    print(f"{pages} pages with {tables_per_page} tables of {rows} rows, {iterations} iterations")
+    print(f"{'implementation':<16}{'per page (ms)':>15}{'import (ms)':>13}")
+    # page-processor converts each page of a multi-page response separately
+    for name, convert, statement in [
+            ("toolbox", toolbox_to_csv, "from google.cloud.documentai_toolbox import document"),
+            ("native", tables.to_csv, "import tables")]:
+        per_page = timeit(lambda: [convert(doc, page_index=index) for index in range(pages)], iterations) / pages
+        print(f"{name:<16}{per_page:>15.2f}{import_time(statement):>13.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 15,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+         int(sys.argv[4]) if len(sys.argv) > 4 else 5)
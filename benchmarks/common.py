@@ -0,0 +1,53 @@
+import importlib.util
+import os
+import time
+
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "terraform", "modules", "cloud_functions", "src")
+BUNDLE_SHARED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts", "bundle_shared.py")
+
+
+def bundle_shared():
+    """
+    Copies the modules in src/shared/ into each function, as scripts/bundle_shared.py does before deploying, so that
+    the benchmarks and tests run the current shared code.
+    """
+
+    spec = importlib.util.spec_from_file_location("bundle_shared", BUNDLE_SHARED)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.main(verbose=False)
+
+
+bundle_shared()
+
+
+def load_module(function, module_name):
+    """
+    Loads a single module from a Cloud Function's source directory under a unique name, so that modules with the
+    same name in different functions (e.g. resources.py) don't collide.
+
+    Args:
+        function (str): The name of the function's directory, e.g. "page-processor".
+        module_name (str): The name of the module in that directory, e.g. "resources".
+
+    Returns:
+        The loaded module.
+    """
+
+    path = os.path.join(SRC, function, module_name + ".py")
+    spec = importlib.util.spec_from_file_location(function.replace("-", "_") + "_" + module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timeit(func, iterations):
+    """
+    Returns the mean wall time of func in milliseconds over a number of iterations.
+    """
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
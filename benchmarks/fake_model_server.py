@@ -0,0 +1,116 @@
+"""
+A local stand-in for the Vertex AI text model, for exercising the minute-book-parser LLM gateway without GCP.
+
+It accepts the JSON requests sent by gateway.HTTPTransport and answers with canned output after a simulated
+latency. Requests above the configured quota are rejected with HTTP 429, like RESOURCE_EXHAUSTED from Vertex AI.
+
+Usage: python benchmarks/fake_model_server.py [--port 8089] [--qps 5] [--latency 0.5] [--straggler-rate 0.05]
+Then run the parser with LLM_ENDPOINT=http://127.0.0.1:8089/predict
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeModel:
+    """
+    Simulates a model endpoint with a per-second quota, a latency distribution with occasional stragglers and an
+    error rate. The respond callable decides the output for a prompt.
+    """
+
+    def __init__(self, qps=5.0, latency=0.5, straggler_rate=0.05, straggler_latency=10.0, error_rate=0.0,
+                 respond=None):
+        self.qps = qps
+        self.latency = latency
+        self.straggler_rate = straggler_rate
+        self.straggler_latency = straggler_latency
+        self.error_rate = error_rate
+        self.respond = respond or (lambda request: "Not Found")
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "prompt_chars": 0}
+        self._window = []
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """
+        Returns False if a request arriving now would exceed the quota over the last second.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1.0]
+            self.stats["requests"] += 1
+            if len(self._window) >= self.qps:
+                self.stats["rate_limited"] += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def handle(self, request):
+        """
+        Returns an (HTTP status, body) tuple for a request.
+        """
+        if not self.admit():
+            return 429, {"error": "RESOURCE_EXHAUSTED: Quota exceeded"}
+
+        with self._lock:
+            self.stats["prompt_chars"] += len(request.get("prompt", ""))
+
+        slow = random.random() < self.straggler_rate
+        time.sleep(self.straggler_latency if slow else random.uniform(0.5, 1.5) * self.latency)
+
+        if random.random() < self.error_rate:
+            with self._lock:
+                self.stats["errors"] += 1
+            return 503, {"error": "UNAVAILABLE"}
+
+        return 200, {"output": self.respond(request)}
+
+
+def serve(model, port=0):
+    """
+    Starts an HTTP server for a FakeModel on a background thread and returns it. The server's URL is
+    http://127.0.0.1:<server.server_port>/predict.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            status, body = model.handle(request)
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--qps", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--straggler-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    model = FakeModel(qps=args.qps, latency=args.latency, straggler_rate=args.straggler_rate,
+                      error_rate=args.error_rate)
+    server = serve(model, args.port)
+    print(f"Serving fake model on http://127.0.0.1:{server.server_port}/predict")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(model.stats))
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,413 @@
+"""
+In-memory stand-ins for the Google Cloud clients the functions use, with configurable latency, for running them
+locally in benchmarks. Each fake counts the calls made to it, so that a benchmark can report request counts
+alongside wall time.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import datetime
+import io
+import json
+import random
+import threading
+import time
+
+from google.api_core.exceptions import NotFound, PreconditionFailed, ServiceUnavailable
+
+
+class Latency:
+    """
+    The simulated latency and failure rate of a remote service.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        """
+        Args:
+            latency (float): The mean time in seconds a request takes.
+            jitter (float): The maximum time in seconds added to or taken from each request's latency.
+            error_rate (float): The fraction of requests that fail with ServiceUnavailable.
+        """
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def wait(self):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            raise ServiceUnavailable("simulated failure")
+
+
+class FakeBatch:
+    """
+    Collects the deletes made inside a `with client.batch():` block and applies them as one request on exit.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.deletes = []
+
+    def __enter__(self):
+        self.client._local.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.client._local.batch = None
+        if exc_type is not None:
+            return False
+
+        self.client.request("batch")
+        missing = False
+        for bucket, name in self.deletes:
+            missing |= not bucket._delete(name)
+        if missing:
+            raise NotFound("an object in the batch does not exist")
+        return False
+
+
+class FakeStorageClient:
+    """
+    A stand-in for google.cloud.storage.Client. Every bucket it creates shares its latency and call counter.
+    """
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.calls = collections.Counter()
+        self.buckets = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def request(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+        self.latency.wait()
+
+    def bucket(self, name):
+        with self._lock:
+            if name not in self.buckets:
+                self.buckets[name] = FakeBucket(self, name)
+            return self.buckets[name]
+
+    def get_bucket(self, name):
+        self.request("get_bucket")
+        return self.bucket(name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeBucket:
+    """
+    A stand-in for google.cloud.storage.Bucket, holding objects in a dict.
+    """
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.objects = {}
+        self._lock = threading.Lock()
+        self._generations = 0
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        self.client.request("get")
+        with self._lock:
+            if name not in self.objects:
+                return None
+        blob = FakeBlob(self, name)
+        blob._reload()
+        return blob
+
+    def list_blobs(self, prefix=""):
+        self.client.request("list")
+        with self._lock:
+            names = sorted(name for name in self.objects if name.startswith(prefix))
+        blobs = []
+        for name in names:
+            blob = FakeBlob(self, name)
+            blob._reload()
+            blobs.append(blob)
+        return iter(blobs)
+
+    def delete_blob(self, name):
+        self.blob(name).delete()
+
+    def _read(self, name):
+        with self._lock:
+            if name not in self.objects:
+                raise NotFound(f"{name} does not exist")
+            return self.objects[name]
+
+    def _write(self, name, data, metadata, content_type, if_generation_match=None):
+        with self._lock:
+            current = self.objects.get(name)
+            generation = current["generation"] if current else 0
+            if if_generation_match is not None and if_generation_match != generation:
+                raise PreconditionFailed(f"{name} is at generation {generation}")
+            self._generations += 1
+            self.objects[name] = {"data": data, "metadata": dict(metadata or {}), "content_type": content_type,
+                                  "generation": self._generations,
+                                  "time_created": datetime.datetime.now(datetime.timezone.utc)}
+            return self._generations
+
+    def _delete(self, name, if_generation_match=None):
+        with self._lock:
+            current = self.objects.get(name)
+            if current is None:
+                return False
+            if if_generation_match is not None and if_generation_match != current["generation"]:
+                raise PreconditionFailed(f"{name} is at generation {current['generation']}")
+            del self.objects[name]
+            return True
+
+
+class _Writer(io.BytesIO):
+    """
+    The file object returned by FakeBlob.open() for writing. The object is uploaded when it is closed.
+    """
+
+    def __init__(self, blob, content_type):
+        super().__init__()
+        self.blob = blob
+        self.content_type = content_type
+
+    def close(self):
+        if not self.closed:
+            self.blob.upload_from_string(self.getvalue(), content_type=self.content_type)
+        super().close()
+
+
+class FakeBlob:
+    """
+    A stand-in for google.cloud.storage.Blob.
+    """
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.metadata = None
+        self.content_type = None
+        self.generation = None
+        self.size = None
+        self.time_created = None
+
+    def _reload(self):
+        stored = self.bucket._read(self.name)
+        self.metadata = dict(stored["metadata"]) or None
+        self.content_type = stored["content_type"]
+        self.generation = stored["generation"]
+        self.size = len(stored["data"])
+        self.time_created = stored["time_created"]
+
+    def exists(self):
+        self.bucket.client.request("get")
+        try:
+            self.bucket._read(self.name)
+        except NotFound:
+            return False
+        return True
+
+    def download_as_bytes(self, start=None, end=None):
+        self.bucket.client.request("download")
+        stored = self.bucket._read(self.name)
+        self.generation = stored["generation"]
+        data = stored["data"]
+        if start is not None or end is not None:
+            data = data[start or 0:None if end is None else end + 1]
+        return data
+
+    def download_as_string(self, start=None, end=None):
+        return self.download_as_bytes(start, end)
+
+    def download_as_text(self, start=None, end=None):
+        return self.download_as_bytes(start, end).decode("utf-8")
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        self.bucket.client.request("upload")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.generation = self.bucket._write(self.name, data, self.metadata, content_type or self.content_type,
+                                             if_generation_match)
+        self.size = len(data)
+
+    def upload_from_file(self, file, size=None, rewind=False, content_type=None):
+        if rewind:
+            file.seek(0)
+        self.upload_from_string(file.read() if size is None else file.read(size), content_type=content_type)
+
+    def download_to_file(self, file):
+        file.write(self.download_as_bytes())
+
+    def open(self, mode="r", chunk_size=None, content_type=None, **kwargs):
+        if "w" in mode:
+            writer = _Writer(self, content_type)
+            return writer if "b" in mode else io.TextIOWrapper(writer, encoding="utf-8")
+        data = io.BytesIO(self.download_as_bytes())
+        return data if "b" in mode else io.TextIOWrapper(data, encoding="utf-8")
+
+    def delete(self, if_generation_match=None):
+        batch = getattr(self.bucket.client._local, "batch", None)
+        if batch is not None:
+            batch.deletes.append((self.bucket, self.name))
+            return
+        self.bucket.client.request("delete")
+        if not self.bucket._delete(self.name, if_generation_match):
+            raise NotFound(f"{self.name} does not exist")
+
+    def compose(self, sources):
+        self.bucket.client.request("compose")
+        data = b"".join(self.bucket._read(source.name)["data"] for source in sources)
+        self.generation = self.bucket._write(self.name, data, self.metadata, self.content_type)
+        self.size = len(data)
+
+
+class FakePublisher:
+    """
+    A stand-in for google.cloud.pubsub_v1.PublisherClient that hands each published message to a callback, e.g. to
+    queue it for the next stage of the pipeline.
+    """
+
+    def __init__(self, deliver, latency=None):
+        """
+        Args:
+            deliver (Callable[[str, dict], None]): Called with the topic name and the decoded message.
+            latency (Latency): The simulated latency of a publish request.
+        """
+
+        self.deliver = deliver
+        self.latency = latency or Latency()
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+
+    def topic_path(self, project, topic):
+        return f"projects/{project}/topics/{topic}"
+
+    def publish(self, topic, data):
+        with self._lock:
+            self.calls[topic.rsplit("/", 1)[-1]] += 1
+        self.latency.wait()
+        self.deliver(topic.rsplit("/", 1)[-1], json.loads(data))
+        future = concurrent.futures.Future()
+        future.set_result(str(sum(self.calls.values())))
+        return future
+
+
+class FakeDocumentAI:
+    """
+    A stand-in for documentai.DocumentProcessorServiceClient that answers from the pages of the submitted PDF.
+
+    Each page is identified by a marker in its page dictionary (see pipeline.py), which the classify and text
+    callbacks map to a class and to the page's text. Responses are real Document AI protos, so the page-processor
+    code that reads them runs unchanged. OCR responses split each page into paragraphs at blank lines, stacked down
+    the page.
+    """
+
+    def __init__(self, classifier_id, classify, text, marker="/SynthPage", latency=None):
+        """
+        Args:
+            classifier_id (str): The processor ID of the classifier. Every other processor is treated as OCR.
+            classify (Callable[[int], str]): Returns the class of the page with the given marker.
+            text (Callable[[int], str]): Returns the text of the page with the given marker.
+            marker (str): The page dictionary key that holds each page's marker.
+            latency (Latency): The simulated latency of a request.
+        """
+
+        self.classifier_id = classifier_id
+        self.classify = classify
+        self.text = text
+        self.marker = marker
+        self.latency = latency or Latency()
+        self.calls = collections.Counter()
+        self.pages = collections.Counter()
+        self._lock = threading.Lock()
+
+    def processor_version_path(self, project, location, processor, processor_version):
+        return f"projects/{project}/locations/{location}/processors/{processor}/processorVersions/{processor_version}"
+
+    def process_document(self, request):
+        from google.cloud import documentai_v1 as documentai
+        from PyPDF2 import PdfReader
+
+        processor = request.name.split("/processors/")[1].split("/")[0]
+        markers = [int(page[self.marker]) for page in PdfReader(io.BytesIO(request.raw_document.content)).pages]
+        kind = "classifier" if processor == self.classifier_id else "ocr"
+        with self._lock:
+            self.calls[kind] += 1
+            self.pages[kind] += len(markers)
+        self.latency.wait()
+
+        if kind == "classifier":
+            entity = documentai.Document.Entity(type_=self.classify(markers[0]), confidence=0.9)
+            return documentai.ProcessResponse(document=documentai.Document(entities=[entity]))
+
+        text = ""
+        pages = []
+        def layout(start, end, top=0.0, bottom=1.0):
+            segment = documentai.Document.TextAnchor.TextSegment(start_index=start, end_index=end)
+            corners = [(0.1, top), (0.9, top), (0.9, bottom), (0.1, bottom)]
+            vertices = [documentai.NormalizedVertex(x=x, y=y) for x, y in corners]
+            box = documentai.BoundingPoly(normalized_vertices=vertices)
+            return documentai.Document.Page.Layout(text_anchor=documentai.Document.TextAnchor(text_segments=[segment]),
+                                                   bounding_poly=box)
+
+        for page_number, marker in enumerate(markers, start=1):
+            page_start = len(text)
+            paragraphs = []
+            blocks = self.text(marker).split("\n\n")
+            for index, block in enumerate(blocks):
+                start = len(text)
+                text += block + ("\n\n" if index < len(blocks) - 1 else "")
+                top, bottom = 0.1 + 0.8 * index / len(blocks), 0.1 + 0.8 * (index + 1) / len(blocks)
+                paragraphs.append(documentai.Document.Page.Paragraph(layout=layout(start, len(text), top, bottom)))
+            pages.append(documentai.Document.Page(page_number=page_number, layout=layout(page_start, len(text)),
+                                                  paragraphs=paragraphs))
+        return documentai.ProcessResponse(document=documentai.Document(text=text, pages=pages))
+
+
+class FakeTokenizer:
+    """
+    A stand-in for a tiktoken encoding that splits on whitespace and punctuation, for running without network
+    access to download the real encoding's data. Counts are within about 30% of cl100k_base for English prose.
+    """
+
+    def encode(self, text):
+        import re
+        return re.findall(r"\w+|[^\w\s]", text)
+
+
+class FakeModel:
+    """
+    An asynchronous transport for the minute-book-parser's LLM gateway that answers prompts locally.
+    """
+
+    def __init__(self, respond, latency=None, tokenizer=None):
+        """
+        Args:
+            respond (Callable[[str], str]): Returns the model's output for a rendered prompt.
+            latency (Latency): The simulated latency of a request. Failures are raised as ServiceUnavailable, which
+              the gateway retries.
+            tokenizer: Counts prompt and response tokens. Defaults to FakeTokenizer.
+        """
+
+        self.respond = respond
+        self.latency = latency or Latency()
+        self.tokenizer = tokenizer or FakeTokenizer()
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+
+    async def __call__(self, request):
+        loop = asyncio.get_running_loop()
+        # Latency.wait() sleeps, so run it off the gateway's event loop
+        await loop.run_in_executor(None, self.latency.wait)
+        output = self.respond(request["prompt"])
+        with self._lock:
+            self.calls["requests"] += 1
+            self.calls["prompt_tokens"] += len(self.tokenizer.encode(request["prompt"]))
+            self.calls["response_tokens"] += len(self.tokenizer.encode(output))
+        return output
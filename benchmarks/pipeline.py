@@ -0,0 +1,398 @@
+"""
+Runs input-listener -> page-processor -> minute-book-parser end to end on a synthetic minute book, entirely offline.
+
+Cloud Storage, Pub/Sub, Document AI and the language model are replaced by the in-memory fakes in fakes.py, each
+with configurable latency and error rates, by registering them in each function's `resources` registry before its
+main module is imported. Each function's modules are imported in isolation and swapped into sys.modules while that
+function runs, since all three have modules with the same names (main, resources, ...).
+
+For every stage the harness reports wall time, peak memory allocated by Python (tracemalloc), and the calls made to
+each fake: Cloud Storage requests by operation, Document AI requests and pages, Pub/Sub messages, and LLM requests
+with prompt and response tokens.
+
+Usage: python benchmarks/pipeline.py [--pages 10,100,1000] [--gcs-latency-ms 5] [--docai-latency-ms 200] ...
+"""
+
+import argparse
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import importlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+import types
+
+from common import SRC
+from fakes import FakeDocumentAI, FakeModel, FakePublisher, FakeStorageClient, FakeTokenizer, Latency
+
+
+BUCKET = "bench"
+BOOK = "input/synthetic-minute-book.pdf"
+ENVIRONMENT = {
+    "BUCKET_NAME": BUCKET,
+    "PROJECT_ID": "bench-project",
+    "PROJECT_NUMBER": "0",
+    "REGION": "us-central1",
+    "CLASSIFIER_PROCESSOR_ID": "classifier",
+    "CLASSIFIER_PROCESSOR_VERSION": "1",
+    "OCR_PROCESSOR_ID": "ocr",
+    "OCR_PROCESSOR_VERSION": "1",
+    "FORM_PARSER_PROCESSOR_ID": "form-parser",
+    "FORM_PARSER_PROCESSOR_VERSION": "1",
+    "LLM_CACHE": "off",
+}
+
+# The page dictionary key that identifies each synthetic page to the fake Document AI
+MARKER = "/SynthPage"
+
+ARTICLES = ("ARTICLES of ACME HOLDINGS LTD. Incorporation number BC1234567. Business Number 123456789. "
+            "The registered office address is 100 Main Street, Vancouver, BC V6B 1A1. The number of directors "
+            "shall be not less than 1 and not more than 10, and the minimum number is one.")
+DIRECTORS = ("REGISTER OF DIRECTORS. {first} was elected a director on 2019-03-{day:02d}, address 12 Oak Avenue, "
+             "Vancouver, BC V5K 0A{day_digit}. {second} was elected a director on 2020-06-{day:02d}, address 7 Pine "
+             "Road, Burnaby, BC V5H 2B{day_digit}.")
+OFFICERS = "REGISTER OF OFFICERS. {first} was appointed President and officer on 2019-03-{day:02d}."
+QUORUM = ("The quorum for the transaction of business at a meeting of shareholders is two persons present in person "
+          "or by proxy, and the quorum for meetings of the board is a majority of the directors. Section {number}.")
+SHARES = ("The Company is authorized to issue an unlimited number of Class A Common shares with one vote per share, "
+          "and an unlimited number of Class B Preferred shares without voting rights. Article {number}.")
+RESTRICTIONS = ("No shares may be transferred without the approval of the directors; these transfer restrictions "
+                "and the other restrictions set out in the articles apply. Other provisions: none. Part {number}.")
+MINUTES = ("Minutes of a meeting of the board held on 2021-{month:02d}-{day:02d}. It was resolved that the financial "
+           "statements for fiscal year {number} be approved, that the auditors be reappointed for a further term, and "
+           "that the directors be authorized to sign the annual return on behalf of the Company.")
+BLANK_FORM = "SHAREHOLDERS' LEDGER. Name. Date. Certificate No. Shares Issued. Shares Transferred. Balance."
+# A clause without any of the parser's keywords, which fills out the pages that hold the clauses it looks for
+BOILERPLATE = ("In these by-laws, words importing the singular include the plural and vice versa, and words importing "
+               "a person include a corporation, partnership, trust and any unincorporated organization. Headings are "
+               "for convenience of reference only and do not affect the interpretation of these by-laws. Any reference "
+               "to a statute includes every regulation made under it and every amendment to it in force from time to "
+               "time.")
+NAMES = ["Jane Doe", "John Smith", "Maria Garcia", "Wei Chen", "Amit Patel", "Sarah Brown", "Liam Wilson"]
+
+
+def clauses(*paragraphs):
+    """
+    Returns the text of a page of by-laws, numbering its clauses the way by-laws are.
+    """
+
+    return "\n\n".join(f"{clause}. {paragraph}" for clause, paragraph in enumerate(paragraphs, start=1))
+
+
+def synthetic_page(number):
+    """
+    Returns the Document AI class and the text of a page of the synthetic minute book. The mix of pages trips every
+    section's triggers, and every 20th page repeats the same blank form so that deduplication has work to do.
+    """
+
+    first, second = NAMES[number % len(NAMES)], NAMES[(number + 3) % len(NAMES)]
+    fields = {"first": first, "second": second, "number": number, "day": number % 28 + 1,
+              "day_digit": number % 10, "month": number % 12 + 1}
+    if number == 1:
+        return "other", ARTICLES
+    if number % 20 == 0:
+        return "form-parser", BLANK_FORM
+    if number % 25 == 3:
+        return "form-parser", DIRECTORS.format(**fields)
+    if number % 40 == 7:
+        return "form-parser", OFFICERS.format(**fields)
+    if number % 30 == 11:
+        return "dense-ocr", clauses(BOILERPLATE, QUORUM.format(**fields), BOILERPLATE, BOILERPLATE)
+    if number % 35 == 13:
+        return "dense-ocr", clauses(BOILERPLATE, SHARES.format(**fields), BOILERPLATE, BOILERPLATE)
+    if number % 45 == 17:
+        return "dense-ocr", clauses(BOILERPLATE, BOILERPLATE, RESTRICTIONS.format(**fields), BOILERPLATE)
+    return "dense-ocr", "\n\n".join([MINUTES.format(**fields), BOILERPLATE])
+
+
+def synthetic_pdf(pages, text_layer_rate=0.0, seed=0):
+    """
+    Builds a minute book of scanned-looking pages, each of which draws a small image and carries its page number under
+    MARKER in its page dictionary. A fraction of the pages also get an embedded text layer, which page-processor's
+    pre-filter reads instead of calling Document AI.
+
+    Returns:
+        bytes: The PDF.
+    """
+
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray /BitsPerComponent 8 "
+               b"/Length 1 >>\nstream\n\x80\nendstream",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for number in range(1, pages + 1):
+        stream = b"q 612 0 0 792 0 0 cm /Im0 Do Q"
+        if rng.random() < text_layer_rate:
+            text = synthetic_page(number)[1].encode("latin-1").replace(b"\\", b"\\\\")
+            text = text.replace(b"(", b"\\(").replace(b")", b"\\)")
+            stream = b"BT /F1 10 Tf 36 740 Td (" + text + b") Tj ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                       b"/Resources << /XObject << /Im0 3 0 R >> /Font << /F1 4 0 R >> >> %s %d >>"
+                       % (len(objects), MARKER.encode(), number))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % pages
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return output
+
+
+def respond(prompt):
+    """
+    Answers a minute-book-parser prompt the way the model would for the synthetic minute book, keyed on the label
+    that ends each prompt template.
+    """
+
+    label = prompt.rstrip().rsplit("\n", 1)[-1].strip()
+    passage = prompt.rsplit("Passage:", 1)[-1]
+    if label == "Directors JSON:":
+        directors = [{"director_name": name, "date_elected": date, "date_retired": "", "address": ""}
+                     for name, date in re.findall(r"([A-Z][a-z]+ [A-Z][a-z]+) was elected a director on ([\d-]+)",
+                                                  passage)]
+        return json.dumps(directors) if directors else "[]"
+    if label == "Officers JSON:":
+        officers = [{"officer_name": name, "position_held": position, "date_appointed": date, "date_retired": "",
+                     "address": ""}
+                    for name, position, date in re.findall(
+                        r"([A-Z][a-z]+ [A-Z][a-z]+) was appointed (\w+) and officer on ([\d-]+)", passage)]
+        return json.dumps(officers) if officers else "[]"
+    if label == "Share Classes JSON:":
+        if "Class A" not in passage:
+            return "[]"
+        return json.dumps([{"share_class": "Class A Common", "voting_rights": "Yes", "votes_per_share": "1",
+                            "notes": "Unlimited number authorized"},
+                           {"share_class": "Class B Preferred", "voting_rights": "No", "votes_per_share": "0",
+                            "notes": "Unlimited number authorized"}])
+    if label == "Entity:":
+        return "ACME HOLDINGS LTD." if "ACME HOLDINGS" in passage else "Not Found"
+    if label == "JSON:":
+        if "ARTICLES" not in passage:
+            return "{}"
+        return json.dumps({"entity_name": "ACME HOLDINGS LTD.", "corporation_number": "BC1234567",
+                           "formation_date": "2015-01-01", "entity_type": "corporation",
+                           "address": "100 Main Street, Vancouver, BC V6B 1A1", "home_jurisdiction": "BC, Canada"})
+    if label == "Address:":
+        return "12 Oak Avenue, Vancouver, BC V5K 0A1"
+    if label in ("Minimum:", "Maximum:"):
+        return ("1" if label == "Minimum:" else "10") if "ARTICLES" in passage else "Not Found"
+    if label in ("Director Quorum:", "Shareholder Quorum:"):
+        return "A majority of the directors" if label == "Director Quorum:" else "Two persons present or by proxy"
+    if label == "Share Transfer Restrictions:" and "transfer restrictions" in passage:
+        return "No shares may be transferred without the approval of the directors"
+    return "Not Found"
+
+
+def cloud_event(data):
+    return types.SimpleNamespace(data=data)
+
+
+def pubsub_event(msg):
+    return cloud_event({"message": {"data": base64.b64encode(json.dumps(msg).encode("utf-8")).decode()}})
+
+
+class Function:
+    """
+    The modules of one Cloud Function, imported from its source directory in isolation from the other functions'.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = os.path.join(SRC, name)
+        self.names = {file[:-3] for file in os.listdir(self.path) if file.endswith(".py")}
+        self.modules = {}
+
+    @contextlib.contextmanager
+    def activate(self):
+        """
+        Makes this function's modules the ones that `import` finds for the duration of the block.
+        """
+
+        saved = {name: sys.modules.pop(name) for name in self.names if name in sys.modules}
+        sys.modules.update(self.modules)
+        sys.path.insert(0, self.path)
+        try:
+            yield
+        finally:
+            sys.path.remove(self.path)
+            for name in self.names:
+                if name in sys.modules:
+                    self.modules[name] = sys.modules.pop(name)
+            sys.modules.update(saved)
+
+    def load(self, resources):
+        """
+        Imports the function's main module after registering stand-ins in its resources registry.
+
+        Args:
+            resources (Callable[[module], None]): Registers the stand-ins, given the function's resources module.
+        """
+
+        with self.activate():
+            resources(importlib.import_module("resources"))
+            self.main = importlib.import_module("main")
+        return self
+
+
+class Stage:
+    """
+    Measures the wall time, peak memory and fake service calls of one stage of the pipeline.
+    """
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+
+    def _snapshot(self):
+        return {name: collections.Counter(counter()) for name, counter in self.counters.items()}
+
+    def __enter__(self):
+        self.before = self._snapshot()
+        tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        self.peak = tracemalloc.get_traced_memory()[1]
+        after = self._snapshot()
+        self.calls = {name: after[name] - self.before[name] for name in after}
+        return False
+
+
+def run(pages, args):
+    """
+    Runs the pipeline once on a synthetic minute book of the given number of pages.
+
+    Returns:
+        tuple: The stages, and the final output the parser wrote, as a string.
+    """
+
+    os.environ.update(ENVIRONMENT)
+    os.environ["PAGES_PER_MESSAGE"] = str(args.pages_per_message)
+    os.environ["PARSER_MODE"] = args.parser_mode
+    os.environ["FANOUT_PAGES_PER_ITEM"] = str(args.fanout_pages_per_item)
+
+    storage = FakeStorageClient(Latency(args.gcs_latency_ms / 1000, args.gcs_latency_ms / 4000, args.gcs_error_rate))
+    bucket = storage.bucket(BUCKET)
+    queues = collections.defaultdict(list)
+    publisher = FakePublisher(lambda topic, msg: queues[topic].append(msg), Latency(args.pubsub_latency_ms / 1000))
+    classes = {number: synthetic_page(number)[0] for number in range(1, pages + 1)}
+    documentai = FakeDocumentAI("classifier", classes.get, lambda number: synthetic_page(number)[1],
+                                marker=MARKER, latency=Latency(args.docai_latency_ms / 1000,
+                                                               args.docai_latency_ms / 4000, args.docai_error_rate))
+    model = FakeModel(respond, Latency(args.llm_latency_ms / 1000, args.llm_latency_ms / 4000, args.llm_error_rate))
+
+    def register_clients(resources):
+        resources.clear()
+        resources.register("storage_client", storage)
+        resources.register("storage_bucket", bucket)
+        resources.register("publisher", publisher)
+        resources.register(("documentai", "us-documentai.googleapis.com"), documentai)
+        resources.register(("tokenizer", "cl100k_base"), FakeTokenizer())
+
+    functions = {name: Function(name).load(register_clients)
+                 for name in ["input-listener", "page-processor", "minute-book-parser"]}
+    parser = functions["minute-book-parser"]
+    with parser.activate():
+        gateway = importlib.import_module("gateway")
+        importlib.import_module("resources").register(
+            "gateway", gateway.Gateway(model, rate=args.llm_rate, max_rate=args.llm_rate,
+                                       max_in_flight=args.llm_in_flight, backoff_base=0.05, hedge=False))
+
+    bucket._write(BOOK, synthetic_pdf(pages, args.text_layer_rate), None, "application/pdf")
+    counters = {"gcs": lambda: storage.calls, "docai": lambda: dict(documentai.calls, **{
+        "pages_" + kind: count for kind, count in documentai.pages.items()}),
+        "pubsub": lambda: publisher.calls, "llm": lambda: model.calls}
+
+    stages = []
+    with functions["input-listener"].activate(), Stage("input-listener", counters) as stage:
+        functions["input-listener"].main.main(cloud_event({"name": BOOK}))
+    stages.append(stage)
+
+    with functions["page-processor"].activate(), Stage("page-processor", counters) as stage:
+        messages, queues["split-pages"] = queues["split-pages"], []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.page_concurrency) as executor:
+            for future in [executor.submit(functions["page-processor"].main.main, pubsub_event(msg))
+                           for msg in messages]:
+                future.result()
+    stages.append(stage)
+
+    with parser.activate(), Stage("minute-book-parser", counters) as stage:
+        messages, queues["parse-minute-book"] = queues["parse-minute-book"], []
+        assert len(messages) == 1, f"expected one parse-minute-book message, got {len(messages)}"
+        if args.parser_mode == "fanout":
+            # Work items are delivered in-process, to as many workers at once as page-processor runs
+            broker = importlib.import_module("fanout").LocalBroker(
+                lambda msg: parser.main.work_item(msg, broker), max_workers=args.page_concurrency)
+            importlib.import_module("resources").register("broker", broker)
+        parser.main.main(pubsub_event(messages[0]))
+        if args.parser_mode == "fanout":
+            broker.drain()
+    stages.append(stage)
+
+    final = bucket.objects.get("output/final/synthetic-minute-book.json")
+    assert final is not None, "the parser wrote no output"
+    return stages, final["data"].decode("utf-8")
+
+
+def report(pages, stages):
+    print(f"\n{pages} pages")
+    print(f"{'stage':<20}{'wall (s)':>10}{'peak (MB)':>11}  calls")
+    for stage in stages:
+        calls = "; ".join(f"{name}: " + ", ".join(f"{key}={value}" for key, value in sorted(counter.items()))
+                          for name, counter in stage.calls.items() if counter)
+        print(f"{stage.name:<20}{stage.seconds:>10.2f}{stage.peak / 2 ** 20:>11.1f}  {calls}")
+    print(f"{'total':<20}{sum(stage.seconds for stage in stages):>10.2f}")
+
+
+def arguments(argv=None):
+    """
+    Parses the command line options, or argv if given, e.g. to run the pipeline from a test.
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", default="10,100", help="comma-separated book sizes, from 10 to 1000")
+    parser.add_argument("--pages-per-message", type=int, default=5)
+    parser.add_argument("--page-concurrency", type=int, default=8,
+                        help="the number of page-processor invocations running at once")
+    parser.add_argument("--text-layer-rate", type=float, default=0.2,
+                        help="the fraction of pages with an embedded text layer")
+    parser.add_argument("--gcs-latency-ms", type=float, default=5)
+    parser.add_argument("--gcs-error-rate", type=float, default=0.0)
+    parser.add_argument("--pubsub-latency-ms", type=float, default=1)
+    parser.add_argument("--docai-latency-ms", type=float, default=200)
+    parser.add_argument("--docai-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate", type=float, default=50, help="LLM requests admitted per second")
+    parser.add_argument("--llm-in-flight", type=int, default=16)
+    parser.add_argument("--parser-mode", choices=["single", "fanout"], default="single",
+                        help="parse the book in one invocation, or fan it out to workers through fanout.LocalBroker")
+    parser.add_argument("--fanout-pages-per-item", type=int, default=50)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = arguments()
+    tracemalloc.start()
+    for pages in [int(pages) for pages in args.pages.split(",")]:
+        report(pages, run(pages, args)[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Copies the modules that several Cloud Functions share, such as the resources registry and tracing, from
+terraform/modules/cloud_functions/src/shared/ into the source of each function that imports them, so that each
+function is deployed with the same code. The copies aren't checked in: edit the modules in shared/ and run this
+before `terraform apply`. The benchmarks and tests run it themselves.
+
+Usage: python scripts/bundle_shared.py
+"""
+
+import os
+import shutil
+
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "terraform", "modules", "cloud_functions", "src")
+# The functions each shared module is copied into
+MODULES = {
+    "resources.py": ["input-listener", "page-processor", "minute-book-parser"],
+    "tracing.py": ["input-listener", "page-processor", "minute-book-parser"],
+    "completion.py": ["page-processor", "minute-book-parser"],
+    "cleanup.py": ["page-processor", "minute-book-parser"],
+}
+
+
+def main(verbose=True):
+    for module, functions in MODULES.items():
+        source = os.path.join(SRC, "shared", module)
+        for function in functions:
+            destination = os.path.join(SRC, function, module)
+            with open(source, "rb") as file:
+                content = file.read()
+            if os.path.exists(destination):
+                with open(destination, "rb") as file:
+                    if file.read() == content:
+                        continue
+            shutil.copyfile(source, destination)
+            if verbose:
+                print(f"Copied {module} into {os.path.normpath(os.path.join(SRC, function))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Downloads the tiktoken encoding data that page-processor and minute-book-parser count tokens with into a
+tiktoken_cache/ directory in each function's source, so that it is zipped into the deployment and read from there
+instead of being downloaded by every cold instance. Run it once before `terraform apply`.
+
+Usage: python scripts/bundle_tiktoken.py [encoding_name]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "terraform", "modules", "cloud_functions", "src")
+FUNCTIONS = ["page-processor", "minute-book-parser"]
+
+
+def main(encoding_name):
+    with tempfile.TemporaryDirectory() as cache:
+        os.environ["TIKTOKEN_CACHE_DIR"] = cache
+        import tiktoken
+        tiktoken.get_encoding(encoding_name)
+
+        for function in FUNCTIONS:
+            destination = os.path.join(SRC, function, "tiktoken_cache")
+            os.makedirs(destination, exist_ok=True)
+            for name in os.listdir(cache):
+                shutil.copy(os.path.join(cache, name), os.path.join(destination, name))
+            print(f"Bundled {encoding_name} with {function} in {os.path.normpath(destination)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "cl100k_base")
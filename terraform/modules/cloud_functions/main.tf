@@ -69,6 +69,11 @@ resource "google_pubsub_topic" "parse-minute-book" {
   project = var.project_id
 }
 
+resource "google_pubsub_topic" "parse-minute-book-items" {
+  name = "parse-minute-book-items"
+  project = var.project_id
+}
+
 resource "google_cloudfunctions2_function" "page-processor" {
   name = "page-processor"
   location = var.region
@@ -319,7 +324,7 @@ resource "google_cloudfunctions2_function" "minute-book-parser" {
     trigger_region = var.region
     event_type     = "google.cloud.pubsub.topic.v1.messagePublished"
     pubsub_topic   = google_pubsub_topic.parse-minute-book.id
-    retry_policy   = "RETRY_POLICY_DO_NOT_RETRY"
+    retry_policy   = "RETRY_POLICY_RETRY"
   }
 
   depends_on = [
@@ -329,6 +334,57 @@ resource "google_cloudfunctions2_function" "minute-book-parser" {
   ]
 }
 
+// Processes the work items published by minute-book-parser when the PARSER_MODE environment variable is "fanout"
+resource "google_cloudfunctions2_function" "minute-book-parser-worker" {
+  name = "minute-book-parser-worker"
+  location = var.region
+  description = var.description
+  project = var.project_id
+
+  build_config {
+    runtime     = var.runtime
+    entry_point = "work"
+
+    source {
+      storage_source {
+        bucket = data.google_storage_bucket.this.id
+        object = google_storage_bucket_object.minute-book-parser-file.name
+      }
+    }
+  }
+
+  service_config {
+    min_instance_count = 0
+    max_instance_count  = 50
+    available_memory    = "512M"
+    timeout_seconds     = 3600
+    environment_variables = merge({"VERSION": 1}, var.env)
+    ingress_settings = "ALLOW_INTERNAL_ONLY"
+    all_traffic_on_latest_revision = true
+    service_account_email = google_service_account.account.email
+
+    secret_environment_variables {
+      key = "GOOGLE_API_KEY"
+      project_id = var.project_id
+      secret = google_secret_manager_secret.secret-google-api-key.secret_id
+      version = "latest"
+    }
+  }
+
+  event_trigger {
+    trigger_region = var.region
+    event_type     = "google.cloud.pubsub.topic.v1.messagePublished"
+    pubsub_topic   = google_pubsub_topic.parse-minute-book-items.id
+    retry_policy   = "RETRY_POLICY_RETRY"
+  }
+
+  depends_on = [
+    google_pubsub_topic.parse-minute-book-items,
+    google_storage_bucket_object.minute-book-parser-file,
+    time_sleep.wait_until_ready
+  ]
+}
+
 data "archive_file" "minute-book-parser-file" {
   type = "zip"
   output_path = "/tmp/minute-book-parser.zip"
@@ -1,50 +1,168 @@
-import io
+import collections
+import concurrent.futures
+import contextlib
 import os
+import tempfile
+import threading
 import json
 import functions_framework
 from PyPDF2 import PdfReader, PdfWriter
 from google.cloud import storage
 from google.cloud import pubsub_v1
+import resources
+import tracing
 
-storage_client = storage.Client()
-storage_bucket = storage_client.get_bucket(os.environ.get('BUCKET_NAME'))
-publisher = pubsub_v1.PublisherClient()
+storage_client = resources.get("storage_client", storage.Client)
+# bucket() makes a handle without the metadata request that get_bucket() sends, which would delay every cold start
+storage_bucket = resources.get("storage_bucket", lambda: storage_client.bucket(os.environ.get('BUCKET_NAME')))
+# Page messages are small and published in bursts, so batch them rather than sending one request per page
+PUBLISH_BATCH_SETTINGS = pubsub_v1.types.BatchSettings(
+    max_messages=int(os.environ.get("PUBLISH_MAX_MESSAGES", 100)),
+    max_bytes=1024 * 1024,
+    max_latency=float(os.environ.get("PUBLISH_MAX_LATENCY", 0.05)),
+)
+publisher = resources.get("publisher", lambda: pubsub_v1.PublisherClient(batch_settings=PUBLISH_BATCH_SETTINGS))
 project_number = os.environ.get("PROJECT_NUMBER")
+# Pages larger than this are spooled to a temporary file on disk rather than kept in memory while uploading
+SPOOL_MAX_SIZE = int(os.environ.get("SPOOL_MAX_SIZE", 8 * 1024 * 1024))
 
 
 def send_to_pubsub(msg, topic):
+    """
+    Publishes a message and returns the publish future, which resolves to the message ID once Pub/Sub has accepted
+    it. Messages are batched by the publisher client according to PUBLISH_BATCH_SETTINGS.
+    """
     topic = publisher.topic_path(project_number, topic)
-    if publisher.publish(topic, data=json.dumps(msg).encode("utf-8")):
-        return msg
+    return publisher.publish(topic, data=json.dumps(msg).encode("utf-8"))
+
+
+def upload_page(buffer, path, uploads):
+    """
+    Uploads one page from a temporary file and closes it. Runs on the upload worker pool.
 
+    Args:
+        buffer (file): A temporary file positioned at the end of the page's PDF bytes.
+        path (str): The path of the page's blob.
+        uploads (threading.BoundedSemaphore): Released once the page has been uploaded, to admit the next page.
+    """
+    try:
+        size = buffer.tell()
+        blob = storage_bucket.blob(path)
+        with tracing.span("gcs.upload", object=path, bytes=size):
+            blob.upload_from_file(buffer, size=size, rewind=True,
+                                  content_type='application/pdf')
+    finally:
+        buffer.close()
+        uploads.release()
 
-def split_pages(input_bytes, output_path):
-    pdf_reader = PdfReader(io.BytesIO(input_bytes))
+
+def split_pages(input_file, output_path):
+    """
+    Splits a PDF into single-page PDFs, uploading each page to Cloud Storage and announcing it on the split-pages
+    topic. Pages are read from a seekable file and written through spooled temporary files, and at most
+    2 x SPLIT_UPLOAD_WORKERS pages are held waiting for the upload worker pool, so memory use is bounded by the size of
+    the largest pages rather than by the size of the minute book.
+
+    A range of pages is only announced once all of its pages have been uploaded, and this function only returns
+    once Pub/Sub has confirmed every message, so that the caller can safely delete the source.
+
+    Args:
+        input_file (file): A seekable binary file containing the minute book.
+        output_path (str): The name of the minute book's blob, used to name the pages.
+
+    Returns:
+        A list of the paths of the uploaded pages.
+    """
+    pdf_reader = PdfReader(input_file)
     pages = []
     total_pages = len(pdf_reader.pages)
+    # Consecutive pages are sent to page-processor together so they can share Document AI requests
+    pages_per_message = int(os.environ.get("PAGES_PER_MESSAGE", 1))
+    page_range = []
+    range_uploads = []
 
-    for page_num in range(total_pages):
-        pdf_writer = PdfWriter()
-        pdf_writer.add_page(pdf_reader.pages[page_num])
-        output_file_name = '{}_page_{}.pdf'.format(
-            os.path.splitext(os.path.basename(output_path))[0],
-            page_num + 1
-        )
+    workers = int(os.environ.get("SPLIT_UPLOAD_WORKERS", 8))
+    uploads = threading.BoundedSemaphore(workers * 2)
+    # Ranges whose pages are still uploading, in page order, and the publish futures of announced ranges
+    unannounced = collections.deque()
+    publish_futures = []
 
-        buffer = io.BytesIO()
-        pdf_writer.write_stream(buffer)
+    def announce(wait):
+        while unannounced and (wait or all(future.done() for future in unannounced[0][0])):
+            futures, msg = unannounced.popleft()
+            for future in futures:
+                future.result()
+            msg['trace_id'] = tracing.trace_id()
+            publish_futures.append(send_to_pubsub(msg=msg, topic="split-pages"))
 
-        path = "output/pdf/" + output_file_name
-        blob = storage_bucket.blob(path)
-        blob.upload_from_string(buffer.getvalue(),
-                                content_type='application/pdf')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for page_num in range(total_pages):
+            uploads.acquire()
+            pdf_writer = PdfWriter()
+            pdf_writer.add_page(pdf_reader.pages[page_num])
+            output_file_name = '{}_page_{}.pdf'.format(
+                os.path.splitext(os.path.basename(output_path))[0],
+                page_num + 1
+            )
+
+            path = "output/pdf/" + output_file_name
+            buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            pdf_writer.write_stream(buffer)
+            range_uploads.append(executor.submit(tracing.wrap(upload_page), buffer, path, uploads))
+            page_range.append(path)
+
+            # Release the page and the objects the reader has parsed for it, which would otherwise be cached until the
+            # whole book has been split
+            del pdf_writer
+            pdf_reader.resolved_objects.clear()
+
+            if len(page_range) == pages_per_message or page_num + 1 == total_pages:
+                if len(page_range) == 1:
+                    msg = {'file': path, 'page': (page_num + 1), 'total_pages': total_pages}
+                else:
+                    msg = {'files': page_range, 'first_page': (page_num + 2 - len(page_range)),
+                           'last_page': (page_num + 1), 'total_pages': total_pages}
 
-        msg = send_to_pubsub(msg={'file': path, 'page': (page_num + 1), 'total_pages': total_pages}, topic="split-pages")
-        pages.append(msg)
+                pages.extend(page_range)
+                unannounced.append((range_uploads, msg))
+                page_range = []
+                range_uploads = []
+
+            announce(wait=False)
+
+        announce(wait=True)
+
+    for future in publish_futures:
+        future.result()
 
     return pages
 
 
+@contextlib.contextmanager
+def open_source(blob):
+    """
+    Opens a minute book for splitting without reading the whole of it into memory.
+
+    When SPLIT_SOURCE is "stream" (the default) the blob is read directly from Cloud Storage with ranged requests of
+    SOURCE_CHUNK_SIZE bytes. When it is "tempfile" the blob is first downloaded in chunks to a temporary file, which
+    makes fewer requests but, on 2nd gen Cloud Functions, counts against the instance's memory.
+
+    Args:
+        blob (google.cloud.storage.Blob): The minute book to split.
+
+    Yields:
+        A seekable binary file.
+    """
+    if os.environ.get("SPLIT_SOURCE", "stream") == "tempfile":
+        with tempfile.TemporaryFile() as source:
+            blob.download_to_file(source)
+            source.seek(0)
+            yield source
+    else:
+        with blob.open("rb", chunk_size=int(os.environ.get("SOURCE_CHUNK_SIZE", 8 * 1024 * 1024))) as source:
+            yield source
+
+
 @functions_framework.cloud_event
 def main(cloud_event):
     """Triggered by a change to a Cloud Storage bucket.
@@ -54,7 +172,11 @@ def main(cloud_event):
     file_name = cloud_event.data["name"]
 
     if ("input/" in file_name and file_name.endswith(".pdf")):
-        content = storage_bucket.get_blob(file_name).download_as_bytes()
-        pages = split_pages(content, file_name)
-        storage_bucket.delete_blob(file_name)
+        # Every span of this minute book, in all three functions, shares the trace started here
+        with tracing.trace(name="input-listener", book=file_name) as root:
+            with open_source(storage_bucket.blob(file_name)) as source:
+                pages = split_pages(source, file_name)
+            root.set(pages=len(pages))
+            with tracing.span("gcs.delete", object=file_name):
+                storage_bucket.delete_blob(file_name)
         print("Split " + file_name + " into " + str(len(pages)) + " pages")
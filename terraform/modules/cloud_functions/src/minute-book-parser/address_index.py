@@ -0,0 +1,130 @@
+import bisect
+import re
+
+
+POSTAL_CODE = re.compile(r"[a-z]\d[a-z] ?\d[a-z]\d")
+ZIP_CODE = re.compile(r"\b\d{5}(?:-\d{4})?\b")
+ADDRESS = re.compile(r"address")
+NAME_TOKEN = re.compile(r"[a-z][a-z'\-]*")
+
+# The distance in characters within which a code following a name is taken to be that person's
+FOLLOWING_CODE_DISTANCE = 300
+# Pages that mention "address" but have no postal or zip code near the name rank after every page that does
+ADDRESS_KEYWORD_DISTANCE = 10000
+
+
+class AddressIndex:
+    """
+    An index of the names and postal/zip codes on every page of a minute book, built in a single pass, so that the
+    passages most likely to contain a person's address can be found without rescanning the book for each person.
+    """
+
+    def __init__(self, corpus):
+        """
+        Args:
+        - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+        """
+
+        self.corpus = corpus
+        self._tokens = {}
+        self._names = {}
+        self._codes = {}
+        self._has_address = set()
+
+        for page_number, _ in corpus:
+            content = corpus.lowercase(page_number)
+
+            tokens = [(match.group(), match.start(), match.end()) for match in NAME_TOKEN.finditer(content)]
+            self._tokens[page_number] = tokens
+            for position, (token, _, _) in enumerate(tokens):
+                self._names.setdefault(token, []).append((page_number, position))
+
+            codes = [(match.start(), match.end()) for match in POSTAL_CODE.finditer(content)]
+            codes += [(match.start(), match.end()) for match in ZIP_CODE.finditer(content)]
+            if codes:
+                self._codes[page_number] = sorted(codes)
+            if ADDRESS.search(content):
+                self._has_address.add(page_number)
+
+    def _occurrences(self, person):
+        """
+        Yields (page_number, start, end) for every occurrence of a person's name, as "First Last" or "Last, First".
+        """
+
+        tokens = NAME_TOKEN.findall(person.lower())
+        if not tokens:
+            return
+
+        variants = [tokens]
+        if len(tokens) > 1:
+            variants.append([tokens[-1]] + tokens[:-1])
+
+        for variant in variants:
+            for page_number, position in self._names.get(variant[0], []):
+                page_tokens = self._tokens[page_number]
+                following = page_tokens[position:position + len(variant)]
+                if [token for token, _, _ in following] == variant:
+                    yield page_number, following[0][1], following[-1][2]
+
+    def _nearest_code(self, page_number, start, end):
+        """
+        Returns the (start, end) of the postal or zip code most likely to belong to a span of a page, and its distance,
+        or None. Addresses usually follow a name, so the first code after the span is preferred if it is within
+        FOLLOWING_CODE_DISTANCE characters; otherwise the closest code in either direction is used.
+        """
+
+        codes = self._codes.get(page_number)
+        if not codes:
+            return None
+
+        index = bisect.bisect_left(codes, (end, end))
+        if index < len(codes) and codes[index][0] - end <= FOLLOWING_CODE_DISTANCE:
+            return codes[index], codes[index][0] - end
+
+        nearby = codes[max(0, index - 1):index + 1]
+        distance, code = min((max(code_start - end, start - code_end, 0), (code_start, code_end))
+                             for code_start, code_end in nearby)
+        return code, distance
+
+    def candidates(self, person, limit=3, context=200):
+        """
+        Returns the passages most likely to contain a person's mailing address, closest first.
+
+        Args:
+        - person (str): A string representing a person's name.
+        - limit (int): The maximum number of passages to return.
+        - context (int): The number of characters of surrounding text to include around the name and the code.
+
+        Returns:
+        - A list of (page_number, passage) tuples.
+        """
+
+        ranked = []
+        for page_number, start, end in self._occurrences(person):
+            nearest = self._nearest_code(page_number, start, end)
+            if nearest is not None:
+                (code_start, code_end), distance = nearest
+                span = (min(start, code_start), max(end, code_end))
+            elif page_number in self._has_address:
+                distance = ADDRESS_KEYWORD_DISTANCE
+                span = (start, end)
+            else:
+                continue
+            ranked.append((distance, page_number, span))
+
+        passages = []
+        seen = set()
+        for distance, page_number, (start, end) in sorted(ranked):
+            content = self.corpus.content(page_number)
+            if len(content) != len(self.corpus.lowercase(page_number)):
+                # Lowercasing changed the length of the text, so offsets only line up with the lowercase copy
+                content = self.corpus.lowercase(page_number)
+
+            passage = content[max(0, start - context):end + context]
+            if passage not in seen:
+                seen.add(passage)
+                passages.append((page_number, passage))
+            if len(passages) == limit:
+                break
+
+        return passages
@@ -0,0 +1,67 @@
+import main
+import json
+import os
+import re
+from prompts import PromptTemplate
+
+
+def enabled(section):
+    """
+    Returns True if a section should extract all of the fields triggered on a passage with a single prompt.
+
+    Batching is switched on per section with the BATCHED_SECTIONS environment variable, a comma-separated list of
+    section names (e.g. "directors,quorum_rules") or "all", so that its accuracy can be compared against the
+    one-prompt-per-field path.
+    """
+
+    sections = [name.strip() for name in os.environ.get("BATCHED_SECTIONS", "").split(",")]
+    return "all" in sections or section in sections
+
+
+def extract_fields(content, fields, temperature=0.2, max_output_tokens=1024):
+    """
+    Extracts several fields from one passage with a single structured JSON prompt.
+
+    Args:
+    - content (str): The passage to extract from.
+    - fields (Dict[str, str]): A mapping of output keys to the question that each key answers.
+    - temperature (float): The sampling temperature.
+    - max_output_tokens (int): The maximum number of output tokens.
+
+    Returns:
+    - A dict mapping each key to its answer, or None where the answer was Not Found. Returns None instead of a dict
+      if the response isn't valid JSON, in which case the caller should fall back to one prompt per field.
+    """
+
+    schema = "\n".join(f'"{key}": string  // {question}' for key, question in fields.items())
+    prompt = PromptTemplate(
+        input_variables=["content"],
+        template="""Answer each of the following questions about this passage. The output should be a
+                    JSON object with the following schema:
+                    {{
+                    """ + schema.replace("{", "{{").replace("}", "}}") + """
+                    }}
+                    If the passage does not answer a question, use the value "Not Found" for its key.
+                    Format each value as a single line without linebreaks.
+                    Passage:
+                    {content}
+                    JSON:""")
+
+    output = main.predict(prompt, temperature=temperature, max_output_tokens=max_output_tokens, content=content)
+
+    match = re.search(r"\{.*\}", output, re.DOTALL)
+    try:
+        answers = json.loads(match.group() if match else output)
+    except json.decoder.JSONDecodeError:
+        return None
+
+    if not isinstance(answers, dict):
+        return None
+
+    results = {}
+    for key in fields:
+        value = answers.get(key)
+        if isinstance(value, (int, float)):
+            value = str(value)
+        results[key] = value.strip() if isinstance(value, str) and value.strip() != "Not Found" else None
+    return results
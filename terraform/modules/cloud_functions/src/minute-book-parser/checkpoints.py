@@ -0,0 +1,158 @@
+import json
+import random
+import time
+import tracing
+
+
+class Checkpoint:
+    """
+    Records the result of each window or page a section has finished extracting, so that a redelivered
+    parse-minute-book message can resume the section without repeating its LLM work.
+
+    Results are kept in one JSON object per section at checkpoints/<filename>/<section>.json, and written back at
+    most every min_interval seconds (Cloud Storage sustains about one update per second to a single object) and
+    whenever flush() is called. A checkpoint without a bucket keeps its results in memory only.
+    """
+
+    def __init__(self, bucket, path, min_interval=1.0, skip=()):
+        """
+        Args:
+        - bucket (google.cloud.storage.Bucket): The bucket to persist results to, or None to keep them in memory.
+        - path (str): The path of the checkpoint object.
+        - min_interval (float): The minimum number of seconds between writes.
+        - skip (tuple): Prefixes of keys whose work isn't done here; run() returns None for them without recording it.
+        """
+
+        self.bucket = bucket
+        self.path = path
+        self.min_interval = min_interval
+        self.skip = skip
+        self.completed = {}
+        self.resumed = 0
+        # Keys whose results were recorded before this run and haven't been reused yet
+        self._restored = set()
+        self._dirty = False
+        self._flushed = 0.0
+
+        if bucket is not None:
+            from google.api_core.exceptions import NotFound
+            try:
+                self.completed = json.loads(bucket.blob(path).download_as_bytes())
+            except NotFound:
+                pass
+        self._restored = set(self.completed)
+
+    @classmethod
+    def for_section(cls, bucket, prefix, section):
+        """
+        Returns the checkpoint for a section of the minute book whose pages are at prefix ("output/txt/<filename>").
+        """
+
+        return cls(bucket, directory(prefix) + section + ".json")
+
+    @classmethod
+    def for_item(cls, bucket, prefix, section, item):
+        """
+        Returns the checkpoint for one work item of a section when the minute book is parsed in fan-out mode.
+
+        A work item only sees its own pages, so it skips the address lookups, which search the whole book. They are
+        made by the merge instead, which gets the same answers as parsing the book in one invocation would.
+        """
+
+        return cls(bucket, directory(prefix) + section + "/" + str(item) + ".json", skip=("address:",))
+
+    def merge(self, results):
+        """
+        Adds results recorded by another checkpoint, such as a work item's, keeping any result already recorded here.
+        """
+
+        for key, result in results.items():
+            if key not in self.completed:
+                self.completed[key] = result
+                self._restored.add(key)
+
+    def run(self, key, extract):
+        """
+        Returns the recorded result for key if there is one, otherwise calls extract and records its result. Only
+        the first use of a result recorded before this run counts as resumed; a key that comes up again in the same
+        run, such as the address of a person named in two windows, just reuses the result.
+
+        Args:
+        - key (str): Identifies the unit of work, e.g. "directors:12-15" for a window over pages 12 to 15.
+        - extract (Callable[[], Any]): Performs the work. Its result must be JSON serializable.
+        """
+
+        if key.startswith(self.skip):
+            return None
+        if key in self.completed:
+            if key in self._restored:
+                self._restored.discard(key)
+                self.resumed += 1
+            return self.completed[key]
+
+        result = extract()
+        self.completed[key] = result
+        self._dirty = True
+        if time.monotonic() - self._flushed >= self.min_interval:
+            self.flush()
+        return result
+
+    def flush(self):
+        if self.bucket is not None and self._dirty:
+            with tracing.span("gcs.upload", object=self.path, results=len(self.completed)):
+                self.bucket.blob(self.path).upload_from_string(json.dumps(self.completed),
+                                                               content_type="application/json")
+        self._dirty = False
+        self._flushed = time.monotonic()
+
+
+def directory(prefix):
+    """
+    Returns the directory holding the checkpoints of the minute book whose pages are at prefix.
+    """
+
+    return prefix.replace("output/txt/", "checkpoints/") + "/"
+
+
+def paths(prefix, sections):
+    """
+    Returns the checkpoint objects that parsing the whole minute book in one invocation leaves behind: one per section,
+    and the count of deliveries. Fan-out mode leaves more, one per work item, which are found by listing directory().
+    """
+
+    return [directory(prefix) + section + ".json" for section in sections] + [directory(prefix) + "attempts"]
+
+
+def record_attempt(bucket, prefix, name="attempts", max_retries=100):
+    """
+    Counts a delivery of the parse-minute-book message for the minute book whose pages are at prefix, and returns the
+    number of deliveries so far, including this one. Other messages about the book, such as the work items of fan-out
+    mode, are counted separately under their own name.
+    """
+
+    from google.api_core.exceptions import NotFound, PreconditionFailed
+    blob = bucket.blob(directory(prefix) + name)
+    for retry in range(max_retries):
+        try:
+            attempts = int(blob.download_as_bytes()) + 1
+            generation = blob.generation
+        except NotFound:
+            attempts, generation = 1, 0
+        # Two deliveries running at once must not both count the same attempt, so the write only succeeds if no other
+        # delivery has written the count since it was read
+        try:
+            blob.upload_from_string(str(attempts), content_type="text/plain", if_generation_match=generation)
+            return attempts
+        except PreconditionFailed:
+            time.sleep(random.uniform(0, min(2.0, 0.05 * 2 ** retry)))
+
+    raise RuntimeError(f"Could not count the attempt at {blob.name} after {max_retries} retries")
+
+
+def item_results(bucket, prefix, section):
+    """
+    Returns the results recorded by every work item of a section, as a list of dicts.
+    """
+
+    return [json.loads(blob.download_as_bytes())
+            for blob in bucket.list_blobs(prefix=directory(prefix) + section + "/")]
@@ -0,0 +1,123 @@
+import collections
+import os
+
+
+# The input token limit of text-bison, and the number of tokens reserved for the instructions in a prompt template
+MAX_INPUT_TOKENS = 8192
+PROMPT_OVERHEAD_TOKENS = 512
+
+
+Window = collections.namedtuple("Window", ["pages", "content", "tokens"])
+Window.__doc__ = """
+A run of consecutive pages packed into one prompt.
+
+- pages (List[int]): The page numbers in the window, in order, for provenance.
+- content (str): The concatenated text of the pages.
+- tokens (int): The number of tokens in content.
+"""
+
+
+def token_budget(default):
+    """
+    Returns the token budget for a section's windows.
+
+    The CHUNK_TOKEN_BUDGET environment variable overrides the section's default for every section. Set it to "max"
+    to pack as many pages as the model's input limit allows, which makes fewer, fuller LLM calls.
+
+    Args:
+    - default (int): The section's default budget.
+
+    Returns:
+    - An integer number of tokens.
+    """
+
+    budget = os.environ.get("CHUNK_TOKEN_BUDGET")
+    if not budget:
+        return default
+    if budget == "max":
+        return MAX_INPUT_TOKENS - PROMPT_OVERHEAD_TOKENS
+    return int(budget)
+
+
+class Chunker:
+    """
+    Packs consecutive pages of a minute book into windows that fit a token budget.
+
+    Token counts come from the corpus, which counts each page once and caches the result, so windows for every
+    section are sized from the same counts without re-tokenizing.
+    """
+
+    def __init__(self, corpus, budget, overlap=None, keywords=None, tables=False):
+        """
+        Args:
+        - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+        - budget (int): The maximum number of tokens in a window. A window always contains at least its first page,
+          even if that page alone exceeds the budget.
+        - overlap (int): The number of pages at the end of a window after which a trigger still starts a new window,
+          so that a passage beginning near the end of one window is also seen whole. Defaults to the
+          CHUNK_OVERLAP_PAGES environment variable, or 0.
+        - keywords (List[str]): If given, each page contributes only its passage for these keywords, as returned by
+          PageCorpus.passage(), instead of its whole text, so more pages fit the budget and the prompts are smaller.
+        - tables (bool): Whether passages include every table row and form field on their page.
+        """
+
+        self.corpus = corpus
+        self.budget = min(budget, MAX_INPUT_TOKENS - PROMPT_OVERHEAD_TOKENS)
+        self.overlap = int(os.environ.get("CHUNK_OVERLAP_PAGES", 0)) if overlap is None else overlap
+        self.keywords = keywords
+        self.tables = tables
+        self.page_numbers = [page_number for page_number, _ in corpus]
+        self.positions = {page_number: position for position, page_number in enumerate(self.page_numbers)}
+
+    def window(self, start_page):
+        """
+        Returns the window that starts at start_page and extends over as many following pages as fit the budget.
+        """
+
+        pages = []
+        tokens = 0
+        for page_number in self.page_numbers[self.positions[start_page]:]:
+            if self.corpus.canonical(page_number) != page_number:
+                # Identical text has already been read from an earlier page
+                continue
+            page_tokens = self.tokens(page_number)
+            if pages and tokens + page_tokens > self.budget:
+                break
+            pages.append(page_number)
+            tokens += page_tokens
+
+        content = "".join(self.content(page_number) for page_number in pages)
+        return Window(pages=pages, content=content, tokens=tokens)
+
+    def content(self, page_number):
+        if self.keywords is None:
+            return self.corpus.content(page_number)
+        return self.corpus.passage(page_number, self.keywords, self.tables)
+
+    def tokens(self, page_number):
+        if self.keywords is None:
+            return self.corpus.token_count(page_number)
+        return self.corpus.passage_tokens(page_number, self.keywords, self.tables)
+
+    def windows(self, start_pages):
+        """
+        Yields a window for each page in start_pages that isn't already covered by the previous window, excluding
+        the previous window's last overlap pages.
+
+        Args:
+        - start_pages (List[int]): The pages on which a section's trigger fired, in order.
+        """
+
+        if self.keywords is not None:
+            self.corpus.prefetch_blocks(start_pages)
+
+        covered = -1
+        for start_page in start_pages:
+            if self.positions[start_page] <= covered:
+                continue
+
+            window = self.window(start_page)
+            yield window
+
+            end = self.positions[window.pages[-1]]
+            covered = max(self.positions[start_page], end - self.overlap)
@@ -1,17 +1,17 @@
 import main
 import json
 import re
-from langchain.prompts import PromptTemplate
-from langchain.llms import VertexAI
-from langchain.chains import LLMChain
+from prompts import PromptTemplate
 
 
-def Parser(sorted_files):
+def Parser(corpus, routes, checkpoint):
     """
     Extracts various entity details from the sorted pages of a minute book.
 
     Args:
-        sorted_files (list): A list of tuples where each tuple contains a page number and file name.
+        corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+        routes (router.Routes): The triggers that fired on each page of the minute book.
+        checkpoint (checkpoints.Checkpoint): Records the result of each page or window, so that a retried parse can resume.
 
     Returns:
         A list of dictionaries where each dictionary contains the extracted entity details that match the minute book
@@ -22,18 +22,18 @@ def Parser(sorted_files):
     entity_name = ""
     entity_details = []
 
-    for file in sorted_files:
+    for file in corpus:
         page_number, file_name = file
-        content = main.get_page(file_name)
-        lowercase_content = content.lower()
+        content = corpus.content(page_number)
+        triggers = routes[page_number]
 
         #  "entity_name": string, // Incorporation number for the corporation
         if page_number == 1:
-            entity_name = extract_entity_name(content)
+            entity_name = checkpoint.run("entity_name", lambda: extract_entity_name(content))
 
         #  "tax_id_number": string, // Tax identification number for the corporation
-        if "business number" in lowercase_content or "business no." in lowercase_content:
-            tax_id_number = extract_tax_id_number(content)
+        if "tax_id_number" in triggers:
+            tax_id_number = checkpoint.run(f"tax_id_number:{page_number}", lambda: extract_tax_id_number(content))
             if tax_id_number is not None:
                 entity_details.append({"tax_id_number": tax_id_number, "provenance": main.get_url(file_name)})
 
@@ -42,9 +42,9 @@ def Parser(sorted_files):
         #  "formation_date": string, // Date (YYYY-MM-DD) when the corporation was incorporated
         #  "address": string, // Address where the corporation is registered
         #  "home_jurisdiction": string, // Jurisdiction where the corporation is incorporated
-        if "certificate" not in lowercase_content and "articles" in lowercase_content and ("address" in lowercase_content or "number" in lowercase_content):
+        if "entity_details" in triggers:
             try:
-                output = extract_entity_details(content)
+                output = checkpoint.run(f"entity_details:{page_number}", lambda: extract_entity_details(content))
                 output = json.loads(output)
                 output['entity_name'] = output['entity_name'].upper()
 
@@ -73,10 +73,7 @@ def extract_entity_name(content):
                     {content}
                     Entity:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.2),
-                     prompt=prompt)
-
-    return chain.predict(content=content).strip().upper()
+    return main.predict(prompt, temperature=0.2, content=content).strip().upper()
 
 
 def extract_tax_id_number(content):
@@ -87,10 +84,7 @@ def extract_tax_id_number(content):
                     {content}
                     Entity:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.2),
-                     prompt=prompt)
-
-    return chain.predict(content=content).strip()
+    return main.predict(prompt, temperature=0.2, content=content).strip()
 
 
 def extract_entity_details(content):
@@ -112,11 +106,7 @@ def extract_entity_details(content):
                     {content}
                     JSON:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.4,
-                                  max_output_tokens=1024),
-                     prompt=prompt)
-
-    output = chain.predict(content=content)
+    output = main.predict(prompt, temperature=0.4, max_output_tokens=1024, content=content)
 
     if output != "Not Found":
         return re.sub(r'\s+', ' ', output)
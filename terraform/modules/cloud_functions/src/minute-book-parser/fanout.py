@@ -0,0 +1,135 @@
+import collections
+import concurrent.futures
+import json
+import os
+
+
+def enabled():
+    """
+    Returns True if minute books should be parsed in fan-out mode, which is switched on by setting the PARSER_MODE
+    environment variable to "fanout".
+    """
+
+    return os.environ.get("PARSER_MODE") == "fanout"
+
+
+def plan(prefix, corpus, routes, sections, pages_per_item=None):
+    """
+    Splits the parsing of a minute book into work items, one per section and run of consecutive pages.
+
+    Runs of pages on which none of a section's triggers fired are left out. entity_details reads the entity name from
+    the first page and checks every other page against it, so it is always a single item over the whole book.
+
+    Args:
+    - prefix (str): The prefix of the minute book's pages, in the form "output/txt/<filename>".
+    - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+    - routes (router.Routes): The triggers that fired on each page of the minute book.
+    - sections (Iterable[str]): The names of the sections to parse.
+    - pages_per_item (int): The number of pages in each item. Defaults to the FANOUT_PAGES_PER_ITEM environment
+      variable, or 50.
+
+    Returns:
+    - A list of work item messages, numbered from 1, each of which is a dict with the keys prefix, section, item,
+      items, first_page and last_page.
+    """
+
+    if pages_per_item is None:
+        pages_per_item = int(os.environ.get("FANOUT_PAGES_PER_ITEM", 50))
+
+    page_numbers = [page_number for page_number, _ in corpus]
+    items = []
+    for section in sections:
+        if section == "entity_details":
+            runs = [page_numbers]
+        else:
+            runs = [page_numbers[start:start + pages_per_item] for start in range(0, len(page_numbers), pages_per_item)]
+            runs = [run for run in runs if any(section in routes.sections(page_number) for page_number in run)]
+
+        for run in runs:
+            if run:
+                items.append({"prefix": prefix, "section": section, "first_page": run[0], "last_page": run[-1]})
+
+    for number, item in enumerate(items, start=1):
+        item["item"] = number
+        item["items"] = len(items)
+    return items
+
+
+class PubSubBroker:
+    """
+    Publishes work items to a Pub/Sub topic, from which each is delivered to its own worker invocation.
+    """
+
+    def __init__(self, topic=None):
+        """
+        Args:
+        - topic (str): The name of the topic. Defaults to the PARSER_ITEMS_TOPIC environment variable, or
+          "parse-minute-book-items".
+        """
+
+        from google.cloud import pubsub_v1
+
+        self.publisher = pubsub_v1.PublisherClient()
+        self.topic = self.publisher.topic_path(os.environ.get("PROJECT_NUMBER"),
+                                               topic or os.environ.get("PARSER_ITEMS_TOPIC", "parse-minute-book-items"))
+        self.futures = []
+
+    def publish(self, msg):
+        self.futures.append(self.publisher.publish(self.topic, data=json.dumps(msg).encode("utf-8")))
+
+    def flush(self):
+        """
+        Waits until every published item has been accepted by Pub/Sub.
+        """
+
+        for future in self.futures:
+            future.result()
+        self.futures = []
+
+
+class LocalBroker:
+    """
+    An in-process stand-in for Pub/Sub, for running the fan-out path locally and in tests. Published items are queued
+    and delivered to the handler by drain(). Like Pub/Sub, a delivery that raises is retried.
+    """
+
+    def __init__(self, handler, max_workers=1, max_attempts=3):
+        """
+        Args:
+        - handler (Callable[[dict], None]): Processes one work item, e.g. main.work_item.
+        - max_workers (int): The number of items delivered at once.
+        - max_attempts (int): The number of times an item is delivered before its error is raised.
+        """
+
+        self.handler = handler
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.queue = collections.deque()
+        self.delivered = 0
+
+    def publish(self, msg):
+        # Round-trip through JSON so that handlers see exactly what they would receive from Pub/Sub
+        self.queue.append(json.loads(json.dumps(msg)))
+
+    def flush(self):
+        pass
+
+    def _deliver(self, msg):
+        for attempt in range(self.max_attempts):
+            try:
+                self.delivered += 1
+                return self.handler(msg)
+            except Exception:
+                if attempt == self.max_attempts - 1:
+                    raise
+
+    def drain(self):
+        """
+        Delivers queued items, including any published while draining, until the queue is empty.
+        """
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while self.queue:
+                batch = [self.queue.popleft() for _ in range(len(self.queue))]
+                for future in [executor.submit(self._deliver, msg) for msg in batch]:
+                    future.result()
@@ -0,0 +1,267 @@
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import resources
+
+
+class RateLimited(Exception):
+    """
+    Raised by a transport when the model endpoint rejects a request for exceeding its quota.
+    """
+
+
+def is_rate_limited(e):
+    """
+    Returns True if an exception means the model endpoint is throttling us (HTTP 429 / RESOURCE_EXHAUSTED).
+    """
+
+    return (isinstance(e, RateLimited)
+            or getattr(e, "code", None) == 429
+            or type(e).__name__ in ("ResourceExhausted", "TooManyRequests")
+            or "RESOURCE_EXHAUSTED" in str(e)
+            or "Quota exceeded" in str(e))
+
+
+def is_retriable(e):
+    """
+    Returns True if a failed request may succeed if it is sent again.
+    """
+
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code == 429 or e.code >= 500
+
+    return (is_rate_limited(e)
+            or type(e).__name__ in ("ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "Aborted")
+            or isinstance(e, (ConnectionError, TimeoutError, urllib.error.URLError)))
+
+
+class TokenBucket:
+    """
+    An adaptive rate limiter. The rate grows additively after each successful request and is halved whenever the
+    endpoint reports that we are over quota, so it settles just under the quota actually available to us.
+    """
+
+    def __init__(self, rate, max_rate, min_rate=0.1, increase=0.05, decrease=0.5):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_rate_limited(self):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class VertexTransport:
+    """
+    Sends prompts to Vertex AI through the pooled langchain model handles. The langchain call is blocking, so it runs
+    on a thread pool sized to the gateway's in-flight cap.
+    """
+
+    def __init__(self, max_workers):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __call__(self, request):
+        llm = resources.llm(request["model_name"], request["temperature"], request["max_output_tokens"])
+        return await asyncio.get_running_loop().run_in_executor(self.executor, llm, request["prompt"])
+
+
+class HTTPTransport:
+    """
+    Sends prompts as JSON to an HTTP endpoint, such as the fake model server in benchmarks/fake_model_server.py.
+
+    The request body is the request dict, and the response body is a JSON object with an "output" key.
+    """
+
+    def __init__(self, url, max_workers, timeout=60):
+        self.url = url
+        self.timeout = timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def _post(self, request):
+        data = json.dumps(request).encode("utf-8")
+        http_request = urllib.request.Request(self.url, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                return json.loads(response.read())["output"]
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise RateLimited(e.read().decode("utf-8", "replace")) from e
+            raise
+
+    async def __call__(self, request):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._post, request)
+
+
+class Gateway:
+    """
+    The single path by which the extractors send prompts to the language model.
+
+    Requests are admitted by an adaptive TokenBucket and a global cap on requests in flight, retried with jittered
+    exponential backoff when throttled or on transient errors, and hedged: if a request takes longer than the recent
+    95th percentile latency, a duplicate is sent and whichever answers first wins. The gateway runs its own asyncio
+    event loop on a background thread, so the synchronous section parsers can share it from any thread.
+    """
+
+    def __init__(self, transport, rate=5.0, max_rate=20.0, max_in_flight=8, max_attempts=6,
+                 backoff_base=1.0, backoff_cap=60.0, hedge=True, hedge_min_delay=5.0):
+        """
+        Args:
+        - transport (Callable[[dict], Awaitable[str]]): Sends one request to the model and returns its output.
+        - rate (float): The initial number of requests admitted per second.
+        - max_rate (float): The highest rate the limiter will grow to.
+        - max_in_flight (int): The maximum number of requests, including hedges, outstanding at once.
+        - max_attempts (int): The number of times a request is tried before its error is raised.
+        - backoff_base (float): The base delay in seconds of the exponential backoff between attempts.
+        - backoff_cap (float): The longest delay in seconds between attempts.
+        - hedge (bool): Whether to send a duplicate of requests that are slower than usual.
+        - hedge_min_delay (float): The shortest time in seconds to wait before hedging a request.
+        """
+
+        self.transport = transport
+        self.rate = rate
+        self.max_rate = max_rate
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.latencies = collections.deque(maxlen=200)
+        self.stats = collections.Counter()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        self.bucket = TokenBucket(rate, max_rate)
+        # The semaphore must be created on the event loop that will use it
+        self.in_flight = asyncio.run_coroutine_threadsafe(self._create_semaphore(), self._loop).result()
+
+    async def _create_semaphore(self):
+        return asyncio.Semaphore(self.max_in_flight)
+
+    def _hedge_delay(self):
+        if not self.hedge or len(self.latencies) < 20:
+            return None
+        ordered = sorted(self.latencies)
+        return max(self.hedge_min_delay, ordered[int(len(ordered) * 0.95)])
+
+    async def _send(self, request):
+        await self.bucket.acquire()
+        async with self.in_flight:
+            start = time.monotonic()
+            self.stats["requests"] += 1
+            output = await self.transport(request)
+            self.latencies.append(time.monotonic() - start)
+            return output
+
+    async def _send_hedged(self, request):
+        first = asyncio.ensure_future(self._send(request))
+        delay = self._hedge_delay()
+        if delay is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.stats["hedges"] += 1
+        second = asyncio.ensure_future(self._send(request))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is second:
+                        self.stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def apredict(self, prompt, model_name="text-bison", temperature=0.0, max_output_tokens=None):
+        """
+        Sends a rendered prompt to the model and returns its output, retrying throttled and transient failures.
+        """
+
+        request = {"prompt": prompt, "model_name": model_name, "temperature": temperature,
+                   "max_output_tokens": max_output_tokens}
+
+        for attempt in range(self.max_attempts):
+            try:
+                output = await self._send_hedged(request)
+                self.bucket.on_success()
+                return output
+            except Exception as e:
+                if not is_retriable(e) or attempt == self.max_attempts - 1:
+                    self.stats["failures"] += 1
+                    raise
+                if is_rate_limited(e):
+                    self.stats["rate_limited"] += 1
+                    self.bucket.on_rate_limited()
+                self.stats["retries"] += 1
+                # Full jitter: sleep for a random time up to the exponential backoff for this attempt
+                await asyncio.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+
+    def predict(self, prompt, model_name="text-bison", temperature=0.0, max_output_tokens=None):
+        """
+        A blocking wrapper around apredict for callers that aren't running in the gateway's event loop.
+        """
+
+        future = asyncio.run_coroutine_threadsafe(
+            self.apredict(prompt, model_name, temperature, max_output_tokens), self._loop)
+        return future.result()
+
+
+def from_environment():
+    """
+    Creates a Gateway configured from environment variables.
+
+    - LLM_ENDPOINT: Send prompts to this HTTP endpoint instead of Vertex AI, e.g. a local fake model server.
+    - LLM_RATE / LLM_MAX_RATE: The initial and maximum requests per second. Defaults are 5 and 20.
+    - LLM_MAX_IN_FLIGHT: The maximum number of requests outstanding at once. Default is 8.
+    - LLM_MAX_ATTEMPTS: The number of attempts per request. Default is 6.
+    - LLM_HEDGE: Set to "0" to turn off request hedging.
+    """
+
+    max_in_flight = int(os.environ.get("LLM_MAX_IN_FLIGHT", 8))
+    if os.environ.get("LLM_ENDPOINT"):
+        transport = HTTPTransport(os.environ["LLM_ENDPOINT"], max_workers=max_in_flight)
+    else:
+        transport = VertexTransport(max_workers=max_in_flight)
+
+    return Gateway(transport,
+                   rate=float(os.environ.get("LLM_RATE", 5)),
+                   max_rate=float(os.environ.get("LLM_MAX_RATE", 20)),
+                   max_in_flight=max_in_flight,
+                   max_attempts=int(os.environ.get("LLM_MAX_ATTEMPTS", 6)),
+                   hedge=os.environ.get("LLM_HEDGE", "1") != "0")
@@ -0,0 +1,150 @@
+import json
+import os
+import re
+
+
+def enabled():
+    """
+    Returns True unless sending only the relevant blocks of a page to the LLM has been switched off by setting the
+    LAYOUT_PASSAGES environment variable to "0".
+    """
+
+    return os.environ.get("LAYOUT_PASSAGES", "1") != "0"
+
+
+def path(file_name):
+    """
+    Returns the path of the layout written by page-processor for the page whose text is at file_name
+    ("output/txt/<filename>_page_<N>.txt").
+    """
+
+    return file_name.replace("output/txt/", "output/layout/").replace(".txt", ".jsonl")
+
+
+def load(bucket, file_name):
+    """
+    Downloads the blocks of a page, in reading order, or returns None if page-processor didn't write its layout.
+
+    Args:
+    - bucket (google.cloud.storage.Bucket): The bucket holding the layout.
+    - file_name (str): The name of the page's text object.
+
+    Returns:
+    - A list of block dicts, as described in page-processor's layout.from_document(), or None.
+    """
+    from google.api_core.exceptions import NotFound
+
+    try:
+        data = bucket.blob(path(file_name)).download_as_bytes()
+    except NotFound:
+        return None
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+
+# A paragraph that starts an article, part or schedule, or a numbered clause such as "5." or "5.1"
+HEADING = re.compile(r"^\s*(?:(article|part|schedule|section)\b|(\d{1,3}(?:\.\d{1,3})*)[.)]?\s)", re.IGNORECASE)
+
+
+def level(block):
+    """
+    Returns the level of a block that starts a clause or section, or None for a block that continues one. An article,
+    part, schedule or a short heading in capitals is level 1, a clause numbered "5." level 2, "5.1" level 3 and so on.
+    Lettered sub-clauses such as "(a)" belong to their clause and don't start one.
+    """
+
+    if block["type"] != "paragraph":
+        return None
+    text = block["text"].strip()
+    match = HEADING.match(text)
+    if match:
+        return 1 if match.group(1) else 2 + match.group(2).count(".")
+    if text.isupper() and len(text.split()) <= 8:
+        return 1
+    return None
+
+
+def mentions(blocks, keywords):
+    """
+    Returns True if any block of a page mentions any of the keywords.
+    """
+
+    return any(keyword in block["text"].lower() for block in blocks for keyword in keywords)
+
+
+def _clause_end(levels, position):
+    """
+    Returns the position after the last block of the clause that the block at position is in: the clause ends at the
+    next block starting a clause of the same or a higher level, or at the end of the page.
+    """
+
+    clause = next((levels[start] for start in range(position, -1, -1) if levels[start] is not None), None)
+    for end in range(position + 1, len(levels)):
+        if levels[end] is not None and (clause is None or levels[end] <= clause):
+            return end
+    return len(levels)
+
+
+def _spans(blocks, keywords, context):
+    """
+    Returns the positions of the blocks in the clauses that mention any of the keywords. Each span runs from the
+    heading of the matching block's clause, if it is no more than context blocks back, or else from context blocks
+    before it, to the end of its clause.
+    """
+
+    levels = [level(block) for block in blocks]
+    selected = set()
+    for position, block in enumerate(blocks):
+        if position not in selected and any(keyword in block["text"].lower() for keyword in keywords):
+            start = next((start for start in range(position, max(0, position - context) - 1, -1)
+                          if levels[start] is not None), max(0, position - context))
+            selected.update(range(start, _clause_end(levels, position)))
+    return selected
+
+
+def runs_on(blocks, keywords, context=1):
+    """
+    Returns True if a clause that passage() would select on this page may continue on the next page: one that
+    mentions the keywords runs to the end of the page, or nothing matches and the page starts no clause at all.
+    """
+
+    if not mentions(blocks, keywords):
+        return all(level(block) is None for block in blocks)
+    return len(blocks) - 1 in _spans(blocks, keywords, context)
+
+
+def passage(blocks, keywords, context=1, tables=False, continued=False):
+    """
+    Returns the text of the clauses of a page that mention any of the keywords. Each clause is sent whole, from its
+    heading or the block before the first mention, through every paragraph up to the next clause of the same or a
+    higher level or the end of the page. On a page where nothing matches, such as the next page of a window, the
+    whole page is returned, since it may continue a clause that the previous page ended with.
+
+    Args:
+    - blocks (List[dict]): The page's blocks, in reading order.
+    - keywords (Iterable[str]): Lowercase keywords, matched as substrings like the router's triggers.
+    - context (int): The number of blocks to include before a matching block that doesn't start its own clause.
+    - tables (bool): Whether to include every table row and form field on the page, for sections that read registers.
+      A table's header rows are included whenever any of its rows is.
+    - continued (bool): Whether the previous page ended in the middle of a selected clause, as returned by
+      runs_on(), in which case the blocks before the first heading of this page are included too.
+
+    Returns:
+    - The selected blocks' text in reading order, one block per line, or None if the page has no blocks.
+    """
+
+    if not blocks:
+        return None
+    if not mentions(blocks, keywords):
+        return "\n".join(block["text"] for block in blocks) + "\n"
+
+    selected = _spans(blocks, keywords, context)
+    if continued:
+        selected.update(range(next((position for position, block in enumerate(blocks) if level(block) is not None),
+                                   len(blocks))))
+    if tables:
+        selected.update(position for position, block in enumerate(blocks) if block["type"] in ("row", "field"))
+
+    tables_selected = {blocks[position].get("table") for position in selected if blocks[position]["type"] == "row"}
+    selected.update(position for position, block in enumerate(blocks)
+                    if block["type"] == "row" and block.get("header") and block.get("table") in tables_selected)
+    return "\n".join(blocks[position]["text"] for position in sorted(selected)) + "\n"
@@ -0,0 +1,242 @@
+import collections
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import cleanup
+
+
+# How long responses persisted to the bucket stay valid unless LLM_CACHE_TTL says otherwise
+GCS_DEFAULT_TTL = 7 * 24 * 60 * 60
+# How often each instance evicts the persistent cache unless LLM_CACHE_EVICT_INTERVAL says otherwise
+DEFAULT_EVICT_INTERVAL = 60 * 60
+
+
+def cache_key(model_name, temperature, max_output_tokens, prompt):
+    """
+    Returns a content-addressed key for a large language model request.
+
+    Args:
+    - model_name (str): The name of the model, e.g. "text-bison".
+    - temperature (float): The sampling temperature of the request.
+    - max_output_tokens (int): The maximum number of output tokens, or None for the model default.
+    - prompt (str): The fully rendered prompt.
+
+    Returns:
+    - A hex-encoded SHA-256 digest that uniquely identifies the request.
+    """
+
+    payload = json.dumps([model_name, temperature, max_output_tokens, prompt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteBackend:
+    """
+    Persists cached responses to a local SQLite database. Used for tests and local runs.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                               "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self._lock, self._connect() as connection:
+            row = connection.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            value, created = row
+            if self.ttl is not None and time.time() - created > self.ttl:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+
+            return value
+
+    def set(self, key, value):
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)",
+                               (key, value, time.time()))
+
+    def evict(self):
+        """
+        Removes expired entries, then the oldest entries beyond max_entries.
+        """
+
+        with self._lock, self._connect() as connection:
+            if self.ttl is not None:
+                connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            if self.max_entries is not None:
+                connection.execute("DELETE FROM responses WHERE key NOT IN "
+                                   "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)", (self.max_entries,))
+
+
+class GCSBackend:
+    """
+    Persists cached responses as one object per key in a Google Cloud Storage bucket.
+    """
+
+    def __init__(self, bucket, prefix="cache/llm/", ttl=None, max_entries=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key):
+        from google.api_core.exceptions import NotFound
+
+        blob = self.bucket.blob(self.prefix + key)
+        try:
+            entry = json.loads(blob.download_as_bytes())
+        except NotFound:
+            return None
+
+        if self.ttl is not None and time.time() - entry["created"] > self.ttl:
+            return None
+
+        return entry["value"]
+
+    def set(self, key, value):
+        blob = self.bucket.blob(self.prefix + key)
+        blob.upload_from_string(json.dumps({"value": value, "created": time.time()}),
+                                content_type="application/json")
+
+    def evict(self):
+        """
+        Removes expired entries, then the oldest entries beyond max_entries, with batched deletes. This lists the
+        whole cache prefix, so ResponseCache.evict() runs it at most once per evict_interval on each instance. get()
+        ignores expired entries in the meantime, so eviction only reclaims their storage.
+        """
+
+        blobs = sorted(self.bucket.list_blobs(prefix=self.prefix), key=lambda blob: blob.time_created, reverse=True)
+        now = time.time()
+        cleanup.delete_files(self.bucket, [
+            blob.name for index, blob in enumerate(blobs)
+            if (self.ttl is not None and now - blob.time_created.timestamp() > self.ttl)
+            or (self.max_entries is not None and index >= self.max_entries)])
+
+
+class ResponseCache:
+    """
+    A two-tier cache of large language model responses: an in-process LRU in front of an optional persistent backend.
+    """
+
+    def __init__(self, backend=None, max_memory_entries=1024, ttl=None, evict_interval=DEFAULT_EVICT_INTERVAL):
+        self.backend = backend
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+        self.evict_interval = evict_interval
+        # The first eviction is staggered, so that instances started together don't all list the backend at once
+        self._next_eviction = time.monotonic() + random.uniform(0, evict_interval)
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if self.ttl is None or time.time() - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        value = self.backend.get(key) if self.backend is not None else None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._remember(key, value)
+
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+
+        if self.backend is not None:
+            self.backend.set(key, value)
+
+    def _remember(self, key, value):
+        self._memory[key] = (value, time.time())
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def evict(self):
+        """
+        Evicts the persistent backend if this instance hasn't done so in the last evict_interval seconds. Returns True
+        if it did.
+        """
+
+        if self.backend is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_eviction:
+                return False
+            self._next_eviction = now + self.evict_interval
+        self.backend.evict()
+        return True
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+
+def from_environment(bucket):
+    """
+    Creates a ResponseCache configured from environment variables.
+
+    - LLM_CACHE: "memory" (default), "gcs", "sqlite" or "off". Prompts and responses contain the text of the minute
+      books, so they are only persisted to the bucket when "gcs" is chosen.
+    - LLM_CACHE_PATH: The SQLite database path when LLM_CACHE is "sqlite".
+    - LLM_CACHE_TTL: The number of seconds a cached response stays valid. Defaults to 7 days for "gcs", and to no
+      expiry otherwise.
+    - LLM_CACHE_MAX_ENTRIES: The maximum number of persisted responses kept when the cache is evicted.
+    - LLM_CACHE_EVICT_INTERVAL: The minimum number of seconds between evictions on one instance. Defaults to an hour.
+    - LLM_CACHE_MEMORY_ENTRIES: The size of the in-process LRU tier.
+
+    Args:
+    - bucket (google.cloud.storage.Bucket): The bucket used by the "gcs" backend.
+
+    Returns:
+    - A ResponseCache, or None if caching is turned off.
+    """
+
+    mode = os.environ.get("LLM_CACHE", "memory")
+    if mode == "off":
+        return None
+
+    if os.environ.get("LLM_CACHE_TTL"):
+        ttl = float(os.environ["LLM_CACHE_TTL"])
+    else:
+        ttl = GCS_DEFAULT_TTL if mode == "gcs" else None
+    max_entries = int(os.environ["LLM_CACHE_MAX_ENTRIES"]) if os.environ.get("LLM_CACHE_MAX_ENTRIES") else None
+
+    if mode == "sqlite":
+        backend = SQLiteBackend(os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite3"), ttl=ttl, max_entries=max_entries)
+    elif mode == "gcs":
+        backend = GCSBackend(bucket, ttl=ttl, max_entries=max_entries)
+    else:
+        backend = None
+
+    return ResponseCache(backend=backend, max_memory_entries=int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", 1024)), ttl=ttl,
+                         evict_interval=float(os.environ.get("LLM_CACHE_EVICT_INTERVAL", DEFAULT_EVICT_INTERVAL)))
@@ -2,22 +2,47 @@ import re
 import functions_framework
 import json
 import os
-import tiktoken
-from langchain.prompts import PromptTemplate
-from langchain.llms import VertexAI
-from langchain.chains import LLMChain
+from prompts import PromptTemplate
 from google.cloud import storage
-import concurrent.futures
+import functools
+import threading
+import time
 import entity_details
 import officers
 import quorum_rules
 import directors
 import restrictions_provisions
 import share_classes
-
-
-storage_client = storage.Client()
-storage_bucket = storage_client.get_bucket(os.environ.get('BUCKET_NAME'))
+import gateway
+import llm_cache
+import resources
+import router
+import scheduler
+import checkpoints
+import cleanup
+import completion
+import fanout
+import layout
+import manifest
+import tracing
+from address_index import AddressIndex
+from pages import PageCorpus
+
+
+storage_client = resources.get("storage_client", storage.Client)
+# bucket() makes a handle without the metadata request that get_bucket() sends, which would delay every cold start
+storage_bucket = resources.get("storage_bucket", lambda: storage_client.bucket(os.environ.get('BUCKET_NAME')))
+response_cache = llm_cache.from_environment(storage_bucket)
+
+# Each section of the extraction schema is parsed by its own module, and written to temp/<filename>_<section>.json
+SECTIONS = {
+    "entity_details": entity_details,
+    "quorum_rules": quorum_rules,
+    "share_classes": share_classes,
+    "directors": directors,
+    "officers": officers,
+    "restrictions_provisions": restrictions_provisions,
+}
 
 
 @functions_framework.cloud_event
@@ -28,7 +53,173 @@ def main(cloud_event):
     prefix = msg['prefix']
     print("Received message to parse: " + prefix)
 
-    sorted_files = get_sorted_pages(prefix)
+    with tracing.trace(msg.get('trace_id'), "minute-book-parser", prefix=prefix):
+        if already_parsed(prefix):
+            return
+        corpus, routes = load_minute_book(prefix)
+
+        if fanout.enabled():
+            coordinate(prefix, corpus, routes, resources.get("broker", fanout.PubSubBroker))
+            return
+
+        parse(prefix, corpus, routes)
+
+
+@functions_framework.cloud_event
+def work(cloud_event):
+    """
+    The entry point of the workers in fan-out mode, which receive the messages published by coordinate().
+    """
+    import base64
+    encoded_payload = cloud_event.data["message"]["data"]
+    msg = json.loads(base64.b64decode(encoded_payload).decode())
+
+    work_item(msg, resources.get("broker", fanout.PubSubBroker))
+
+
+def already_parsed(prefix):
+    """
+    Returns True if the final output of a minute book has already been written, in which case the message is a
+    redelivery of one that was handled successfully, and the book's pages and manifest are gone.
+    """
+
+    path = prefix.replace("output/txt/", "output/final/") + ".json"
+    with tracing.span("gcs.get", object=path):
+        if storage_bucket.blob(path).exists():
+            print("Already parsed " + prefix + ", ignoring redelivered message")
+            return True
+    return False
+
+
+def load_minute_book(prefix, first_page=None, last_page=None):
+    """
+    Downloads the pages of a minute book and routes them to the sections that should read them. The page order, token
+    counts and text hashes come from the book's manifest if it has one, otherwise from listing its pages. The text
+    of a packed book is downloaded with one request.
+
+    Args:
+    - prefix (str): The prefix of the minute book's pages, in the form "output/txt/<filename>".
+    - first_page (int): The first page to load, or None to start from the beginning of the book.
+    - last_page (int): The last page to load, or None to load to the end of the book.
+
+    Returns:
+    - A tuple of the pages.PageCorpus and its router.Routes.
+    """
+
+    def in_range(pages):
+        return [(page_number, file_name) for page_number, file_name in pages
+                if (first_page is None or page_number >= first_page)
+                and (last_page is None or page_number <= last_page)]
+
+    with tracing.span("load_minute_book", prefix=prefix, first_page=first_page, last_page=last_page) as span:
+        with tracing.span("gcs.download", object=manifest.path(prefix)):
+            book = manifest.load(storage_bucket, prefix)
+        if book is not None and book.get("packed"):
+            with tracing.span("gcs.download", object=book["packed"]):
+                packed = manifest.read_packed(storage_bucket, book, first_page, last_page)
+            corpus = PageCorpus(packed, count_tokens=num_tokens_from_string, manifest=book, packed=book["packed"],
+                                get_blocks=tracing.wrap(get_blocks))
+        elif book is not None:
+            corpus = PageCorpus.load(in_range(manifest.sorted_pages(book)), tracing.wrap(get_page),
+                                     count_tokens=num_tokens_from_string, manifest=book,
+                                     get_blocks=tracing.wrap(get_blocks))
+        else:
+            corpus = PageCorpus.load(in_range(get_sorted_pages(prefix)), tracing.wrap(get_page),
+                                     count_tokens=num_tokens_from_string, get_blocks=tracing.wrap(get_blocks))
+        span.set(pages=len(corpus), manifest=book is not None, packed=bool(corpus.packed))
+
+    with tracing.span("route", pages=len(corpus)):
+        routes = router.route(corpus)
+    return corpus, routes
+
+
+def coordinate(prefix, corpus, routes, broker):
+    """
+    Publishes a work item for each section and run of pages of a minute book, instead of parsing it in this
+    invocation. The worker that finishes the last item publishes a message to merge the results.
+
+    Args:
+    - prefix (str): The prefix of the minute book's pages, in the form "output/txt/<filename>".
+    - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+    - routes (router.Routes): The triggers that fired on each page of the minute book.
+    - broker (fanout.PubSubBroker or fanout.LocalBroker): Delivers the work items to the workers.
+    """
+
+    items = fanout.plan(prefix, corpus, routes, SECTIONS)
+    for item in items:
+        item['trace_id'] = tracing.trace_id()
+        broker.publish(item)
+    broker.flush()
+    print("Published " + str(len(items)) + " work items for " + prefix)
+
+
+def work_item(msg, broker):
+    """
+    Processes one message published by coordinate(): either a work item, which extracts one section from a run of
+    pages, or the message to merge the results once every item is done.
+
+    A work item downloads only its own pages, runs its section's Parser over them, and keeps the Parser's output only
+    in the form of the results recorded in its checkpoint. The merge then runs every section's Parser over the whole
+    book with those results preloaded, so it makes an LLM call only for a window that spans two items, and merges
+    exactly as a single-instance parse would.
+
+    An item that keeps failing is given up after PARSER_MAX_ATTEMPTS deliveries, like a parse, and counted as done so
+    that the merge still runs; the merge then extracts the item's pages itself.
+
+    Args:
+    - msg (dict): The message, as returned by fanout.plan(), or {"prefix": ..., "reduce": True}.
+    - broker (fanout.PubSubBroker or fanout.LocalBroker): Delivers the message to merge the results.
+    """
+
+    prefix = msg['prefix']
+    with tracing.trace(msg.get('trace_id'), "work_item", prefix=prefix, section=msg.get('section'),
+                       item=msg.get('item'), reduce=bool(msg.get('reduce'))):
+        if already_parsed(prefix):
+            return
+
+        if msg.get("reduce"):
+            corpus, routes = load_minute_book(prefix)
+            print("Merging work items for " + prefix)
+            parse(prefix, corpus, routes, merge_items=True)
+            return
+
+        section = msg['section']
+        attempt = checkpoints.record_attempt(storage_bucket, prefix, "attempts_item_" + str(msg['item']))
+        corpus, routes = load_minute_book(prefix, msg['first_page'], msg['last_page'])
+        checkpoint = checkpoints.Checkpoint.for_item(storage_bucket, prefix, section, msg['item'])
+        with tracing.span("section", section=section, first_page=msg['first_page'], last_page=msg['last_page']):
+            try:
+                SECTIONS[section].Parser(corpus, routes, checkpoint)
+            except Exception as e:
+                if attempt < int(os.environ.get("PARSER_MAX_ATTEMPTS", 3)):
+                    # Let Pub/Sub redeliver the item; the next attempt resumes from its checkpoint
+                    raise
+                print("Giving up on item " + str(msg['item']) + " (" + section + ") for " + prefix + " on attempt "
+                      + str(attempt) + ": " + repr(e))
+            finally:
+                checkpoint.flush()
+
+        tracker = completion.CompletionTracker(store=completion.GCSStateStore(storage_bucket),
+                                               key=checkpoints.directory(prefix) + "items", total_pages=msg['items'])
+        if tracker.mark_done([msg['item']]):
+            broker.publish({"prefix": prefix, "reduce": True, "trace_id": tracing.trace_id()})
+            broker.flush()
+            tracker.confirm()
+
+
+def parse(prefix, corpus, routes, merge_items=False):
+    """
+    Parses every section of a minute book, concatenates their output into output/final/<filename>.json and removes
+    the book's pages and working state.
+
+    Args:
+    - prefix (str): The prefix of the minute book's pages, in the form "output/txt/<filename>".
+    - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+    - routes (router.Routes): The triggers that fired on each page of the minute book.
+    - merge_items (bool): Whether to preload the results recorded by the work items of fan-out mode.
+    """
+
+    attempt = checkpoints.record_attempt(storage_bucket, prefix)
 
     def write_output(prefix, suffix, content):
         """
@@ -43,30 +234,75 @@ def main(cloud_event):
         blob = storage_bucket.blob(path)
 
         output = json.dumps(content, indent=4)
-        blob.upload_from_string(output, content_type="text/json")
+        with tracing.span("gcs.upload", object=path, bytes=len(output)):
+            blob.upload_from_string(output, content_type="text/json")
 
-    def call_write_output(*args, **kwargs):
+    abandoned = threading.Event()
+
+    def run_section(name, module):
         """
-        A helper function used by ThreadPoolExecutor to call write_output with the 
-        given arguments and run each write_output call in a separate thread concurrently
+        Runs a section's Parser over the minute book and writes its output as soon as it finishes, unless the
+        scheduler has already given up on it and moved on to concatenating the output. A section whose output was
+        written by an earlier delivery of this message is skipped, and one that was interrupted resumes from its
+        checkpoint.
         """
-        write_output(*args, **kwargs)
-
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [
-            executor.submit(call_write_output, prefix=prefix, suffix="entity_details", content=entity_details.Parser(sorted_files)),
-            executor.submit(call_write_output, prefix=prefix, suffix="quorum_rules", content=quorum_rules.Parser(sorted_files)),
-            executor.submit(call_write_output, prefix=prefix, suffix="share_classes", content=share_classes.Parser(sorted_files)),
-            executor.submit(call_write_output, prefix=prefix, suffix="directors", content=directors.Parser(sorted_files)),
-            executor.submit(call_write_output, prefix=prefix, suffix="officers", content=officers.Parser(sorted_files)),
-            executor.submit(call_write_output, prefix=prefix, suffix="restrictions_provisions", content=restrictions_provisions.Parser(sorted_files))
-        ]
-
-        concurrent.futures.wait(futures)
-
-    temp_prefix = prefix.replace("output/txt/", "temp/")
-    concatenate_output(temp_prefix)
-    batch_delete_files(prefix)
+        path = prefix.replace("output/txt/", "temp/") + "_" + name + ".json"
+        if storage_bucket.blob(path).exists():
+            print("Resuming " + prefix + ": " + name + " was already parsed")
+            return
+
+        checkpoint = checkpoints.Checkpoint.for_section(storage_bucket, prefix, name)
+        if merge_items:
+            for results in checkpoints.item_results(storage_bucket, prefix, name):
+                checkpoint.merge(results)
+        with tracing.span("section", section=name) as span:
+            try:
+                content = module.Parser(corpus, routes, checkpoint)
+            finally:
+                checkpoint.flush()
+            span.set(resumed=checkpoint.resumed)
+        if checkpoint.resumed:
+            print("Resuming " + prefix + ": reused " + str(checkpoint.resumed) + " checkpointed results for " + name)
+        if not abandoned.is_set():
+            write_output(prefix=prefix, suffix=name, content=add_duplicate_provenance(content, corpus))
+
+    sections = {name: tracing.wrap(functools.partial(run_section, name, module)) for name, module in SECTIONS.items()}
+    timeout = float(os.environ["PARSER_SECTION_TIMEOUT"]) if os.environ.get("PARSER_SECTION_TIMEOUT") else None
+    _, errors = scheduler.run_sections(sections, max_workers=int(os.environ.get("PARSER_MAX_WORKERS", len(sections))),
+                                       timeout=timeout)
+    abandoned.set()
+
+    for name, error in errors.items():
+        print("Failed to parse " + name + " for " + prefix + ": " + error)
+
+    if errors and attempt < int(os.environ.get("PARSER_MAX_ATTEMPTS", 3)):
+        # Let Pub/Sub redeliver the message; the next attempt skips finished sections and resumes the rest
+        raise RuntimeError("Failed to parse " + ", ".join(errors) + " for " + prefix + " on attempt " + str(attempt))
+
+    start = time.perf_counter()
+    with tracing.span("finalize", prefix=prefix):
+        temp_prefix = prefix.replace("output/txt/", "temp/")
+        concatenate_output(temp_prefix, SECTIONS)
+        # Everything the book left behind is deleted by name in one set of batch requests: its text and layouts, the
+        # manifest, so that nothing is left for a redelivered message to load, page-processor's record that the book
+        # was handed off for parsing, and the checkpoints
+        names = [corpus.packed] if corpus.packed else [file_name for _, file_name in corpus]
+        names += [layout.path(file_name) for _, file_name in corpus] + [manifest.path(prefix)]
+        names.append(completion.handoff_key(prefix.replace("output/txt/", "state/")))
+        cleanup.delete_files(storage_bucket, names + checkpoints.paths(prefix, SECTIONS))
+        if merge_items:
+            # The work items' checkpoints and delivery counts aren't known by name
+            cleanup.delete_prefix(storage_bucket, checkpoints.directory(prefix))
+    print(f"Wrote output and cleaned up {prefix} in {time.perf_counter() - start:.2f} s")
+
+    if response_cache is not None:
+        print("LLM response cache: " + json.dumps(response_cache.stats()))
+        # Responses persisted to the bucket always expire, so their expired entries are removed, at most once per
+        # LLM_CACHE_EVICT_INTERVAL on each instance since it lists the whole cache
+        in_bucket = isinstance(response_cache.backend, llm_cache.GCSBackend)
+        if in_bucket or os.environ.get("LLM_CACHE_MAX_ENTRIES") or os.environ.get("LLM_CACHE_TTL"):
+            with tracing.span("llm_cache.evict") as span:
+                span.set(evicted=response_cache.evict())
 
 
 # The following shared helper functions are called by the modules corresponding to each section of the minute book:
@@ -84,11 +320,48 @@ def num_tokens_from_string(string, encoding_name="cl100k_base"):
     - An integer representing the number of tokens in the given text string.
     """
 
-    encoding = tiktoken.get_encoding(encoding_name)
+    encoding = resources.tokenizer(encoding_name)
     num_tokens = len(encoding.encode(string))
     return num_tokens
 
 
+def predict(prompt, model_name="text-bison", temperature=0.0, max_output_tokens=None, **kwargs):
+    """
+    Runs a prompt through a large language model, returning a cached response if the same rendered prompt has
+    already been sent with the same model settings.
+
+    Args:
+    - prompt (PromptTemplate): The prompt template to render.
+    - model_name (str): The name of the Vertex AI model. Default is "text-bison".
+    - temperature (float): The sampling temperature.
+    - max_output_tokens (int): The maximum number of output tokens, or None for the model default.
+    - **kwargs: The input variables of the prompt template.
+
+    Returns:
+    - A string representing the model's response.
+    """
+
+    rendered_prompt = prompt.format(**kwargs)
+    with tracing.span("llm.predict", model=model_name, prompt_chars=len(rendered_prompt)) as span:
+        key = llm_cache.cache_key(model_name, temperature, max_output_tokens, rendered_prompt)
+        if response_cache is not None:
+            output = response_cache.get(key)
+            if output is not None:
+                span.set(cached=True)
+                return output
+
+        output = resources.get("gateway", gateway.from_environment).predict(
+            rendered_prompt, model_name, temperature, max_output_tokens)
+        if tracing.enabled():
+            span.set(cached=False, prompt_tokens=num_tokens_from_string(rendered_prompt),
+                     response_tokens=num_tokens_from_string(output))
+
+        if response_cache is not None:
+            response_cache.set(key, output)
+
+        return output
+
+
 def get_url(filename):
     """
     Returns a URL that can be used to access a PDF file in a Google Cloud Storage bucket,
@@ -108,6 +381,41 @@ def get_url(filename):
     return 'https://storage.cloud.google.com/' + os.environ.get('BUCKET_NAME') + '/' + encoded_filename
 
 
+def add_duplicate_provenance(content, corpus):
+    """
+    Adds a "duplicates" key to every record in a section's output whose provenance includes a page that other pages
+    duplicate, listing the URLs of those pages. Duplicate pages aren't read by the extractors, so this is the only
+    place they appear in the output.
+
+    Args:
+    - content (Any): The output of a section's Parser, which is modified in place.
+    - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+
+    Returns:
+    - The same content.
+    """
+
+    pages_by_url = {get_url(file_name): page_number for page_number, file_name in corpus}
+
+    def visit(node):
+        if isinstance(node, list):
+            for item in node:
+                visit(item)
+        elif isinstance(node, dict):
+            provenance = node.get("provenance")
+            urls = provenance if isinstance(provenance, list) else [provenance]
+            duplicates = [get_url(corpus.file_name(duplicate))
+                          for url in urls if isinstance(url, str) and url in pages_by_url
+                          for duplicate in corpus.duplicates(pages_by_url[url])]
+            if duplicates:
+                node["duplicates"] = duplicates
+            for value in node.values():
+                visit(value)
+
+    visit(content)
+    return content
+
+
 def get_page(filename):
     """
     Retrieves the contents of a file from Google Cloud Storage bucket, and returns it as a string.
@@ -119,13 +427,30 @@ def get_page(filename):
     - A string representing the contents of the specified file.
     """
 
-    page = storage_bucket.get_blob(filename).download_as_string()
+    with tracing.span("gcs.download", object=filename):
+        page = storage_bucket.blob(filename).download_as_bytes()
     return page.decode("utf-8").replace(r"\n", "\n")
 
 
+def get_blocks(filename):
+    """
+    Retrieves the layout blocks that page-processor wrote for a page, or None if it has none.
+
+    Args:
+    - filename (str): A string representing the name of the page's text file.
+
+    Returns:
+    - A list of block dicts in reading order, or None.
+    """
+
+    with tracing.span("gcs.download", object=layout.path(filename)):
+        return layout.load(storage_bucket, filename)
+
+
 def get_sorted_pages(prefix):
     """
-    Returns a list of tuples representing all blobs in a Google Storage Bucket whose names begin with prefix.
+    Returns a list of tuples representing the pages of the minute book whose text files begin with prefix, i.e. the
+    blobs named "<prefix>_page_<N>.txt". Used for books that have no manifest.
 
     Args:
     - prefix (str): A string representing the prefix to search for.
@@ -135,95 +460,72 @@ def get_sorted_pages(prefix):
       where the integer represents the page number and the string represents the name of the file that contains the page.
     """
 
-    blobs = storage_bucket.list_blobs(prefix=prefix)
+    page_name = re.compile(re.escape(prefix) + r"_page_(\d+)\.txt$")
+    blobs = storage_bucket.list_blobs(prefix=prefix + "_page_")
     files = {}
     for blob in blobs:
-        key = int(blob.name.split('_')[-1].split('.')[0])
-        files.update({key: blob.name})
+        match = page_name.match(blob.name)
+        if match is not None:
+            files.update({int(match.group(1)): blob.name})
 
     pages = sorted(files.items())
     return pages
 
 
-def concatenate_output(prefix):
+def concatenate_output(prefix, sections):
     """
-    Concatenates the contents of all temporary blobs in the Google Cloud Storage bucket
-    with a specified prefix and uploads the result to a final blob in the same bucket.
-    Also deletes temporary files.
+    Concatenates the temporary output of each section into a final blob in the same bucket, then deletes the
+    temporary files. The temporary files are named after the sections, so they are read without listing the bucket.
 
     Args:
-        prefix (str): The prefix to use when searching for blobs to concatenate.
+        prefix (str): The prefix of the temporary files, in the form "temp/<filename>".
+        sections (Iterable[str]): The names of the sections whose output to concatenate.
     """
 
-    blobs = storage_bucket.list_blobs(prefix=prefix)
-    output = ""
-    for blob in blobs:
-        output += storage_bucket.get_blob(blob.name).download_as_string().decode("utf-8") + "\n"
-
-    path = prefix.replace("temp/", "output/final/") + ".json"
-    blob = storage_bucket.blob(path)
-    blob.upload_from_string(output, content_type="text/json")
+    names = sorted(prefix + "_" + section + ".json" for section in sections)
+    cleanup.concatenate(storage_bucket, names, prefix.replace("temp/", "output/final/") + ".json")
+    cleanup.delete_files(storage_bucket, names)
 
-    batch_delete_files(prefix)
 
-
-def batch_delete_files(prefix):
+def extract_address_for_person(person, corpus):
     """
-    Deletes all files in the Google Cloud Storage bucket that have names starting with the given prefix.
+    Extracts the mailing address of a person from the pages of a minute book.
 
-    Args:
-    - prefix (str): A string representing the prefix used to filter the files to be deleted.
-    """
-
-    blobs_to_delete = storage_bucket.list_blobs(prefix=prefix)
-
-    for blob in blobs_to_delete:
-        blob.delete()
-
-
-def extract_address_for_person(person, sorted_files):
-    """
-    Extracts the mailing address of a person from a list of sorted files.
+    The passages closest to the person's name that contain a postal or zip code are found with the book's
+    AddressIndex, and only those passages are sent to the large language model, nearest first.
 
     Args:
     - person (str): A string representing a person's name.
-    - sorted_files (List[Tuple[int, str]]): A list of tuples, where each tuple contains a page number and a file name.
+    - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
 
     Returns:
     - A string representing the mailing address of the person, if found. Returns None otherwise.
     """
 
-    for file in sorted_files:
-        page_number, file_name = file
-        content = get_page(file_name).lower()
-
-        if person.lower() in content and ("address" in content 
-                                            or re.findall(r"\s*[A-Za-z]\d[A-Za-z] \d[A-Za-z]\d\s*", content)  # postal codes
-                                            or re.findall(r"\s*\d\d\d\d\d\s*", content)):  # zip codes
-
-            if " " in person:
-                reverse_name = " also known as " + person.split(" ")[1] + ", " + person.split(" ")[0]
-            else:
-                reverse_name = ""
-
-            prompt = PromptTemplate(
-                input_variables=["person", "reverse_name", "content"],
-                template="""Extract the mailing address of {person}
-                            {reverse_name} from this passage. The address for {person} will be found close
-                            to their name. If an address is found in the passage, but is not next to {person}'s
-                            name, it is likely not the correct address and you should return Not Found.
-                            A mailing address must contain street, city, state/province, and zip/postal code.
-                            Do not include the name in the address.
-                            If the passage does not contain a mailing address at all, output Not Found.
-                            Passage:
-                            {content}
-                            Address:""")
-
-            chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.5,
-                                          max_output_tokens=512),
-                             prompt=prompt)
-
-            address = chain.predict(person=person, reverse_name=reverse_name, content=content)
-
-            if address != 'Not Found':
-                return re.sub(r'\s+', ' ', address).upper()
+    index = corpus.derived("address_index", AddressIndex)
+    limit = int(os.environ.get("ADDRESS_CANDIDATES", 3))
+
+    for page_number, content in index.candidates(person, limit=limit):
+        if " " in person:
+            reverse_name = " also known as " + person.split(" ")[1] + ", " + person.split(" ")[0]
+        else:
+            reverse_name = ""
+
+        prompt = PromptTemplate(
+            input_variables=["person", "reverse_name", "content"],
+            template="""Extract the mailing address of {person}
+                        {reverse_name} from this passage. The address for {person} will be found close
+                        to their name. If an address is found in the passage, but is not next to {person}'s
+                        name, it is likely not the correct address and you should return Not Found.
+                        A mailing address must contain street, city, state/province, and zip/postal code.
+                        Do not include the name in the address.
+                        If the passage does not contain a mailing address at all, output Not Found.
+                        Passage:
+                        {content}
+                        Address:""")
+
+        address = predict(prompt, temperature=0.5, max_output_tokens=512,
+                          person=person, reverse_name=reverse_name, content=content)
+
+        if address != 'Not Found':
+            return re.sub(r'\s+', ' ', address).upper()
@@ -0,0 +1,75 @@
+import json
+
+
+def path(prefix):
+    """
+    Returns the path of the manifest of the minute book whose pages are at prefix ("output/txt/<filename>").
+    """
+
+    return prefix.replace("output/txt/", "output/manifest/") + ".json"
+
+
+def load(bucket, prefix):
+    """
+    Reads the manifest that the page-processor wrote for a minute book once all of its pages were processed.
+
+    The manifest is columnar: a JSON object mapping each column name ("page", "file", "class", "confidence",
+    "token_count", "text_hash", "has_tables", "offset", "length") to a list with one entry per page, in page order.
+    If the book's text was packed into one object, its path is under the "packed" key and "offset" and "length" give
+    the byte range of each page in it.
+
+    Args:
+    - bucket (google.cloud.storage.Bucket): The bucket holding the book's pages.
+    - prefix (str): The prefix of the book's pages, in the form "output/txt/<filename>".
+
+    Returns:
+    - The manifest, or None if the book has no manifest, e.g. because it was processed before manifests existed.
+    """
+    from google.api_core.exceptions import NotFound
+
+    try:
+        return json.loads(bucket.blob(path(prefix)).download_as_bytes())
+    except NotFound:
+        return None
+
+
+def sorted_pages(manifest):
+    """
+    Returns the pages listed in a manifest as (page_number, file_name) tuples, in the same shape as
+    main.get_sorted_pages().
+    """
+
+    return list(zip(manifest["page"], manifest["file"]))
+
+
+def read_packed(bucket, manifest, first_page=None, last_page=None):
+    """
+    Returns the text of every page of a packed minute book, downloaded with a single request, as a list of
+    (page_number, file_name, content) tuples in page order. If first_page or last_page is given, only the pages from
+    first_page to last_page inclusive are returned, and only their byte range of the packed object is downloaded.
+    """
+
+    rows = [row for row in zip(manifest["page"], manifest["file"], manifest["offset"], manifest["length"])
+            if (first_page is None or row[0] >= first_page) and (last_page is None or row[0] <= last_page)]
+    if first_page is None and last_page is None:
+        start = 0
+        data = bucket.blob(manifest["packed"]).download_as_bytes()
+    else:
+        # Pages are packed in page order, so a run of pages is one contiguous range of bytes
+        start = min((offset for _, _, offset, _ in rows), default=0)
+        end = max((offset + length for _, _, offset, length in rows), default=0)
+        data = bucket.blob(manifest["packed"]).download_as_bytes(start=start, end=end - 1) if end > start else b""
+    return [(page_number, file_name, data[offset - start:offset - start + length].decode("utf-8"))
+            for page_number, file_name, offset, length in rows]
+
+
+def read_page(bucket, manifest, page_number):
+    """
+    Returns the text of one page of a packed minute book with a ranged read of the packed object.
+    """
+
+    index = manifest["page"].index(page_number)
+    offset, length = manifest["offset"][index], manifest["length"][index]
+    if length == 0:
+        return ""
+    return bucket.blob(manifest["packed"]).download_as_bytes(start=offset, end=offset + length - 1).decode("utf-8")
@@ -1,17 +1,18 @@
 import main
+import chunking
 import json
 import re
-from langchain.prompts import PromptTemplate
-from langchain.llms import VertexAI
-from langchain.chains import LLMChain
+from prompts import PromptTemplate
 
 
-def Parser(sorted_files):
+def Parser(corpus, routes, checkpoint):
     """
     Extracts details of appointed officers from the sorted pages of minute book.
 
     Args:
-        sorted_files (list): A list of tuples where each tuple contains the page number and file name of a sorted file.
+        corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+        routes (router.Routes): The triggers that fired on each page of the minute book.
+        checkpoint (checkpoints.Checkpoint): Records the result of each page or window, so that a retried parse can resume.
 
     Returns:
         A list of dictionaries where each dictionary represents an appointed officer and includes their full name, appointment
@@ -19,76 +20,50 @@ def Parser(sorted_files):
     """
 
     elected_officers = [{}]
-    election_of_officer_content = ""
-    election_of_officer_provenance = []
-    election_of_officer_token_count = 0
     election_of_officer_max_token_limit = 1024
-    extracting_election_of_officer = False
-
-    file_count = len(sorted_files)
-    for file in sorted_files:
-        page_number, file_name = file
-        content = main.get_page(file_name)
-        lowercase_content = content.lower()
-        parsed_this_page = False
-
-        #  "officers": array, // One or more officers of a corporation, with children properties for their full name, election date, address, and title
-        if "officer" in lowercase_content and "register" in lowercase_content:
-            extracting_election_of_officer = True
-
-        if extracting_election_of_officer is True:
-            election_of_officer_tokens = election_of_officer_token_count + main.num_tokens_from_string(content)
-            election_of_officer_provenance.append(main.get_url(file_name))
-
-            if election_of_officer_tokens < election_of_officer_max_token_limit:
-                election_of_officer_token_count += election_of_officer_tokens
-                election_of_officer_content += content
-                parsed_this_page = True
-
-            if election_of_officer_tokens >= election_of_officer_max_token_limit or page_number == file_count:
-                if parsed_this_page:
-                    output = extract_election_of_officers(election_of_officer_content)
-                else:
-                    output = extract_election_of_officers(content)
-
-                if output is not None:
-                    try:
-                        output = json.loads(output)
-                        found_officers = []
-                        for officer in elected_officers:
-                            if not bool(officer):
-                                elected_officers.remove(officer)
-
-                            for item in output:
-                                if "officer_name" in officer and officer['officer_name'] == item['officer_name']:
-                                    officer['officer_name'] = item['officer_name'].title()
-                                    officer['date_appointed'] = item['date_appointed']
-                                    officer['date_retired'] = item['date_retired']
-                                    officer['position_held'] = item['position_held']
-                                    if "address" in item and isinstance(item['address'], str):
-                                        officer['address'] = re.sub(r'\s+', ' ', item['address']).strip()
-                                    try:
-                                        officer['provenance'] = item['provenance']
-                                    except KeyError as e:
-                                        print(e)       
-                                else:
-                                    item['officer_name'] = item['officer_name'].title()
-                                    item['address'] = main.extract_address_for_person(person=item['officer_name'], sorted_files=sorted_files)
-                                    item['provenance'] = election_of_officer_provenance
-                                    found_officers.append(item)
-
-                        for officer in found_officers:
-                            if not any(d['officer_name'] == officer['officer_name'] for d in elected_officers):
-                                elected_officers.append(officer)
-
-                    except json.decoder.JSONDecodeError:
-                        pass
-
-                extracting_election_of_officer = False
-                election_of_officer_content = ""
-                election_of_officer_token_count = 0
-                election_of_officer_provenance = []
-                election_of_officer_tokens = 0
+
+    #  "officers": array, // One or more officers of a corporation, with children properties for their full name, election date, address, and title
+    # Pages with a layout contribute only their register rows and the blocks around mentions of officers
+    chunker = chunking.Chunker(corpus, chunking.token_budget(election_of_officer_max_token_limit),
+                               keywords=["officer", "register", "appointed"], tables=True)
+    for window in chunker.windows(routes.pages("officers")):
+        election_of_officer_provenance = [main.get_url(corpus.file_name(page_number)) for page_number in window.pages]
+        output = checkpoint.run(f"officers:{window.pages[0]}-{window.pages[-1]}",
+                                lambda: extract_election_of_officers(window.content))
+
+        if output is not None:
+            try:
+                output = json.loads(output)
+                found_officers = []
+                for officer in elected_officers:
+                    if not bool(officer):
+                        elected_officers.remove(officer)
+
+                    for item in output:
+                        if "officer_name" in officer and officer['officer_name'] == item['officer_name']:
+                            officer['officer_name'] = item['officer_name'].title()
+                            officer['date_appointed'] = item['date_appointed']
+                            officer['date_retired'] = item['date_retired']
+                            officer['position_held'] = item['position_held']
+                            if "address" in item and isinstance(item['address'], str):
+                                officer['address'] = re.sub(r'\s+', ' ', item['address']).strip()
+                            try:
+                                officer['provenance'] = item['provenance']
+                            except KeyError as e:
+                                print(e)
+                        else:
+                            item['officer_name'] = item['officer_name'].title()
+                            item['address'] = checkpoint.run("address:" + item['officer_name'],
+                                                             lambda: main.extract_address_for_person(person=item['officer_name'], corpus=corpus))
+                            item['provenance'] = election_of_officer_provenance
+                            found_officers.append(item)
+
+                for officer in found_officers:
+                    if not any(d['officer_name'] == officer['officer_name'] for d in elected_officers):
+                        elected_officers.append(officer)
+
+            except json.decoder.JSONDecodeError:
+                pass
 
     return elected_officers
 
@@ -114,11 +89,7 @@ def extract_election_of_officers(content):
                     {content}
                     Officers JSON:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.2,
-                                  max_output_tokens=1024),
-                     prompt=prompt)
-
-    output = chain.predict(content=content).strip()
+    output = main.predict(prompt, temperature=0.2, max_output_tokens=1024, content=content).strip()
 
     if output != "[]":
         return output
@@ -0,0 +1,264 @@
+import concurrent.futures
+import hashlib
+import os
+import re
+import threading
+
+import layout
+
+
+class PageCorpus:
+    """
+    A read-only, in-memory view of the OCR text for every page of a minute book.
+
+    All pages are downloaded once, up front, so that the section extractors and the address lookup can read the
+    same text many times without issuing another request to Google Cloud Storage. A lowercased copy of each page is
+    kept alongside the original so that keyword heuristics don't need to call .lower() on every check.
+
+    Iterating over a corpus yields (page_number, file_name) tuples in page order, which is the same shape as the
+    list returned by main.get_sorted_pages().
+
+    Pages whose text is identical once case and whitespace are normalized, such as a by-law set filed twice, are
+    duplicates of the first such page, which is their canonical page. Only canonical pages are routed to the
+    extractors, and the duplicates are added to the provenance of whatever is extracted from them.
+
+    The layout of a page, written by page-processor as blocks in reading order, is only downloaded when an extractor
+    asks for a passage of the page, so that it can send the LLM the blocks that matter instead of the whole page.
+    """
+
+    def __init__(self, pages, count_tokens=None, manifest=None, packed=None, get_blocks=None):
+        """
+        Args:
+        - pages (List[Tuple[int, str, str]]): A list of (page_number, file_name, content) tuples.
+        - count_tokens (Callable[[str], int]): A function that returns the number of tokens in a string, used by
+          token_count() for pages that the manifest has no token count for.
+        - manifest (dict): The book's manifest, as returned by manifest.load(), whose token counts and text hashes
+          are used instead of computing them.
+        - packed (str): The path of the packed text object the pages were read from, if any.
+        - get_blocks (Callable[[str], List[dict]]): A function that returns the layout blocks of a page given its file
+          name, or None if the page has no layout.
+        """
+
+        self.packed = packed
+        self._pages = sorted((page_number, file_name) for page_number, file_name, _ in pages)
+        self._content = {page_number: content for page_number, _, content in pages}
+        self._lowercase = {page_number: content.lower() for page_number, content in self._content.items()}
+        self._file_names = dict(self._pages)
+        self._count_tokens = count_tokens
+        self._token_counts = {}
+        self._text_hashes = {}
+        self._classes = {}
+        if manifest is not None:
+            for page_number, token_count, hash_, page_class in zip(
+                    manifest["page"], manifest["token_count"], manifest["text_hash"], manifest["class"]):
+                if page_number in self._content:
+                    if token_count is not None:
+                        self._token_counts[page_number] = token_count
+                    if hash_:
+                        self._text_hashes[page_number] = hash_
+                    self._classes[page_number] = page_class
+        self._derived = {}
+        self._lock = threading.Lock()
+        self._get_blocks = get_blocks
+        self._blocks = {}
+        self._passages = {}
+        self._blocks_lock = threading.Lock()
+
+        self._canonical = {}
+        self._duplicates = {}
+        first_page = {}
+        for page_number, _ in self._pages:
+            hash_ = self._text_hashes.get(page_number) or text_hash(self._content[page_number])
+            canonical = first_page.setdefault(hash_, page_number)
+            self._canonical[page_number] = canonical
+            if canonical != page_number:
+                self._duplicates.setdefault(canonical, []).append(page_number)
+
+    @classmethod
+    def load(cls, sorted_files, get_page, count_tokens=None, max_workers=None, manifest=None, get_blocks=None):
+        """
+        Downloads every page of a minute book concurrently and returns a corpus over the results.
+
+        Args:
+        - sorted_files (List[Tuple[int, str]]): A list of (page_number, file_name) tuples, as returned by main.get_sorted_pages().
+        - get_page (Callable[[str], str]): A function that returns the text of a page given its file name.
+        - count_tokens (Callable[[str], int]): A function that returns the number of tokens in a string.
+        - max_workers (int): The maximum number of concurrent downloads. Defaults to the PAGE_DOWNLOAD_WORKERS
+          environment variable, or 32.
+        - manifest (dict): The book's manifest, if it has one.
+        - get_blocks (Callable[[str], List[dict]]): A function that returns the layout blocks of a page.
+
+        Returns:
+        - A PageCorpus containing the text of every page.
+        """
+
+        if max_workers is None:
+            max_workers = int(os.environ.get("PAGE_DOWNLOAD_WORKERS", 32))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            contents = executor.map(get_page, [file_name for _, file_name in sorted_files])
+            pages = [(page_number, file_name, content)
+                     for (page_number, file_name), content in zip(sorted_files, contents)]
+
+        return cls(pages, count_tokens=count_tokens, manifest=manifest, get_blocks=get_blocks)
+
+    def __iter__(self):
+        return iter(self._pages)
+
+    def __len__(self):
+        return len(self._pages)
+
+    def file_name(self, page_number):
+        return self._file_names[page_number]
+
+    def content(self, page_number):
+        return self._content[page_number]
+
+    def lowercase(self, page_number):
+        return self._lowercase[page_number]
+
+    def is_empty(self, page_number):
+        """
+        Returns True if the manifest records that a page has no text, such as a blank page. Pages of a book without a
+        manifest are never reported empty, so that they aren't tokenized just to check.
+        """
+
+        return self._classes.get(page_number) == "blank" or (
+            page_number in self._classes and self._token_counts.get(page_number) == 0)
+
+    def canonical(self, page_number):
+        """
+        Returns the first page with the same normalized text as page_number, which is page_number itself unless it
+        is a duplicate.
+        """
+
+        return self._canonical[page_number]
+
+    def duplicates(self, page_number):
+        """
+        Returns the later pages whose normalized text is the same as that of page_number, in page order.
+        """
+
+        return self._duplicates.get(page_number, [])
+
+    def token_count(self, page_number):
+        """
+        Returns the number of tokens on a page, counting them on first use and caching the result.
+        """
+
+        count = self._token_counts.get(page_number)
+        if count is None:
+            count = self._count_tokens(self._content[page_number])
+            self._token_counts[page_number] = count
+        return count
+
+    def blocks(self, page_number):
+        """
+        Returns the layout blocks of a page, downloading them on first use, or None if the page has no layout.
+        """
+
+        # Each page's download is a future that concurrent callers share, so that sections asking for the same page at
+        # once wait for one download instead of each starting their own
+        with self._blocks_lock:
+            future = self._blocks.get(page_number)
+            downloading = future is None
+            if downloading:
+                future = self._blocks[page_number] = concurrent.futures.Future()
+
+        if downloading:
+            try:
+                blocks = self._get_blocks(self._file_names[page_number]) if self._get_blocks is not None else None
+                future.set_result(blocks or None)
+            except Exception as e:
+                # Let a later call try again, while the callers already waiting see the error
+                with self._blocks_lock:
+                    del self._blocks[page_number]
+                future.set_exception(e)
+        return future.result()
+
+    def prefetch_blocks(self, page_numbers, max_workers=None):
+        """
+        Downloads the layouts of several pages concurrently, ahead of asking for their passages.
+        """
+
+        if self._get_blocks is None or not layout.enabled():
+            return
+        with self._blocks_lock:
+            missing = [page_number for page_number in page_numbers if page_number not in self._blocks]
+        if not missing:
+            return
+        if max_workers is None:
+            max_workers = int(os.environ.get("PAGE_DOWNLOAD_WORKERS", 32))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            list(executor.map(self.blocks, missing))
+
+    def passage(self, page_number, keywords, tables=False):
+        """
+        Returns the part of a page an extractor should read: the clauses of its layout that mention any of the
+        keywords, as selected by layout.passage(), including the top of the page if it finishes a clause selected on
+        the previous page. The whole page is returned if it has no layout, if nothing on it matches, or if the passage
+        wouldn't be shorter.
+
+        Args:
+        - page_number (int): The page.
+        - keywords (List[str]): Lowercase keywords, such as those of the section's trigger.
+        - tables (bool): Whether to include every table row and form field on the page.
+        """
+
+        return self._passage(page_number, keywords, tables)[0]
+
+    def passage_tokens(self, page_number, keywords, tables=False):
+        """
+        Returns the number of tokens in passage(page_number, keywords, tables).
+        """
+
+        return self._passage(page_number, keywords, tables)[1]
+
+    def _passage(self, page_number, keywords, tables):
+        key = (page_number, tuple(keywords), tables)
+        with self._blocks_lock:
+            if key in self._passages:
+                return self._passages[key]
+
+        result = (self._content[page_number], self.token_count(page_number))
+        blocks = self.blocks(page_number) if layout.enabled() else None
+        continued = False
+        if blocks and layout.mentions(blocks, keywords) and layout.level(blocks[0]) is None \
+                and page_number - 1 in self._content:
+            # The top of the page may finish a clause that the previous page's passage ended with
+            previous = self.blocks(page_number - 1)
+            continued = bool(previous) and layout.runs_on(previous, keywords)
+        text = layout.passage(blocks, keywords, tables=tables, continued=continued) if blocks else None
+        if text is not None:
+            tokens = self._count_tokens(text)
+            if tokens < result[1]:
+                result = (text, tokens)
+
+        with self._blocks_lock:
+            self._passages[key] = result
+        return result
+
+    def derived(self, key, factory):
+        """
+        Returns a value computed from the whole corpus, such as an index, building it on first use. Sections running
+        concurrently share a single copy.
+
+        Args:
+        - key (str): A name that identifies the value.
+        - factory (Callable[[PageCorpus], Any]): A function that builds the value from the corpus.
+        """
+
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = factory(self)
+            return self._derived[key]
+
+
+def text_hash(content):
+    """
+    Returns the SHA-256 hex digest of a page's text, ignoring case and differences in whitespace.
+    """
+
+    normalized = re.sub(r"\s+", " ", content.lower()).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
@@ -0,0 +1,28 @@
+class PromptTemplate:
+    """
+    A prompt with {placeholders} for its input variables, rendered with str.format(). It has the same constructor and
+    format() as langchain's PromptTemplate for f-string templates, which is all the extractors use, so that parsing a
+    minute book only imports langchain if a prompt is actually sent to Vertex AI rather than answered from the cache.
+
+    Literal braces, e.g. in a JSON example, are written doubled as {{ and }}.
+    """
+
+    def __init__(self, input_variables, template):
+        """
+        Args:
+        - input_variables (List[str]): The names of the placeholders in the template.
+        - template (str): The text of the prompt.
+        """
+
+        self.input_variables = input_variables
+        self.template = template
+
+    def format(self, **kwargs):
+        """
+        Returns the prompt with each placeholder replaced by the keyword argument of the same name.
+        """
+
+        missing = set(self.input_variables) - set(kwargs)
+        if missing:
+            raise KeyError("Missing input variables for prompt: " + ", ".join(sorted(missing)))
+        return self.template.format(**kwargs)
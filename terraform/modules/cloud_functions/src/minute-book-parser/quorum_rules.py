@@ -1,15 +1,17 @@
 import main
-from langchain.prompts import PromptTemplate
-from langchain.llms import VertexAI
-from langchain.chains import LLMChain
+import batching
+import chunking
+from prompts import PromptTemplate
 
 
-def Parser(sorted_files):
+def Parser(corpus, routes, checkpoint):
     """
     Extracts quorum rules for directors and shareholders from the sorted pages of minute book.
 
     Args:
-        sorted_files (list): A list of tuples where each tuple contains the page number and file name of a sorted file.
+        corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+        routes (router.Routes): The triggers that fired on each page of the minute book.
+        checkpoint (checkpoints.Checkpoint): Records the result of each page or window, so that a retried parse can resume.
 
     Returns:
         A list of dictionaries where each dictionary contains the extracted quorum details that match the minute book
@@ -18,49 +20,28 @@ def Parser(sorted_files):
     """
 
     quorum_rules = []
-    quorum_content = ""
-    quorum_token_count = 0
     quorum_max_token_limit = 3072
-    extracting_quorum = False
-
-    file_count = len(sorted_files)
-    for file in sorted_files:
-        page_number, file_name = file
-        content = main.get_page(file_name)
-        lowercase_content = content.lower()
-
-        if "quorum" in lowercase_content:
-            extracting_quorum = True
-
-        #  "directors_quorum": string, // Quorum rules for directors
-        #  "shareholders_quorum": string, // Quorum rules for shareholders
-        if extracting_quorum is True:
-            quorum_tokens = quorum_token_count + main.num_tokens_from_string(content)
-            shareholders_quorum, directors_quorum = [None, None]
-
-            if quorum_tokens < quorum_max_token_limit:
-                quorum_token_count += quorum_tokens
-                quorum_content += content
-                parsed_this_page = True
-
-            # Quorum rules can sometimes be split across multiple pages so we need a larger context window
-            if quorum_tokens >= quorum_max_token_limit or page_number == file_count:
-                if parsed_this_page:
-                    shareholders_quorum = extract_shareholders_quorum(quorum_content)
-                    directors_quorum = extract_directors_quorum(quorum_content)
-                else:
-                    if shareholders_quorum is None:
-                        shareholders_quorum = extract_shareholders_quorum(content)
-                    if directors_quorum is None:
-                        directors_quorum = extract_directors_quorum(content)
-
-                quorum_rules.append({"directors_quorum": directors_quorum, "provenance": main.get_url(file_name)})
-                quorum_rules.append({"shareholders_quorum": shareholders_quorum, "provenance": main.get_url(file_name)})
-
-                extracting_quorum = False
-                quorum_content = ""
-                quorum_token_count = 0
-                quorum_tokens = 0
+
+    #  "directors_quorum": string, // Quorum rules for directors
+    #  "shareholders_quorum": string, // Quorum rules for shareholders
+    # Quorum rules can sometimes be split across multiple pages so we need a larger context window
+    # Pages with a layout contribute only the blocks around each mention of quorum
+    chunker = chunking.Chunker(corpus, chunking.token_budget(quorum_max_token_limit), keywords=["quorum"])
+    for window in chunker.windows(routes.pages("quorum_rules")):
+        key = f"{window.pages[0]}-{window.pages[-1]}"
+        batched = None
+        if batching.enabled("quorum_rules"):
+            batched = checkpoint.run("quorums:" + key, lambda: extract_quorums(window.content))
+        if batched is not None:
+            shareholders_quorum = batched["shareholders_quorum"]
+            directors_quorum = batched["directors_quorum"]
+        else:
+            shareholders_quorum = checkpoint.run("shareholders_quorum:" + key, lambda: extract_shareholders_quorum(window.content))
+            directors_quorum = checkpoint.run("directors_quorum:" + key, lambda: extract_directors_quorum(window.content))
+
+        file_name = corpus.file_name(window.pages[-1])
+        quorum_rules.append({"directors_quorum": directors_quorum, "provenance": main.get_url(file_name)})
+        quorum_rules.append({"shareholders_quorum": shareholders_quorum, "provenance": main.get_url(file_name)})
 
     return quorum_rules
 
@@ -68,7 +49,7 @@ def Parser(sorted_files):
 # The following functions use a large language model to perform question & answer-style extraction from a minute book
 
 
-def extract_directors_quorum(content, entity_name):
+def extract_directors_quorum(content, entity_name="the corporation"):
     prompt = PromptTemplate(
         input_variables=["content", "entity_name"],
         template="""What constitutes quorum for meetings of directors of {entity_name} where only
@@ -79,10 +60,10 @@ def extract_directors_quorum(content, entity_name):
                     {content}
                     Director Quorum:""")
 
-    directors_quorum_candidate = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.5, max_output_tokens=512),
-                                          prompt=prompt)
+    output = main.predict(prompt, temperature=0.5, max_output_tokens=512, content=content, entity_name=entity_name).strip()
 
-    return directors_quorum_candidate.predict(content=content).strip()
+    if output != "Not Found":
+        return output
 
 
 def extract_shareholders_quorum(content):
@@ -94,7 +75,18 @@ def extract_shareholders_quorum(content):
                     {content}
                     Shareholder Quorum:""")
 
-    shareholders_quorum_candidate = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.5, max_output_tokens=512),
-                                             prompt=prompt)
+    output = main.predict(prompt, temperature=0.5, max_output_tokens=512, content=content).strip()
+
+    if output != "Not Found":
+        return output
+
 
-    return shareholders_quorum_candidate.predict(content=content).strip()
+def extract_quorums(content):
+    return batching.extract_fields(content, {
+        "directors_quorum": "What constitutes quorum for meetings of directors where only one director is present? "
+                            "How about when two or more directors are present? Is a majority of directors required "
+                            "for quorum? Explain in a concise paragraph. Do not explain quorum for meetings of "
+                            "shareholders.",
+        "shareholders_quorum": "What constitutes quorum for meetings of shareholders according to this passage? Do "
+                               "not get confused between meetings of directors and meetings of shareholders.",
+    }, temperature=0.5)
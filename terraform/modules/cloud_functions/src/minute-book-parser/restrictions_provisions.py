@@ -1,15 +1,32 @@
 import main
-from langchain.prompts import PromptTemplate
-from langchain.llms import VertexAI
-from langchain.chains import LLMChain
+import batching
+from prompts import PromptTemplate
 
 
-def Parser(sorted_files):
+# The questions asked for each field when several fields are extracted from one page with a single prompt
+RESTRICTIONS_PROVISIONS = {
+    "transfer_restrictions": "If this passage from a set of corporate by-laws pertains to share transfer restrictions, "
+                             "describe them concisely. Do not include any other restrictions. Do not include "
+                             "information about the minimum or maximum number of directors.",
+    "other_restrictions": "If this passage from a set of corporate by-laws pertains to other restrictions on the "
+                          "corporation, describe them concisely. Do not include share transfer restrictions. Do not "
+                          "include information about the minimum or maximum number of directors.",
+    "other_provisions": "If this passage from a set of corporate by-laws pertains to other provisions, describe them. "
+                        "Do not include information about the minimum or maximum number of directors.",
+}
+
+# The keywords whose blocks, with their neighbours, are read from pages that have a layout
+PASSAGE_KEYWORDS = ["restriction", "transfer", "provision"]
+
+
+def Parser(corpus, routes, checkpoint):
     """
     Extracts restrictions and provisions related to a corporation from a minute book.
 
     Args:
-        sorted_files (list): A list of tuples where each tuple contains the page number and file name of a sorted file.
+        corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+        routes (router.Routes): The triggers that fired on each page of the minute book.
+        checkpoint (checkpoints.Checkpoint): Records the result of each page or window, so that a retried parse can resume.
 
     Returns:
         A list of dictionaries where each dictionary represents a set of restrictions or provisions and includes the date
@@ -19,24 +36,43 @@ def Parser(sorted_files):
 
     restrictions_provisions = []
 
-    for file in sorted_files:
+    corpus.prefetch_blocks([page_number for page_number, _ in corpus
+                            if routes[page_number].intersection(RESTRICTIONS_PROVISIONS)])
+    for file in corpus:
         page_number, file_name = file
-        content = main.get_page(file_name)
-        lowercase_content = content.lower()
+        triggers = routes[page_number]
+        if not triggers.intersection(RESTRICTIONS_PROVISIONS):
+            continue
+        # Pages with a layout contribute only the blocks around mentions of restrictions and provisions
+        content = corpus.passage(page_number, PASSAGE_KEYWORDS)
+
+        batched = None
+        if batching.enabled("restrictions_provisions") and len(triggers.intersection(RESTRICTIONS_PROVISIONS)) > 1:
+            batched = checkpoint.run(f"restrictions_provisions:{page_number}",
+                                     lambda: extract_restrictions_provisions(content, triggers.intersection(RESTRICTIONS_PROVISIONS)))
 
         #  "transfer_restrictions": string, // Provisions or rules that limit or regulate the transfer or sale of a company's shares or other ownership interests
-        if "transfer" in lowercase_content and "restrictions" in lowercase_content and "certificate" not in lowercase_content:
-            output = extract_transfer_restrictions(content)
+        if "transfer_restrictions" in triggers:
+            if batched is not None:
+                output = batched["transfer_restrictions"]
+            else:
+                output = checkpoint.run(f"transfer_restrictions:{page_number}", lambda: extract_transfer_restrictions(content))
             restrictions_provisions.append({"transfer_restrictions": output, "provenance": main.get_url(file_name)})
 
         #  "other_restrictions": string, // Restrictions on the corporation's activities
-        if "other" in lowercase_content and "restrictions" in lowercase_content and "certificate" not in lowercase_content:
-            output = extract_other_restrictions(content)
+        if "other_restrictions" in triggers:
+            if batched is not None:
+                output = batched["other_restrictions"]
+            else:
+                output = checkpoint.run(f"other_restrictions:{page_number}", lambda: extract_other_restrictions(content))
             restrictions_provisions.append({"other_restrictions": output, "provenance": main.get_url(file_name)})
 
         #  "other_provisions": string, // Additional provisions or rules that are not covered by the other properties
-        if "other provisions" in lowercase_content:
-            output = extract_other_provisions(content)
+        if "other_provisions" in triggers:
+            if batched is not None:
+                output = batched["other_provisions"]
+            else:
+                output = checkpoint.run(f"other_provisions:{page_number}", lambda: extract_other_provisions(content))
             restrictions_provisions.append({"other_provisions": output, "provenance": main.get_url(file_name)})
 
     return restrictions_provisions
@@ -57,11 +93,7 @@ def extract_other_restrictions(content):
                     {content}
                     Other Restrictions:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.2,
-                                    max_output_tokens=512),
-                     prompt=prompt)
-
-    output = chain.predict(content=content).strip()
+    output = main.predict(prompt, temperature=0.2, max_output_tokens=512, content=content).strip()
 
     if output != "Not Found":
         return output
@@ -80,11 +112,7 @@ def extract_transfer_restrictions(content):
                     {content}
                     Share Transfer Restrictions:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.2,
-                                  max_output_tokens=512),
-                     prompt=prompt)
-
-    output = chain.predict(content=content).strip()
+    output = main.predict(prompt, temperature=0.2, max_output_tokens=512, content=content).strip()
 
     if output != "Not Found":
         return output
@@ -101,11 +129,12 @@ def extract_other_provisions(content):
                     {content}
                     Other Provisions:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.2,
-                                  max_output_tokens=512),
-                     prompt=prompt)
-
-    output = chain.predict(content=content).strip()
+    output = main.predict(prompt, temperature=0.2, max_output_tokens=512, content=content).strip()
 
     if output != "Not Found":
         return output
+
+
+def extract_restrictions_provisions(content, fields):
+    return batching.extract_fields(content, {field: RESTRICTIONS_PROVISIONS[field] for field in sorted(fields)},
+                                   max_output_tokens=1024)
@@ -0,0 +1,132 @@
+import re
+
+
+# Each trigger describes the keywords a page must contain before a field of the extraction schema is looked for on it.
+# A page matches a trigger when it contains every keyword in "all", at least one keyword from each group in "any",
+# and none of the keywords in "none". Keywords are matched as lowercase substrings.
+TRIGGERS = {
+    "tax_id_number": {"any": [["business number", "business no."]]},
+    "entity_details": {"all": ["articles"], "any": [["address", "number"]], "none": ["certificate"]},
+    "minimum_directors": {"all": ["directors", "number"], "any": [["minimum", "less than"]]},
+    "maximum_directors": {"all": ["directors", "number"], "any": [["maximum", "more than"]]},
+    "directors": {"all": ["elected", "director", "register"]},
+    "officers": {"all": ["officer", "register"]},
+    "quorum_rules": {"all": ["quorum"]},
+    "share_classes": {"all": ["authorized to issue", "class"]},
+    "transfer_restrictions": {"all": ["transfer", "restrictions"], "none": ["certificate"]},
+    "other_restrictions": {"all": ["other", "restrictions"], "none": ["certificate"]},
+    "other_provisions": {"all": ["other provisions"]},
+}
+
+# The triggers evaluated on behalf of each section module
+SECTIONS = {
+    "entity_details": ["tax_id_number", "entity_details"],
+    "quorum_rules": ["quorum_rules"],
+    "share_classes": ["share_classes"],
+    "directors": ["minimum_directors", "maximum_directors", "directors"],
+    "officers": ["officers"],
+    "restrictions_provisions": ["transfer_restrictions", "other_restrictions", "other_provisions"],
+}
+
+
+class Routes:
+    """
+    A page -> triggers index for a minute book, built in a single pass by route().
+    """
+
+    def __init__(self, triggers_by_page):
+        self._triggers = triggers_by_page
+
+    def __getitem__(self, page_number):
+        return self._triggers.get(page_number, frozenset())
+
+    def sections(self, page_number):
+        """
+        Returns the names of the sections that have at least one trigger on the given page.
+        """
+
+        triggers = self[page_number]
+        return {section for section, names in SECTIONS.items() if triggers.intersection(names)}
+
+    def pages(self, trigger):
+        """
+        Returns the sorted page numbers on which the given trigger fired.
+        """
+
+        return sorted(page_number for page_number, triggers in self._triggers.items() if trigger in triggers)
+
+    def restrict(self, first_page, last_page):
+        """
+        Returns the routes for the pages from first_page to last_page inclusive. Every other page has no triggers.
+        """
+
+        return Routes({page_number: triggers for page_number, triggers in self._triggers.items()
+                       if first_page <= page_number <= last_page})
+
+
+def compile_triggers(triggers):
+    """
+    Compiles every keyword used by a set of triggers into a single regular expression.
+
+    The pattern is a lookahead so that it reports a match at every position, including overlapping ones, and the
+    alternation is ordered longest first. When a keyword matches, every shorter keyword that is a prefix of it is also
+    present at that position, so those are returned as implied matches.
+
+    Args:
+    - triggers (dict): A mapping of trigger names to their keyword rules, in the same form as TRIGGERS.
+
+    Returns:
+    - A tuple of the compiled pattern and a dict mapping each keyword to the set of keywords it implies.
+    """
+
+    keywords = set()
+    for rule in triggers.values():
+        keywords.update(rule.get("all", []))
+        keywords.update(rule.get("none", []))
+        for group in rule.get("any", []):
+            keywords.update(group)
+
+    ordered = sorted(keywords, key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in ordered) + "))")
+    implied = {keyword: {other for other in keywords if keyword.startswith(other)} for keyword in keywords}
+    return pattern, implied
+
+
+def matches(rule, keywords):
+    """
+    Returns True if a set of keywords found on a page satisfies a trigger rule.
+    """
+
+    return (all(keyword in keywords for keyword in rule.get("all", []))
+            and all(keywords.intersection(group) for group in rule.get("any", []))
+            and not keywords.intersection(rule.get("none", [])))
+
+
+def route(corpus, triggers=TRIGGERS):
+    """
+    Scans every page of a minute book once and records which triggers fire on it.
+
+    Args:
+    - corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+    - triggers (dict): A mapping of trigger names to their keyword rules. Default is TRIGGERS.
+
+    Returns:
+    - A Routes index of the triggers that fired on each page.
+    """
+
+    pattern, implied = compile_triggers(triggers)
+
+    triggers_by_page = {}
+    for page_number, _ in corpus:
+        if corpus.canonical(page_number) != page_number or corpus.is_empty(page_number):
+            # The canonical copy of a duplicate page is routed instead, and an empty page has nothing to extract
+            triggers_by_page[page_number] = frozenset()
+            continue
+
+        found = set()
+        for keyword in set(pattern.findall(corpus.lowercase(page_number))):
+            found.update(implied[keyword])
+
+        triggers_by_page[page_number] = frozenset(name for name, rule in triggers.items() if matches(rule, found))
+
+    return Routes(triggers_by_page)
@@ -0,0 +1,63 @@
+import concurrent.futures
+import time
+import traceback
+
+
+def run_sections(sections, max_workers=None, timeout=None):
+    """
+    Runs section extractors concurrently and collects their results, isolating failures so that one bad section does
+    not stop the others.
+
+    Each section's timeout is measured from the moment it starts running, not from when it was queued. Python threads
+    cannot be killed, so a section that times out is abandoned: its result is discarded when it eventually finishes.
+
+    Args:
+    - sections (Dict[str, Callable[[], Any]]): A mapping of section names to zero-argument callables.
+    - max_workers (int): The maximum number of sections to run at once. Default is one thread per section.
+    - timeout (float): The number of seconds each section may run for, or None for no limit.
+
+    Returns:
+    - A tuple of two dicts: the results of the sections that succeeded, and an error message for each section that
+      raised an exception or timed out, both keyed by section name.
+    """
+
+    started = {}
+
+    def run(name, section):
+        started[name] = time.monotonic()
+        return section()
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or len(sections) or 1)
+    futures = {executor.submit(run, name, section): name for name, section in sections.items()}
+
+    results = {}
+    errors = {}
+    pending = set(futures)
+
+    while pending:
+        wait_timeout = None
+        if timeout is not None:
+            deadlines = [started[futures[future]] + timeout for future in pending if futures[future] in started]
+            # A section may have been submitted but not started yet, in which case poll until it has a deadline
+            wait_timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else 0.1
+
+        done, pending = concurrent.futures.wait(pending, timeout=wait_timeout,
+                                                return_when=concurrent.futures.FIRST_COMPLETED)
+
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception:
+                errors[name] = traceback.format_exc()
+
+        if timeout is not None:
+            now = time.monotonic()
+            for future in list(pending):
+                name = futures[future]
+                if name in started and now - started[name] >= timeout:
+                    errors[name] = "Timed out after " + str(timeout) + " seconds"
+                    pending.remove(future)
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    return results, errors
@@ -1,17 +1,18 @@
 import main
+import chunking
 import json
 import re
-from langchain.prompts import PromptTemplate
-from langchain.llms import VertexAI
-from langchain.chains import LLMChain
+from prompts import PromptTemplate
 
 
-def Parser(sorted_files):
+def Parser(corpus, routes, checkpoint):
     """
     Extracts share class details from the sorted pages of minute book.
 
     Args:
-        sorted_files (list): A list of tuples where each tuple contains the page number and file name of a sorted file.
+        corpus (pages.PageCorpus): The text of every page of the minute book, indexed by page number.
+        routes (router.Routes): The triggers that fired on each page of the minute book.
+        checkpoint (checkpoints.Checkpoint): Records the result of each page or window, so that a retried parse can resume.
 
     Returns:
         A list of dictionaries where each dictionary represents a share class and includes its name, voting rights,
@@ -20,45 +21,27 @@ def Parser(sorted_files):
     """
 
     share_classes = [{}]
-    share_class_content = ""
-    share_class_token_count = 0
     share_class_max_token_limit = 2560
-    extracting_share_classes = False
 
-    file_count = len(sorted_files)
-    for file in sorted_files:
-        page_number, file_name = file
-        content = main.get_page(file_name)
-        lowercase_content = content.lower()
-
-        #  "share_classes": array, // One or more share classes with children properties for name, voting rights, votes per share, limit for number of shares, number of shares authorized, and share restrictions
-        if "authorized to issue" in lowercase_content and "class" in lowercase_content:
-            extracting_share_classes = True
-
-        if extracting_share_classes is True:
-            share_class_tokens = share_class_token_count + main.num_tokens_from_string(content)
-
-            if share_class_tokens < share_class_max_token_limit:
-                share_class_token_count += share_class_tokens
-                share_class_content += content
-
-            if share_class_tokens >= share_class_max_token_limit or page_number == file_count:
-                output = extract_share_classes(share_class_content)
-                try:
-                    share_classes = json.loads(output)
-                    share_classes.append({'provenance': main.get_url(file_name)})
-                    share_classes.append(share_classes)
-
-                    for share_class in share_classes:
-                        if not bool(share_class):
-                            share_classes.remove(share_class)
-                except json.decoder.JSONDecodeError:
-                    pass
-
-                extracting_share_classes = False
-                share_class_content = ""
-                share_class_token_count = 0
-                share_class_tokens = 0
+    #  "share_classes": array, // One or more share classes with children properties for name, voting rights, votes per share, limit for number of shares, number of shares authorized, and share restrictions
+    # Pages with a layout contribute only their tables and the blocks around mentions of share classes
+    chunker = chunking.Chunker(corpus, chunking.token_budget(share_class_max_token_limit),
+                               keywords=["authorized to issue", "class", "shares"], tables=True)
+    for window in chunker.windows(routes.pages("share_classes")):
+        output = checkpoint.run(f"share_classes:{window.pages[0]}-{window.pages[-1]}",
+                                lambda: extract_share_classes(window.content))
+        try:
+            found_share_classes = json.loads(output)
+            if isinstance(found_share_classes, dict):
+                found_share_classes = [found_share_classes]
+            share_classes.extend(found_share_classes)
+            share_classes.append({'provenance': main.get_url(corpus.file_name(window.pages[-1]))})
+
+            for share_class in share_classes:
+                if not bool(share_class):
+                    share_classes.remove(share_class)
+        except json.decoder.JSONDecodeError:
+            pass
 
     return share_classes
 
@@ -84,9 +67,5 @@ def extract_share_classes(content):
                     {content}
                     Share Classes JSON:""")
 
-    chain = LLMChain(llm=VertexAI(model_name="text-bison", temperature=0.5,
-                                  max_output_tokens=1024),
-                     prompt=prompt)
-
-    output = chain.predict(content=content)
+    output = main.predict(prompt, temperature=0.5, max_output_tokens=1024, content=content)
     return re.sub(r'\s+', ' ', output)
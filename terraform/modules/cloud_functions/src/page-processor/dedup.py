@@ -0,0 +1,87 @@
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+import cleanup
+
+
+def digest(content):
+    """
+    Returns the SHA-256 hex digest of a single-page PDF, which identifies pages with exactly the same bytes.
+    """
+
+    return hashlib.sha256(content).hexdigest()
+
+
+class PageStore:
+    """
+    Stores the class and text of every processed page in Cloud Storage, keyed by the digest of its PDF bytes, so that
+    a page seen before (a certificate filed twice, a blank register form) is not classified or OCR'd again.
+
+    The stored text is as confidential as the minute book it came from, so results expire after ttl seconds: an
+    expired result is ignored by get_many(), and evict() deletes every expired result.
+    """
+
+    def __init__(self, bucket, prefix="cache/pages/", ttl=7 * 24 * 60 * 60):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _get(self, digest):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            result = json.loads(self.bucket.blob(self.prefix + digest + ".json").download_as_bytes())
+        except NotFound:
+            return None
+
+        # Results stored before they were timestamped count as expired
+        if time.time() - result.get("created", 0) > self.ttl:
+            return None
+        return result
+
+    def get_many(self, digests):
+        """
+        Returns a dict mapping each digest that has a stored result to that result, a dict with the keys "class",
+        "confidence" and "text", and "blocks" if the page's layout was stored.
+        """
+
+        digests = list(digests)
+        if not digests:
+            return {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(digests), 16)) as executor:
+            results = executor.map(self._get, digests)
+            return {digest: result for digest, result in zip(digests, results) if result is not None}
+
+    def put(self, digest, page_class, text, confidence=None, blocks=None):
+        result = {"class": page_class, "confidence": confidence, "text": text, "created": time.time()}
+        if blocks is not None:
+            result["blocks"] = blocks
+        data = json.dumps(result)
+        self.bucket.blob(self.prefix + digest + ".json").upload_from_string(data, content_type="application/json")
+
+    def evict(self):
+        """
+        Deletes the results stored more than ttl seconds ago. This lists the whole store, so it is run once per book
+        rather than on every page.
+        """
+
+        now = time.time()
+        expired = [blob.name for blob in self.bucket.list_blobs(prefix=self.prefix)
+                   if now - blob.time_created.timestamp() > self.ttl]
+        cleanup.delete_files(self.bucket, expired)
+        return len(expired)
+
+
+def from_environment(bucket):
+    """
+    Returns the PageStore for the bucket, or None if it has been switched off by setting the PAGE_STORE environment
+    variable to "0". Stored results expire after PAGE_STORE_TTL seconds, 7 days by default.
+    """
+
+    if os.environ.get("PAGE_STORE", "1") == "0":
+        return None
+    return PageStore(bucket, ttl=float(os.environ.get("PAGE_STORE_TTL", 7 * 24 * 60 * 60)))
@@ -0,0 +1,130 @@
+import json
+import os
+
+
+def enabled():
+    """
+    Returns True unless writing page layouts has been switched off by setting the LAYOUT environment variable to "0".
+    """
+
+    return os.environ.get("LAYOUT", "1") != "0"
+
+
+def path(file):
+    """
+    Returns the path of the layout of the page whose PDF is at file ("output/pdf/<filename>_page_<N>.pdf").
+    """
+
+    return file.replace("output/pdf/", "output/layout/").replace(".pdf", ".jsonl")
+
+
+def from_document(doc, page_index=0):
+    """
+    Returns the blocks of one page of a Document AI response in reading order: its paragraphs, form fields and table
+    rows, each with its normalized bounding box. Paragraphs that fall inside a table are left out, since the table's
+    rows already hold their text.
+
+    Each block is a dict with:
+    - "i" (int): The block's position in reading order.
+    - "type" (str): "paragraph", "field" or "row".
+    - "text" (str): The text of the block. A field's is "<key>: <value>", and a row's is its cells joined by " | ".
+    - "box" (List[float]): The normalized [left, top, right, bottom] of the block, or None if Document AI gave none.
+    - "key" and "value" (str): The name and value of a field.
+    - "table" (int), "header" (bool) and "cells" (List[str]): The table a row belongs to, whether it is a header row,
+      and the text of its cells.
+
+    Args:
+        doc (google.cloud.documentai_v1.Document): The processor's output.
+        page_index (int): The index of the page in doc.pages.
+
+    Returns:
+        list: The blocks.
+    """
+
+    if hasattr(type(doc), "pb"):
+        # Read the underlying protobuf message, since proto-plus wraps every nested message it returns in a new object
+        doc = type(doc).pb(doc)
+    if page_index >= len(doc.pages):
+        return []
+
+    text = doc.text
+    page = doc.pages[page_index]
+    # Each block is collected with the position of its text in the document, which follows reading order
+    blocks = []
+
+    table_spans = []
+    for table_number, table in enumerate(page.tables):
+        table_spans.append(span(table.layout))
+        for header, rows in ((True, table.header_rows), (False, table.body_rows)):
+            for row in rows:
+                cells = [anchor_text(cell.layout, text).replace("\n", " ").strip() for cell in row.cells]
+                layouts = [cell.layout for cell in row.cells]
+                blocks.append((min((span(cell)[0] for cell in layouts), default=0), {
+                    "type": "row", "text": " | ".join(cells), "box": bounding_box(layouts),
+                    "table": table_number, "header": header, "cells": cells}))
+
+    for field in page.form_fields:
+        key = anchor_text(field.field_name, text).strip().rstrip(":")
+        value = anchor_text(field.field_value, text).strip()
+        blocks.append((span(field.field_name)[0], {
+            "type": "field", "text": key + ": " + value, "box": bounding_box([field.field_name, field.field_value]),
+            "key": key, "value": value}))
+
+    for paragraph in page.paragraphs:
+        start, _ = span(paragraph.layout)
+        if any(table_start <= start < table_end for table_start, table_end in table_spans):
+            continue
+        content = anchor_text(paragraph.layout, text).strip()
+        if content:
+            blocks.append((start, {"type": "paragraph", "text": content, "box": bounding_box([paragraph.layout])}))
+
+    blocks.sort(key=lambda block: block[0])
+    return [dict(block, i=order) for order, (_, block) in enumerate(blocks)]
+
+
+def from_text(text):
+    """
+    Returns the paragraphs of a page read from its PDF's text layer, split on blank lines, as blocks without bounding
+    boxes.
+    """
+
+    paragraphs = [paragraph.strip() for paragraph in text.split("\n\n")]
+    return [{"i": order, "type": "paragraph", "text": paragraph, "box": None}
+            for order, paragraph in enumerate(paragraph for paragraph in paragraphs if paragraph)]
+
+
+def dumps(blocks):
+    """
+    Returns blocks as JSON lines, one block per line.
+    """
+
+    return "".join(json.dumps(block, separators=(",", ":")) + "\n" for block in blocks)
+
+
+def anchor_text(layout, text):
+    return "".join(text[int(segment.start_index):int(segment.end_index)]
+                   for segment in layout.text_anchor.text_segments)
+
+
+def span(layout):
+    """
+    Returns the (start, end) of the text covered by a layout element, or (0, 0) if it has no text anchor.
+    """
+
+    segments = layout.text_anchor.text_segments
+    if not segments:
+        return 0, 0
+    return min(int(segment.start_index) for segment in segments), max(int(segment.end_index) for segment in segments)
+
+
+def bounding_box(layouts):
+    """
+    Returns the normalized [left, top, right, bottom] that encloses several layout elements, or None if none of them
+    has a bounding polygon.
+    """
+
+    vertices = [vertex for layout in layouts for vertex in layout.bounding_poly.normalized_vertices]
+    if not vertices:
+        return None
+    return [round(min(vertex.x for vertex in vertices), 4), round(min(vertex.y for vertex in vertices), 4),
+            round(max(vertex.x for vertex in vertices), 4), round(max(vertex.y for vertex in vertices), 4)]
@@ -1,40 +1,131 @@
 import base64
+import collections
+import io
 import functions_framework
 import json
 import os
 import re
-from google.api_core.client_options import ClientOptions
-from google.cloud import documentai_v1 as documentai
 from google.cloud import storage
-from google.cloud import pubsub_v1
+import cleanup
+import completion
+import dedup
+import layout
+import manifest
+import packing
+import prefilter
+import resources
+import tables
+import tracing
 
-storage_client = storage.Client()
-storage_bucket = storage_client.get_bucket(os.environ.get('BUCKET_NAME'))
-publisher = pubsub_v1.PublisherClient()
+storage_client = resources.get("storage_client", storage.Client)
+# bucket() makes a handle without the metadata request that get_bucket() sends, which would delay every cold start
+storage_bucket = resources.get("storage_bucket", lambda: storage_client.bucket(os.environ.get('BUCKET_NAME')))
 project_number = os.environ.get("PROJECT_NUMBER")
 
 
 def send_to_pubsub(msg, topic):
+    """
+    Publishes msg to topic and waits until Pub/Sub has accepted it, raising if it could not be published.
+    """
+
+    publisher = resources.publisher()
     topic = publisher.topic_path(project_number, topic)
-    if publisher.publish(topic, data=json.dumps(msg).encode("utf-8")):
-        return msg
+    publisher.publish(topic, data=json.dumps(msg).encode("utf-8")).result()
+    return msg
 
 
 @functions_framework.cloud_event
 def main(cloud_event):
     encoded_payload = cloud_event.data["message"]["data"]
     msg = json.loads(base64.b64decode(encoded_payload).decode())
-    # The schema of the message is defined in helpers.send_to_pubsub()
-    file = msg['file']
+
+    with tracing.trace(msg.get('trace_id'), "page-processor", first_page=msg.get('first_page', msg.get('page')),
+                       last_page=msg.get('last_page', msg.get('page'))):
+        process_message(msg)
+
+
+def process_message(msg):
+    """
+    Classifies and parses the pages named in a split-pages message, and starts the parse once every page of the
+    minute book has been processed.
+    """
+
+    # The schema of the message is defined in input-listener's split_pages(). A message names either a single
+    # page in 'file', or a range of consecutive pages in 'files'
+    files = msg['files'] if 'files' in msg else [msg['file']]
 
     region_two_char = os.environ.get('REGION')[:2]
 
-    if file.endswith(".pdf"):
-        blob = storage_bucket.get_blob(file)
-        content = blob.download_as_string() if blob else None
-        tables = ""
+    contents = {}
+    for file in files:
+        if file.endswith(".pdf"):
+            with tracing.span("gcs.download", object=file) as span:
+                blob = storage_bucket.get_blob(file)
+                content = blob.download_as_string() if blob else None
+                span.set(bytes=len(content or b""))
+            if content:
+                contents[file] = content
+
+    # Pages whose exact bytes were already processed, earlier in this message or for any other minute book, reuse
+    # the stored result instead of being classified and OCR'd again
+    page_store = dedup.from_environment(storage_bucket)
+    digests = {file: dedup.digest(content) for file, content in contents.items()}
+    originals = {}
+    duplicates = {}
+    for file, digest in digests.items():
+        if digest in originals:
+            duplicates[file] = originals[digest]
+        else:
+            originals[digest] = file
+
+    outputs = {}
+    layouts = {}
+    page_classes = {}
+    with tracing.span("page_store.get", pages=len(originals)) as span:
+        stored = page_store.get_many(originals) if page_store is not None else {}
+        span.set(hits=len(stored))
+    confidences = {}
+    for digest, result in stored.items():
+        file = originals[digest]
+        outputs[file] = result["text"]
+        page_classes[file] = result["class"]
+        confidences[file] = result.get("confidence")
+        upload_text(file, result["text"], page_classes[file], confidences[file])
+        if result.get("blocks") is not None:
+            layouts[file] = result["blocks"]
+            upload_layout(file, result["blocks"])
 
-        if content:
+    def save(file, output, blocks=None):
+        outputs[file] = output
+        upload_text(file, output, page_classes.get(file), confidences.get(file))
+        if blocks is not None:
+            layouts[file] = blocks
+            upload_layout(file, blocks)
+        if page_store is not None:
+            page_store.put(digests[file], page_classes.get(file), output, confidences.get(file), blocks)
+
+    # Classify each page, then group pages by the processor that should parse them so that each group can be
+    # sent to Document AI as a single multi-page request. Pages that the local pre-filter can decide on skip the
+    # classifier, and pages with a usable text layer skip OCR as well
+    ocr_files = []
+    form_parser_files = []
+    prefiltered = collections.Counter()
+    for digest, file in originals.items():
+        if digest in stored:
+            continue
+        content = contents[file]
+
+        with tracing.span("prefilter", object=file) as span:
+            page_class, text = prefilter.classify(content) if prefilter.enabled() else (None, None)
+            span.set(page_class=page_class)
+        prefiltered[page_class or "ambiguous"] += 1
+
+        if page_class in ["text-layer", "blank"]:
+            page_classes[file] = page_class
+            save(file, text, layout.from_text(text) if page_class == "text-layer" and layout.enabled() else None)
+            continue
+
+        if page_class is None:
             classifier_result = process_document(
                 project_id=os.environ.get('PROJECT_ID'),
                 location=region_two_char,
@@ -51,47 +142,169 @@ def main(cloud_event):
                 if len(sorted_data) > 0:
                     highest_confidence_item = sorted_data[0]
                     page_class = highest_confidence_item.type_
+                    confidences[file] = highest_confidence_item.confidence
+
+        page_classes[file] = page_class
+        if page_class in ["dense-ocr", "other", "certificate"]:
+            ocr_files.append(file)
+        elif page_class == "form-parser":
+            form_parser_files.append(file)
+
+    if prefilter.enabled():
+        print("Pre-filter: " + json.dumps({
+            "pages": dict(prefiltered),
+            "classifier_calls_avoided": sum(prefiltered.values()) - prefiltered["ambiguous"],
+            "ocr_calls_avoided": prefiltered["text-layer"] + prefiltered["blank"],
+        }))
 
-            if page_class in ["dense-ocr", "other", "certificate"]:
-                parser_result = process_document(
-                    project_id=os.environ.get('PROJECT_ID'),
-                    location=region_two_char,
-                    processor_id=os.environ.get('OCR_PROCESSOR_ID'),
-                    processor_version=os.environ.get('OCR_PROCESSOR_VERSION'),
-                    content=content
-                )
-            elif page_class == "form-parser":
-                parser_result = process_document(
-                    project_id=os.environ.get('PROJECT_ID'),
-                    location=region_two_char,
-                    processor_id=os.environ.get('FORM_PARSER_PROCESSOR_ID'),
-                    processor_version=os.environ.get('FORM_PARSER_PROCESSOR_VERSION'),
-                    content=content
-                )
-                tables = tables_to_csv(parser_result.document)
-
-            if parser_result:
-                doc = parser_result.document
-                output = doc.text
-                if tables:
-                    output += tables
-
-                new_path = file.replace("output/pdf/", "output/txt/").replace(".pdf", ".txt")
-                blob = storage_bucket.blob(new_path)
-
-                # Save OCR text and tables (expressed as CSV) back to Cloud Storage
-                blob.upload_from_string(output)
-                print(f"Uploaded {new_path}")
+    groups = [
+        (ocr_files, os.environ.get('OCR_PROCESSOR_ID'), os.environ.get('OCR_PROCESSOR_VERSION'), False),
+        (form_parser_files, os.environ.get('FORM_PARSER_PROCESSOR_ID'), os.environ.get('FORM_PARSER_PROCESSOR_VERSION'), True),
+    ]
+
+    max_pages = int(os.environ.get("DOCAI_MAX_PAGES_PER_REQUEST", 15))
+    for group_files, processor_id, processor_version, with_tables in groups:
+        for i in range(0, len(group_files), max_pages):
+            batch = group_files[i:i + max_pages]
+            batch_outputs = process_pages(
+                project_id=os.environ.get('PROJECT_ID'),
+                location=region_two_char,
+                processor_id=processor_id,
+                processor_version=processor_version,
+                contents=[contents[file] for file in batch],
+                with_tables=with_tables
+            )
+
+            for file, (output, blocks) in zip(batch, batch_outputs):
+                save(file, output, blocks)
+
+    for file, original in duplicates.items():
+        if original in outputs:
+            upload_text(file, outputs[original], page_classes.get(original), confidences.get(original))
+        if original in layouts:
+            upload_layout(file, layouts[original])
+
+    if page_store is not None:
+        print("Page store: " + json.dumps({"pages": len(contents), "reused": len(stored), "duplicates": len(duplicates)}))
 
     total_pages = msg['total_pages']
-    prefix = re.sub(r"_page_\d+\.txt", "", new_path)
-    blobs = storage_bucket.list_blobs(prefix=prefix)
-    blob_count = sum(1 for _ in blobs)
+    prefix = re.sub(r"_page_\d+\.pdf", "", files[0].replace("output/pdf/", "output/txt/"))
+    pages = [int(re.search(r"_page_(\d+)\.pdf$", file).group(1)) for file in files]
+    tracker = completion.CompletionTracker(
+        store=completion.GCSStateStore(storage_bucket),
+        key=prefix.replace("output/txt/", "state/"),
+        total_pages=total_pages
+    )
+
+    with tracing.span("completion.mark_done", pages=len(pages)):
+        finished = tracker.mark_done(pages)
 
-    if (blobs and total_pages == blob_count):
+    if finished:
         # Send a message to the pubsub topic to start the next stage of the pipeline
         print(f"Sending message to parse-minute-book topic: {prefix}")
-        send_to_pubsub(msg={"prefix": prefix}, topic="parse-minute-book")
+        with tracing.span("manifest.build", prefix=prefix, pages=total_pages):
+            book = manifest.build(storage_bucket, prefix)
+        send_to_pubsub(msg={"prefix": prefix, "trace_id": tracing.trace_id()}, topic="parse-minute-book")
+        # Only now that the parse has been started is the book marked as handed off. If this invocation fails before
+        # here, a redelivery of any of the book's messages finds it complete and starts the parse again.
+        tracker.confirm()
+        if book["packed"]:
+            # The parser reads the packed text, so the per-page objects are no longer needed
+            with tracing.span("gcs.delete", objects=len(book["file"])):
+                cleanup.delete_files(storage_bucket, book["file"])
+        tracker.clear()
+        if page_store is not None:
+            with tracing.span("page_store.evict") as span:
+                span.set(deleted=page_store.evict())
+
+
+def upload_text(file, output, page_class=None, confidence=None):
+    """
+    Saves the text of a page, including any tables expressed as CSV, back to Cloud Storage alongside its PDF. The
+    page's class, token count and text hash are stored as custom metadata for the book's manifest.
+    """
+
+    new_path = file.replace("output/pdf/", "output/txt/").replace(".pdf", ".txt")
+    blob = storage_bucket.blob(new_path)
+    blob.metadata = manifest.page_metadata(output, page_class, confidence)
+    with tracing.span("gcs.upload", object=new_path, bytes=len(output)):
+        blob.upload_from_string(output)
+    print(f"Uploaded {new_path}")
+
+
+def upload_layout(file, blocks):
+    """
+    Saves the blocks of a page, as returned by layout.from_document(), to output/layout/ as JSON lines, for the parser
+    to send only the relevant parts of the page to the LLM.
+    """
+
+    new_path = layout.path(file)
+    data = layout.dumps(blocks)
+    with tracing.span("gcs.upload", object=new_path, bytes=len(data)):
+        storage_bucket.blob(new_path).upload_from_string(data, content_type="application/jsonl")
+
+
+def process_pages(
+    project_id: str,
+    location: str,
+    processor_id: str,
+    processor_version: str,
+    contents: list,
+    with_tables: bool
+) -> list:
+    """
+    Parses several single-page PDFs with one Document AI request by merging them into a multi-page PDF, then maps
+    the result back to the text and layout of each page by page index.
+
+    Args:
+        contents (list): The bytes of each single-page PDF, in order.
+        with_tables (bool): Whether to append the tables found on each page, expressed as CSV.
+
+    Returns:
+        list: A tuple of the text of each page and its blocks, as returned by layout.from_document(), in the same
+        order as contents. The blocks are None if layouts are switched off.
+    """
+
+    if len(contents) == 1:
+        doc = process_document(project_id, location, processor_id, processor_version, contents[0]).document
+        blocks = layout.from_document(doc) if layout.enabled() else None
+        return [(doc.text + (tables.to_csv(doc) if with_tables else ""), blocks)]
+
+    doc = process_document(project_id, location, processor_id, processor_version, merge_pdfs(contents)).document
+
+    outputs = [("", None)] * len(contents)
+    for page_index, page in enumerate(doc.pages):
+        output = layout_to_text(page.layout, doc.text)
+        if with_tables:
+            output += tables.to_csv(doc, page_index=page_index)
+        blocks = layout.from_document(doc, page_index) if layout.enabled() else None
+        outputs[page.page_number - 1 if page.page_number else page_index] = (output, blocks)
+
+    return outputs
+
+
+def merge_pdfs(contents: list) -> bytes:
+    from PyPDF2 import PdfReader, PdfWriter
+
+    pdf_writer = PdfWriter()
+    for content in contents:
+        for page in PdfReader(io.BytesIO(content)).pages:
+            pdf_writer.add_page(page)
+
+    buffer = io.BytesIO()
+    pdf_writer.write_stream(buffer)
+    return buffer.getvalue()
+
+
+def layout_to_text(layout: "documentai.Document.Page.Layout", text: str) -> str:
+    """
+    Returns the text covered by a layout element's text anchor, e.g. the text of one page of a multi-page document.
+    """
+
+    return "".join(
+        text[int(segment.start_index):int(segment.end_index)]
+        for segment in layout.text_anchor.text_segments
+    )
 
 
 def process_document(
@@ -100,11 +313,13 @@ def process_document(
     processor_id: str,
     processor_version: str,
     content: str
-) -> documentai.Document:
+) -> "documentai.ProcessResponse":
+    # Document AI's client library is only imported by invocations that have pages the pre-filter and page store
+    # couldn't handle
+    from google.cloud import documentai_v1 as documentai
 
     if len(content) > 0:
-        opts = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
-        client = documentai.DocumentProcessorServiceClient(client_options=opts)
+        client = resources.documentai_client(location)
 
         processor = client.processor_version_path(
             project_id, location, processor_id, processor_version
@@ -112,19 +327,8 @@ def process_document(
 
         input = documentai.RawDocument(content=content, mime_type="application/pdf")
         request = documentai.ProcessRequest(name=processor, raw_document=input)
-        result = client.process_document(request)
+        with tracing.span("docai.process", processor=processor_id, bytes=len(content)) as span:
+            result = client.process_document(request)
+            span.set(pages=len(result.document.pages))
 
         return result
-
-
-def tables_to_csv(doc: documentai.Document) -> str:
-    from google.cloud.documentai_toolbox import document
-    wrapped_document = document.Document.from_documentai_document(doc)
-
-    output = ""
-    for page_number, page in enumerate(wrapped_document.pages):
-        for table_number, table in enumerate(page.tables):
-            output = "Comma-Separated Values Table\n===\n"
-            output += wrapped_document.pages[page_number].tables[table_number].to_csv()
-
-    return output
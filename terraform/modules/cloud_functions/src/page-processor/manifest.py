@@ -0,0 +1,106 @@
+import hashlib
+import json
+import re
+
+import packing
+import resources
+
+
+# The marker that precedes each table appended to a page's text by tables.to_csv()
+TABLE_MARKER = "Comma-Separated Values Table"
+
+COLUMNS = ["page", "file", "class", "confidence", "token_count", "text_hash", "has_tables", "offset", "length"]
+
+
+def text_hash(content):
+    """
+    Returns the SHA-256 hex digest of a page's text, ignoring case and differences in whitespace. This must match
+    text_hash() in minute-book-parser's pages.py, which falls back to it for books without a manifest.
+    """
+
+    normalized = re.sub(r"\s+", " ", content.lower()).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def page_metadata(output, page_class=None, confidence=None):
+    """
+    Returns the custom metadata to store on a page's text object, from which build() assembles the manifest.
+    Cloud Storage metadata values are strings.
+
+    Args:
+        output (str): The text of the page, including any tables expressed as CSV.
+        page_class (str): The class the page was routed by, if known.
+        confidence (float): The classifier's confidence in page_class, if the classifier was called.
+
+    Returns:
+        dict: The metadata.
+    """
+
+    return {
+        "page_class": page_class or "",
+        "confidence": "" if confidence is None else str(confidence),
+        "token_count": str(len(resources.tokenizer().encode(output))),
+        "text_hash": text_hash(output),
+        "has_tables": "1" if TABLE_MARKER in output else "0",
+    }
+
+
+def path(prefix):
+    """
+    Returns the path of the manifest of the minute book whose pages are at prefix ("output/txt/<filename>").
+    """
+
+    return prefix.replace("output/txt/", "output/manifest/") + ".json"
+
+
+def build(bucket, prefix):
+    """
+    Writes a manifest of every page of a minute book to output/manifest/<filename>.json, so that the parser can load
+    the book's page order, classes and token counts with one read instead of listing and tokenizing its pages.
+
+    The manifest is columnar: a JSON object with a list per column in COLUMNS, one entry per page in page order.
+    It is assembled from a single listing of the book's text objects, whose custom metadata was set by
+    page_metadata() as each page was processed.
+
+    Unless packing is switched off, the pages' text is also concatenated into one object with packing.pack(), whose
+    path is stored under the "packed" key. The "offset" and "length" columns give the byte range of each page in it,
+    so a reader can fetch the whole book with one request or a single page with a ranged read.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): The bucket holding the book's pages.
+        prefix (str): The prefix of the book's pages, in the form "output/txt/<filename>".
+
+    Returns:
+        dict: The manifest.
+    """
+
+    page_name = re.compile(re.escape(prefix) + r"_page_(\d+)\.txt$")
+    rows = []
+    for blob in bucket.list_blobs(prefix=prefix + "_page_"):
+        match = page_name.match(blob.name)
+        if match is None:
+            continue
+        metadata = blob.metadata or {}
+        confidence = metadata.get("confidence")
+        token_count = metadata.get("token_count")
+        rows.append({
+            "length": blob.size,
+            "page": int(match.group(1)),
+            "file": blob.name,
+            "class": metadata.get("page_class") or None,
+            "confidence": float(confidence) if confidence else None,
+            "token_count": int(token_count) if token_count else None,
+            "text_hash": metadata.get("text_hash"),
+            "has_tables": metadata.get("has_tables") == "1",
+        })
+    rows.sort(key=lambda row: row["page"])
+
+    offset = 0
+    for row in rows:
+        row["offset"] = offset
+        offset += row["length"]
+
+    manifest = {column: [row[column] for row in rows] for column in COLUMNS}
+    manifest["packed"] = packing.pack(bucket, prefix, manifest["file"]) if packing.enabled() and rows else None
+    bucket.blob(path(prefix)).upload_from_string(json.dumps(manifest), content_type="application/json")
+    return manifest
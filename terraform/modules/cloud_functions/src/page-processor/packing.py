@@ -0,0 +1,64 @@
+import os
+
+import cleanup
+
+
+# The maximum number of source objects in one Cloud Storage compose request
+MAX_COMPOSE_SOURCES = 32
+
+
+def enabled():
+    """
+    Returns True unless packing has been switched off by setting the PACK_TEXT environment variable to "0".
+    """
+
+    return os.environ.get("PACK_TEXT", "1") != "0"
+
+
+def path(prefix):
+    """
+    Returns the path of the packed text of the minute book whose pages are at prefix ("output/txt/<filename>").
+    """
+
+    return prefix.replace("output/txt/", "output/packed/") + ".txt"
+
+
+def pack(bucket, prefix, files):
+    """
+    Concatenates the text objects of a minute book's pages into a single object at output/packed/<filename>.txt.
+
+    The concatenation is done by Cloud Storage with compose requests of up to 32 objects each, composing the
+    intermediate objects in turn until one remains, so no page text passes through this function. A page's bytes
+    start at the sum of the sizes of the pages before it.
+
+    Args:
+        bucket (google.cloud.storage.Bucket): The bucket holding the book's pages.
+        prefix (str): The prefix of the book's pages, in the form "output/txt/<filename>".
+        files (list): The names of the page text objects, in page order.
+
+    Returns:
+        str: The path of the packed object.
+    """
+
+    destination = path(prefix)
+    sources = [bucket.blob(file) for file in files]
+    parts = []
+    level = 0
+    while len(sources) > MAX_COMPOSE_SOURCES:
+        composed = []
+        for i in range(0, len(sources), MAX_COMPOSE_SOURCES):
+            part = bucket.blob(f"{destination}.part{level}_{i // MAX_COMPOSE_SOURCES}")
+            part.content_type = "text/plain"
+            part.compose(sources[i:i + MAX_COMPOSE_SOURCES])
+            composed.append(part)
+        parts += composed
+        sources = composed
+        level += 1
+
+    packed = bucket.blob(destination)
+    packed.content_type = "text/plain"
+    packed.compose(sources)
+
+    cleanup.delete_files(bucket, [part.name for part in parts])
+    return destination
+
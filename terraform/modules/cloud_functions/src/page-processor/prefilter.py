@@ -0,0 +1,108 @@
+import io
+import os
+import re
+
+
+# Path-construction operators that draw ruled lines and boxes: "x y w h re" and "x y l"
+RULE_OPERATOR = re.compile(rb"[\d.]\s+(?:re|l)\b")
+# Operators that put marks on the page: painting a path, a shading or an XObject, an inline image, or showing text.
+# An operator is a token of its own, so it is preceded and followed by whitespace, a delimiter or the stream's ends.
+DRAWING_OPERATOR = re.compile(rb"(?:^|(?<=[\s)\]>]))(?:[SsFfBb]\*?|sh|Do|BI|Tj|TJ|'|\")(?=[\s(\[<>/%]|$)")
+# The start of an inline image, "BI <parameters> ID <data> EI"
+INLINE_IMAGE = re.compile(rb"(?:^|(?<=\s))BI(?=\s)")
+# Text extracted from a page whose fonts lack a usable encoding is mostly symbols and control characters
+READABLE_CHARACTER = re.compile(r"[A-Za-z0-9\s.,;:'\"()$%&/-]")
+
+
+def enabled():
+    """
+    Returns True unless the local pre-filter has been switched off by setting the PREFILTER environment variable to "0".
+    """
+
+    return os.environ.get("PREFILTER", "1") != "0"
+
+
+def inspect(content):
+    """
+    Reads the signals the pre-filter decides on from a single-page PDF, without any remote calls.
+
+    Images are counted whether they are image XObjects, inline images or drawn inside Form XObjects, and the content
+    streams of Form XObjects are read along with the page's own.
+
+    Args:
+        content (bytes): The single-page PDF.
+
+    Returns:
+        tuple: The text of the page's embedded text layer, the number of images drawn on the page, the number of
+        ruled lines and boxes in its content streams, and the number of drawing operators in them.
+    """
+    from PyPDF2 import PdfReader
+
+    page = PdfReader(io.BytesIO(content)).pages[0]
+    text = page.extract_text() or ""
+
+    contents = page.get_contents()
+    streams = [contents.get_data()] if contents is not None else []
+    images = 0
+    pending = [page.get("/Resources")]
+    visited = set()
+    while pending:
+        resources = pending.pop()
+        xobjects = resources.get_object().get("/XObject") if resources is not None else None
+        if not xobjects:
+            continue
+        for reference in xobjects.get_object().values():
+            # Forms can be shared between pages and can draw each other, so each is only read once
+            key = getattr(reference, "idnum", None) or id(reference)
+            if key in visited:
+                continue
+            visited.add(key)
+            xobject = reference.get_object()
+            if xobject.get("/Subtype") == "/Image":
+                images += 1
+            elif xobject.get("/Subtype") == "/Form":
+                streams.append(xobject.get_data())
+                pending.append(xobject.get("/Resources"))
+
+    images += sum(len(INLINE_IMAGE.findall(stream)) for stream in streams)
+    rules = sum(len(RULE_OPERATOR.findall(stream)) for stream in streams)
+    drawing = sum(len(DRAWING_OPERATOR.findall(stream)) for stream in streams)
+
+    return text, images, rules, drawing
+
+
+def classify(content):
+    """
+    Decides how to process a page from local signals alone, so that obvious pages skip the Document AI classifier.
+
+    - A page with a text layer of at least PREFILTER_MIN_TEXT_CHARS (default 200) readable characters is a
+      "text-layer" page, whose text is used as is without OCR, unless it has at least PREFILTER_MIN_TABLE_RULES
+      (default 20) ruled lines, in which case it is a "form-parser" page so that its tables are extracted.
+    - A page whose content streams have no drawing operators at all, and so no text, images or lines, is "blank",
+      and needs no processing at all.
+    - Every other page, such as a scan, is ambiguous and is left to the classifier.
+
+    Args:
+        content (bytes): The single-page PDF.
+
+    Returns:
+        tuple: The page class ("text-layer", "form-parser", "blank" or None if ambiguous), and the text of the page
+        for "text-layer" and "blank" pages, otherwise None.
+    """
+
+    try:
+        text, images, rules, drawing = inspect(content)
+    except Exception as e:
+        print(f"Pre-filter could not read page: {e}")
+        return None, None
+
+    readable = len(READABLE_CHARACTER.findall(text))
+    if readable >= int(os.environ.get("PREFILTER_MIN_TEXT_CHARS", 200)) and readable >= 0.9 * len(text):
+        if rules >= int(os.environ.get("PREFILTER_MIN_TABLE_RULES", 20)):
+            return "form-parser", None
+        return "text-layer", text
+
+    if not text.strip() and images == 0 and drawing == 0:
+        return "blank", ""
+
+    return None, None
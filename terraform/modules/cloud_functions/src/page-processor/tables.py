@@ -0,0 +1,54 @@
+import csv
+import io
+
+import manifest
+
+
+def to_csv(doc, page_index=None):
+    """
+    Returns every table the Form Parser found in a document as CSV, each preceded by manifest.TABLE_MARKER, reading
+    the cells' text through their text anchors rather than wrapping the document with documentai_toolbox and pandas.
+
+    Args:
+        doc (google.cloud.documentai_v1.Document): The Form Parser's output.
+        page_index (int): The index of the only page whose tables to return, or None for every page.
+
+    Returns:
+        str: The tables, or an empty string if there are none.
+    """
+
+    if hasattr(type(doc), "pb"):
+        # Read the underlying protobuf message, since proto-plus wraps every nested message it returns in a new object
+        doc = type(doc).pb(doc)
+
+    text = doc.text
+    output = ""
+    for index, page in enumerate(doc.pages):
+        if page_index is not None and index != page_index:
+            continue
+        for table in page.tables:
+            output += manifest.TABLE_MARKER + "\n===\n" + table_to_csv(table, text)
+    return output
+
+
+def table_to_csv(table, text):
+    """
+    Returns one table as CSV: its header rows, if it has any, followed by its body rows. Newlines within a cell are
+    removed, as documentai_toolbox did.
+
+    Args:
+        table (google.cloud.documentai_v1.Document.Page.Table): The table, as a protobuf message.
+        text (str): The text of the document the table belongs to.
+    """
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for rows in (table.header_rows, table.body_rows):
+        for row in rows:
+            writer.writerow([cell_text(cell.layout, text) for cell in row.cells])
+    return buffer.getvalue()
+
+
+def cell_text(layout, text):
+    return "".join(text[int(segment.start_index):int(segment.end_index)]
+                   for segment in layout.text_anchor.text_segments).replace("\n", "")
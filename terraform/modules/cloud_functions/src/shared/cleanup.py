@@ -0,0 +1,86 @@
+import concurrent.futures
+import os
+
+
+# The maximum number of calls in one Cloud Storage batch request
+MAX_BATCH_SIZE = 100
+
+
+def delete_files(bucket, names):
+    """
+    Deletes blobs by name with batch requests of up to MAX_BATCH_SIZE deletions each, instead of one request per
+    blob. Blobs that don't exist are ignored.
+
+    Args:
+    - bucket (google.cloud.storage.Bucket): The bucket to delete from.
+    - names (Iterable[str]): The names of the blobs to delete.
+    """
+    from google.api_core.exceptions import NotFound
+
+    names = list(names)
+    for i in range(0, len(names), MAX_BATCH_SIZE):
+        try:
+            with bucket.client.batch():
+                for name in names[i:i + MAX_BATCH_SIZE]:
+                    bucket.blob(name).delete()
+        except NotFound:
+            # A blob was already deleted, e.g. by an earlier delivery of the same message. The rest of the batch
+            # was still applied
+            pass
+
+
+def delete_prefix(bucket, prefix):
+    """
+    Deletes every blob whose name starts with prefix, with one listing and batched deletes.
+    """
+
+    delete_files(bucket, [blob.name for blob in bucket.list_blobs(prefix=prefix)])
+
+
+def download(bucket, names, max_workers=None):
+    """
+    Downloads several blobs concurrently.
+
+    Args:
+    - bucket (google.cloud.storage.Bucket): The bucket to download from.
+    - names (List[str]): The names of the blobs.
+    - max_workers (int): The maximum number of concurrent downloads. Defaults to the PAGE_DOWNLOAD_WORKERS
+      environment variable, or 32.
+
+    Returns:
+    - A list of the contents of each blob as bytes, in the same order as names, with None for a blob that doesn't
+      exist.
+    """
+    from google.api_core.exceptions import NotFound
+
+    def get(name):
+        try:
+            return bucket.blob(name).download_as_bytes()
+        except NotFound:
+            return None
+
+    if not names:
+        return []
+    if max_workers is None:
+        max_workers = int(os.environ.get("PAGE_DOWNLOAD_WORKERS", 32))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor:
+        return list(executor.map(get, names))
+
+
+def concatenate(bucket, names, destination):
+    """
+    Writes the contents of several blobs, each followed by a newline, to one destination blob, streaming the
+    upload so that the whole output is never held as a single string. Blobs that don't exist are skipped.
+
+    Args:
+    - bucket (google.cloud.storage.Bucket): The bucket holding the blobs.
+    - names (List[str]): The names of the blobs to concatenate, in order.
+    - destination (str): The name of the blob to write.
+    """
+
+    with bucket.blob(destination).open("wb", content_type="text/json") as output:
+        for content in download(bucket, names):
+            if content is not None:
+                output.write(content)
+                output.write(b"\n")
@@ -0,0 +1,200 @@
+import base64
+import json
+import random
+import threading
+import time
+
+
+def handoff_key(key):
+    """
+    Returns the key of the object holding a book's set of complete shards and its "fired" flag, given the key prefix
+    of the book's state objects.
+    """
+    return f"{key}/shards.json"
+
+
+class GCSStateStore:
+    """
+    Stores small JSON state objects in Cloud Storage, using generation-match preconditions for atomic updates.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def read(self, key):
+        """
+        Returns a tuple of the state stored under key and its generation, or (None, 0) if there is no state yet.
+        """
+        from google.api_core.exceptions import NotFound
+
+        blob = self.bucket.blob(key)
+        try:
+            data = blob.download_as_bytes()
+        except NotFound:
+            return None, 0
+        return json.loads(data), blob.generation
+
+    def write(self, key, state, generation):
+        """
+        Writes state under key if the stored generation still matches. Returns False if another writer got there
+        first, in which case the caller should read the state again and retry.
+        """
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(key)
+        try:
+            blob.upload_from_string(json.dumps(state), content_type="application/json",
+                                    if_generation_match=generation)
+        except PreconditionFailed:
+            return False
+        return True
+
+    def delete(self, key):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.delete_blob(key)
+        except NotFound:
+            pass
+
+
+class InMemoryStateStore:
+    """
+    A local stand-in for GCSStateStore with the same compare-and-set semantics, used by tests/test_completion.py.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def read(self, key):
+        with self._lock:
+            state, generation = self._states.get(key, (None, 0))
+            return json.loads(json.dumps(state)), generation
+
+    def write(self, key, state, generation):
+        with self._lock:
+            if self._states.get(key, (None, 0))[1] != generation:
+                return False
+            self._states[key] = (json.loads(json.dumps(state)), generation + 1)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._states.pop(key, None)
+
+
+class CompletionTracker:
+    """
+    Tracks which pages of a minute book have been processed, and reports completion exactly once.
+
+    Pages are recorded in a bitmap that is sharded across several state objects, so that concurrent page-processor
+    instances rarely contend for the same object (Cloud Storage only sustains about one update per second to a single
+    object). When a shard's bitmap fills up its number is added to a set in a separate object, and the caller whose
+    update adds the last shard is told the book is complete. That caller hands the book off and then calls confirm(),
+    which sets a "fired" flag in the same object. Marking a page is idempotent, and once the flag is set redelivered
+    messages no longer report completion, so they neither double count nor trigger a second parse. Until it is set,
+    a redelivery is told the book is complete again, so a hand-off that crashed or failed can be retried.
+    """
+
+    def __init__(self, store, key, total_pages, pages_per_shard=16, max_attempts=100):
+        """
+        Args:
+            store (GCSStateStore | InMemoryStateStore): Where the tracker's state is kept.
+            key (str): The key prefix for the book's state objects, e.g. "state/<filename>".
+            total_pages (int): The number of pages in the book.
+            pages_per_shard (int): The number of pages recorded in each shard of the bitmap.
+            max_attempts (int): How many times to retry an update that loses a race before giving up.
+        """
+        self.store = store
+        self.key = key
+        self.total_pages = total_pages
+        self.pages_per_shard = pages_per_shard
+        self.max_attempts = max_attempts
+        self.shard_count = (total_pages + pages_per_shard - 1) // pages_per_shard
+
+    def _shard_key(self, shard):
+        return f"{self.key}/shard_{shard}.json"
+
+    def _shard_size(self, shard):
+        return min(self.pages_per_shard, self.total_pages - shard * self.pages_per_shard)
+
+    def _update(self, key, mutate):
+        """
+        Applies mutate to the state under key with optimistic concurrency, retrying with jittered backoff if another
+        writer updates it first. mutate returns the new state and a value to return once the write succeeds.
+        """
+        for attempt in range(self.max_attempts):
+            state, generation = self.store.read(key)
+            new_state, result = mutate(state)
+            if new_state is None or self.store.write(key, new_state, generation):
+                return result
+            time.sleep(random.uniform(0, min(2.0, 0.05 * 2 ** attempt)))
+
+        raise RuntimeError(f"Could not update {key} after {self.max_attempts} attempts")
+
+    def mark_done(self, pages):
+        """
+        Records that pages have been processed.
+
+        Args:
+            pages (list): The 1-based page numbers that have been processed.
+
+        Returns:
+            bool: True for the caller whose update completes the book, and for any later caller until confirm() is
+            called.
+        """
+        shards = {}
+        for page in pages:
+            shards.setdefault((page - 1) // self.pages_per_shard, []).append((page - 1) % self.pages_per_shard)
+
+        fired = False
+        for shard, offsets in shards.items():
+            size = self._shard_size(shard)
+
+            def set_bits(state):
+                bitmap = bytearray(base64.b64decode(state["bitmap"])) if state else bytearray((size + 7) // 8)
+                for offset in offsets:
+                    bitmap[offset // 8] |= 1 << (offset % 8)
+                complete = all(bitmap[i // 8] & (1 << (i % 8)) for i in range(size))
+                return {"bitmap": base64.b64encode(bytes(bitmap)).decode()}, complete
+
+            if self._update(self._shard_key(shard), set_bits):
+                fired = self._report_shard(shard) or fired
+
+        return fired
+
+    def _report_shard(self, shard):
+        def add_shard(state):
+            state = state or {"complete": [], "fired": False}
+            if state["fired"]:
+                return None, False
+            if shard in state["complete"]:
+                return None, len(state["complete"]) == self.shard_count
+            state["complete"].append(shard)
+            return state, len(state["complete"]) == self.shard_count
+
+        return self._update(handoff_key(self.key), add_shard)
+
+    def confirm(self):
+        """
+        Sets the "fired" flag once the book has been handed off, e.g. once the message that starts the parse has been
+        accepted by Pub/Sub, so that no other caller is told the book is complete.
+        """
+        def set_fired(state):
+            state = state or {"complete": [], "fired": False}
+            if state["fired"]:
+                return None, None
+            state["fired"] = True
+            return state, None
+
+        self._update(handoff_key(self.key), set_fired)
+
+    def clear(self):
+        """
+        Deletes the shard bitmaps once the book has been handed off for parsing. The shard set, with its "fired" flag,
+        is kept so that a late redelivery cannot trigger a second parse; minute-book-parser deletes it, at
+        handoff_key(key), when it cleans up after the book.
+        """
+        for shard in range(self.shard_count):
+            self.store.delete(self._shard_key(shard))
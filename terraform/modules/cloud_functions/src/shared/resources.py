@@ -0,0 +1,110 @@
+import os
+import threading
+
+
+# Clients that are expensive to create are kept for the lifetime of a warm Cloud Function instance and shared by
+# every invocation that instance serves
+_resources = {}
+# Guards _resources and _locks. Each resource is created under its own lock, so that a slow factory only holds up
+# callers waiting for the same resource
+_lock = threading.Lock()
+_locks = {}
+# The tiktoken data bundled with the function by scripts/bundle_tiktoken.py before deploying
+TIKTOKEN_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktoken_cache")
+
+
+def get(key, factory):
+    """
+    Returns the resource registered under key, creating it with factory on first use.
+
+    Args:
+        key (Hashable): A key that identifies the resource, e.g. ("documentai", endpoint).
+        factory (Callable[[], Any]): A zero-argument function that creates the resource.
+
+    Returns:
+        The shared resource.
+    """
+
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            key_lock = _locks.setdefault(key, threading.Lock())
+        with key_lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = factory()
+                _resources[key] = resource
+    return resource
+
+
+def register(key, resource):
+    """
+    Registers a resource under key, replacing any existing one. Used to inject stand-ins for benchmarks.
+    """
+
+    with _lock:
+        _resources[key] = resource
+
+
+def clear():
+    with _lock:
+        _resources.clear()
+
+
+def documentai_client(location):
+    """
+    Returns a Document AI client whose gRPC channel is shared by every request to the same regional endpoint.
+    """
+
+    endpoint = f"{location}-documentai.googleapis.com"
+
+    def create():
+        from google.api_core.client_options import ClientOptions
+        from google.cloud import documentai_v1 as documentai
+        return documentai.DocumentProcessorServiceClient(client_options=ClientOptions(api_endpoint=endpoint))
+
+    return get(("documentai", endpoint), create)
+
+
+def publisher():
+    """
+    Returns a Pub/Sub publisher client. page-processor only publishes from the invocation that finishes a minute
+    book, so the client library isn't imported until then.
+    """
+
+    def create():
+        from google.cloud import pubsub_v1
+        return pubsub_v1.PublisherClient()
+
+    return get("publisher", create)
+
+
+def llm(model_name="text-bison", temperature=0.0, max_output_tokens=None):
+    """
+    Returns a Vertex AI language model handle shared by every prompt sent with the same model settings.
+    """
+
+    def create():
+        from langchain.llms import VertexAI
+        llm_args = {"model_name": model_name, "temperature": temperature}
+        if max_output_tokens is not None:
+            llm_args["max_output_tokens"] = max_output_tokens
+        return VertexAI(**llm_args)
+
+    return get(("llm", model_name, temperature, max_output_tokens), create)
+
+
+
+def tokenizer(encoding_name="cl100k_base"):
+    """
+    Returns the tiktoken encoding used to count tokens, loading its data once per instance.
+    """
+
+    def create():
+        if "TIKTOKEN_CACHE_DIR" not in os.environ and os.path.isdir(TIKTOKEN_CACHE) and os.listdir(TIKTOKEN_CACHE):
+            # Read the encoding's data from the deployment rather than downloading it on every cold start
+            os.environ["TIKTOKEN_CACHE_DIR"] = TIKTOKEN_CACHE
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+
+    return get(("tokenizer", encoding_name), create)
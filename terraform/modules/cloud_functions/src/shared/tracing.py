@@ -0,0 +1,167 @@
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+
+# The trace of the minute book being processed, and the innermost open span, in the current thread or task
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_span_id = contextvars.ContextVar("span_id", default=None)
+_lock = threading.Lock()
+# Spans timing a single Cloud Storage object, which are only exported at the "all" level
+DETAIL_PREFIXES = ("gcs.",)
+
+
+def enabled():
+    """
+    Returns True if tracing has been switched on by setting the TRACING environment variable to "1", which exports
+    the spans of each stage, section and service call, or to "all", which also exports a span per Cloud Storage
+    object. Tracing is off by default, since each span is a line of output.
+    """
+
+    return os.environ.get("TRACING", "0") in ("1", "all")
+
+
+def exported(name):
+    """
+    Returns True if spans named name are exported at the current level.
+    """
+
+    return enabled() and (os.environ.get("TRACING") == "all" or not name.startswith(DETAIL_PREFIXES))
+
+
+def trace_id():
+    """
+    Returns the ID of the current trace, to be passed on in the messages that start the next stage of the pipeline.
+    """
+
+    return _trace_id.get()
+
+
+class Span:
+    """
+    A timed operation. Attributes set while the span is open are exported with it when it ends.
+    """
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """
+    Times the enclosed block as a child of the current span and exports it when the block exits.
+
+    Args:
+        name (str): The operation, e.g. "gcs.download" or "docai.process".
+        **attributes: Details of the operation, e.g. the object name. More can be added with Span.set().
+
+    Yields:
+        Span: The open span.
+    """
+
+    current = Span(name, attributes)
+    if not exported(name):
+        yield current
+        return
+
+    parent_id = _span_id.get()
+    token = _span_id.set(current.span_id)
+    started = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _span_id.reset(token)
+        export(current, parent_id, started, time.perf_counter() - start, error)
+
+
+@contextlib.contextmanager
+def trace(trace_id=None, name="invocation", **attributes):
+    """
+    Starts or continues the trace of a minute book for the enclosed block, and times the block as its root span in
+    this function.
+
+    Args:
+        trace_id (str): The ID received from the previous stage of the pipeline, or None to start a new trace.
+        name (str): The name of the root span.
+        **attributes: Details of the invocation.
+
+    Yields:
+        Span: The root span.
+    """
+
+    token = _trace_id.set(trace_id or uuid.uuid4().hex)
+    try:
+        with span(name, **attributes) as root:
+            yield root
+    finally:
+        _trace_id.reset(token)
+
+
+def wrap(fn):
+    """
+    Returns a version of fn that runs in the current trace and span, for passing to a thread pool. Threads don't
+    inherit the context of the thread that starts them.
+    """
+
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call runs in its own copy
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def export(current, parent_id, started, duration, error):
+    """
+    Writes a finished span as one line of JSON, to the file named by the TRACE_FILE environment variable or else to
+    stdout. On Cloud Functions each stdout line becomes a structured Cloud Logging entry linked to the trace, so the
+    spans of a minute book can be found together across all three functions.
+    """
+
+    trace = _trace_id.get()
+    project = os.environ.get("PROJECT_ID")
+    record = {
+        "severity": "ERROR" if error else "INFO",
+        "message": f"{current.name} {duration * 1000:.1f} ms",
+        "span": {
+            "name": current.name,
+            "trace_id": trace,
+            "span_id": current.span_id,
+            "parent_id": parent_id,
+            "start": datetime.datetime.fromtimestamp(started, datetime.timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "attributes": current.attributes,
+        },
+    }
+    if error:
+        record["span"]["error"] = error
+    if trace and project:
+        record["logging.googleapis.com/trace"] = f"projects/{project}/traces/{trace}"
+        record["logging.googleapis.com/spanId"] = current.span_id
+
+    line = json.dumps(record, default=str) + "\n"
+    path = os.environ.get("TRACE_FILE")
+    with _lock:
+        if path:
+            with open(path, "a") as file:
+                file.write(line)
+        else:
+            sys.stdout.write(line)
+            sys.stdout.flush()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests drive the Cloud Functions through the offline harness and fakes in benchmarks/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
@@ -0,0 +1,88 @@
+import concurrent.futures
+import importlib
+import time
+
+import pytest
+
+import pipeline
+
+
+@pytest.fixture(scope="module")
+def completion():
+    with pipeline.Function("page-processor").activate():
+        yield importlib.import_module("completion")
+
+
+def slow_store(completion):
+    class SlowStore(completion.InMemoryStateStore):
+        # Widens the window between reading a state and writing it back, so that concurrent updates collide
+        conflicts = 0
+
+        def read(self, key):
+            state = super().read(key)
+            time.sleep(0.001)
+            return state
+
+        def write(self, key, state, generation):
+            written = super().write(key, state, generation)
+            if not written:
+                self.conflicts += 1
+            return written
+
+    return SlowStore()
+
+
+def test_concurrent_pages_report_completion_once(completion):
+    store = slow_store(completion)
+    tracker = completion.CompletionTracker(store, "state/book", total_pages=100, pages_per_shard=8)
+    messages = [list(range(page, min(page + 5, 101))) for page in range(1, 101, 5)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(messages)) as executor:
+        results = list(executor.map(tracker.mark_done, messages))
+
+    assert store.conflicts > 0
+    assert results.count(True) == 1
+    assert sorted(store.read(completion.handoff_key("state/book"))[0]["complete"]) == list(range(13))
+
+
+def test_redelivery_reports_again_until_confirmed(completion):
+    tracker = completion.CompletionTracker(completion.InMemoryStateStore(), "state/book", total_pages=20)
+
+    assert not tracker.mark_done(range(1, 20))
+    assert tracker.mark_done([20])
+    # The hand-off hasn't been confirmed, so a redelivery may retry it
+    assert tracker.mark_done([20])
+
+    tracker.confirm()
+    tracker.clear()
+    assert not tracker.mark_done([20])
+    assert not tracker.mark_done(range(1, 21))
+
+
+def test_update_that_loses_a_race_is_retried(completion):
+    class RacingStore(completion.InMemoryStateStore):
+        # Before the first write to the shard, another page-processor records page 2
+        raced = False
+
+        def write(self, key, state, generation):
+            if not self.raced and key.endswith("shard_0.json"):
+                self.raced = True
+                assert super().write(key, {"bitmap": "Ag=="}, generation)
+            return super().write(key, state, generation)
+
+    store = RacingStore()
+    tracker = completion.CompletionTracker(store, "state/book", total_pages=2)
+
+    # Page 1's first write fails, and the retry merges it with page 2, completing the book
+    assert tracker.mark_done([1])
+    assert store.read("state/book/shard_0.json") == ({"bitmap": "Aw=="}, 2)
+
+
+def test_update_gives_up_after_max_attempts(completion):
+    class ContendedStore(completion.InMemoryStateStore):
+        def write(self, key, state, generation):
+            return False
+
+    tracker = completion.CompletionTracker(ContendedStore(), "state/book", total_pages=2, max_attempts=3)
+    with pytest.raises(RuntimeError):
+        tracker.mark_done([1])
@@ -0,0 +1,23 @@
+import json
+
+import pipeline
+
+
+def parse(mode, pages=120):
+    # No latency or errors, so that the two runs differ only in how the book is parsed
+    args = pipeline.arguments(["--parser-mode", mode, "--fanout-pages-per-item", "25",
+                               "--gcs-latency-ms", "0", "--pubsub-latency-ms", "0",
+                               "--docai-latency-ms", "0", "--llm-latency-ms", "0"])
+    _, output = pipeline.run(pages, args)
+    # The final output is the JSON object of each section, one after the other
+    decoder, sections, position = json.JSONDecoder(), [], 0
+    while position < len(output):
+        section, position = decoder.raw_decode(output, position)
+        sections.append(section)
+        while position < len(output) and output[position].isspace():
+            position += 1
+    return sections
+
+
+def test_fanout_output_matches_single_mode():
+    assert parse("fanout") == parse("single")
@@ -0,0 +1,109 @@
+import asyncio
+import concurrent.futures
+import importlib
+import threading
+
+import pytest
+
+import pipeline
+
+
+@pytest.fixture(scope="module")
+def gateway():
+    with pipeline.Function("minute-book-parser").activate():
+        yield importlib.import_module("gateway")
+
+
+class FakeTransport:
+    """
+    Answers requests with the results of a script of coroutines, one per call, in order. The last one is reused.
+    """
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    async def __call__(self, request):
+        step = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        return await step(request)
+
+
+def answer(output):
+    async def step(request):
+        return output
+    return step
+
+
+def fail(error):
+    async def step(request):
+        raise error
+    return step
+
+
+def test_rate_limited_request_halves_rate(gateway):
+    transport = FakeTransport(fail(gateway.RateLimited("quota")), answer("ok"))
+    llm = gateway.Gateway(transport, rate=4.0, max_rate=8.0, backoff_base=0.0, hedge=False)
+
+    assert llm.predict("prompt") == "ok"
+    assert llm.stats["rate_limited"] == 1
+    # Halved by the 429, then increased additively by the success
+    assert llm.bucket.rate == pytest.approx(4.0 * 0.5 + 0.05)
+
+
+def test_retries_stop_at_max_attempts(gateway):
+    transport = FakeTransport(fail(ConnectionError("reset")))
+    llm = gateway.Gateway(transport, max_attempts=3, backoff_base=0.0, rate=100.0, max_rate=100.0, hedge=False)
+
+    with pytest.raises(ConnectionError):
+        llm.predict("prompt")
+    assert transport.calls == 3
+    assert (llm.stats["retries"], llm.stats["failures"]) == (2, 1)
+
+
+def test_errors_that_cannot_succeed_are_not_retried(gateway):
+    transport = FakeTransport(fail(ValueError("bad request")))
+    llm = gateway.Gateway(transport, max_attempts=3, backoff_base=0.0, hedge=False)
+
+    with pytest.raises(ValueError):
+        llm.predict("prompt")
+    assert transport.calls == 1
+
+
+def test_hedged_duplicate_wins_and_straggler_is_cancelled(gateway):
+    cancelled = threading.Event()
+
+    async def straggle(request):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    transport = FakeTransport(straggle, answer("hedge"))
+    llm = gateway.Gateway(transport, rate=100.0, max_rate=100.0, hedge_min_delay=0.01)
+    # Enough history for a 95th percentile, all faster than the straggler
+    llm.latencies.extend([0.001] * 20)
+
+    assert llm.predict("prompt") == "hedge"
+    assert (llm.stats["hedges"], llm.stats["hedge_wins"]) == (1, 1)
+    assert cancelled.wait(timeout=5)
+
+
+def test_in_flight_cap_holds(gateway):
+    in_flight, peak = 0, 0
+
+    async def slow(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return request["prompt"]
+
+    llm = gateway.Gateway(FakeTransport(slow), rate=1000.0, max_rate=1000.0, max_in_flight=2, hedge=False)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        outputs = list(executor.map(llm.predict, [str(i) for i in range(10)]))
+
+    assert outputs == [str(i) for i in range(10)]
+    assert peak == 2
@@ -0,0 +1,67 @@
+import importlib
+
+import pytest
+
+import pipeline
+
+
+@pytest.fixture(scope="module")
+def parser():
+    function = pipeline.Function("minute-book-parser")
+    with function.activate():
+        yield importlib.import_module("layout"), importlib.import_module("pages")
+
+
+def paragraphs(*texts):
+    return [{"type": "paragraph", "text": text} for text in texts]
+
+
+QUORUM = paragraphs(
+    "ARTICLE 11 - PROCEEDINGS AT MEETINGS OF SHAREHOLDERS",
+    "11.1 Quorum",
+    "The quorum for the transaction of business at a meeting of shareholders is two persons,",
+    "each of whom is a shareholder or a proxy holder, present in person or by proxy.",
+    "(a) If there is only one shareholder entitled to vote, the quorum is that shareholder.",
+    "11.2 Other persons may attend",
+    "The directors, the president and the solicitor of the Company may attend any meeting of shareholders.",
+)
+
+
+def test_passage_keeps_every_paragraph_of_a_clause(parser):
+    layout, _ = parser
+    text = layout.passage(QUORUM, ["quorum"])
+    assert text.splitlines() == [block["text"] for block in QUORUM[1:5]]
+
+
+def test_passage_sends_whole_page_when_nothing_matches(parser):
+    layout, _ = parser
+    text = layout.passage(QUORUM[5:], ["quorum"])
+    assert text.splitlines() == [block["text"] for block in QUORUM[5:]]
+
+
+def test_clause_running_onto_next_page(parser):
+    layout, pages = parser
+    first = paragraphs(
+        "10.4 Minutes",
+        "Minutes of the proceedings shall be kept by the secretary.",
+        "11.1 Quorum",
+        "The quorum for the transaction of business at a meeting of shareholders is two persons,",
+    )
+    second = paragraphs(
+        "each of whom is a shareholder or a proxy holder, present in person or by proxy.",
+        "11.2 Other persons may attend",
+        "The directors may attend any meeting of shareholders.",
+        "11.3 Adjournment",
+        "A meeting without a quorum is adjourned to the same day in the next week.",
+    )
+    corpus = pages.PageCorpus(
+        [(1, "page_1.txt", "\n".join(b["text"] for b in first)),
+         (2, "page_2.txt", "\n".join(b["text"] for b in second) + "\n" + "Further minutes. " * 50)],
+        count_tokens=lambda text: len(text.split()),
+        get_blocks={"page_1.txt": first, "page_2.txt": second}.get)
+
+    assert layout.runs_on(first, ["quorum"])
+    assert corpus.passage(1, ["quorum"]).splitlines() == [block["text"] for block in first[2:]]
+    # The top of the next page finishes the clause, and the later mention brings its own clause
+    assert corpus.passage(2, ["quorum"]).splitlines() == [
+        second[0]["text"], second[3]["text"], second[4]["text"]]